@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from workload import Workload, html_page
+
+from extractors.ad_parser import parse_creatives
+from pipelines.normalize import Normalizer
+from storage.dataset_writer import DatasetWriter
+from utils.timefmt import utc_now_iso
+
+import main as scraper_main
+
+STAGES = ("extract_mock", "extract_html", "normalize_record", "normalize_page", "write", "full_run")
+
+@dataclass
+class StageResult:
+    stage: str
+    records: int
+    seconds: float
+    recordsPerSec: float
+    bytes: Optional[int] = None
+    mbPerSec: Optional[float] = None
+    # Peak Python heap (tracemalloc) over a sample run; for full_run, the
+    # peak RSS of the scraper processes.
+    peakMemMB: Optional[float] = None
+
+    @classmethod
+    def build(cls, stage: str, records: int, seconds: float, nbytes: Optional[int] = None) -> "StageResult":
+        seconds = max(seconds, 1e-9)
+        return cls(
+            stage=stage,
+            records=records,
+            seconds=round(seconds, 4),
+            recordsPerSec=round(records / seconds, 1),
+            bytes=nbytes,
+            mbPerSec=round(nbytes / seconds / 1e6, 2) if nbytes is not None else None,
+        )
+
+class Timer:
+    """
+    Accumulates time spent inside `with timer:` blocks only, so workload
+    generation between them is not counted against the stage.
+    """
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.seconds += time.perf_counter() - self._start
+
+@contextmanager
+def traced_peak() -> Iterator[Dict[str, float]]:
+    out: Dict[str, float] = {}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        yield out
+    finally:
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out["peakMB"] = round(peak / 1e6, 2)
+
+# -------------------- STAGES -------------------- #
+# Each stage takes a Workload and returns (records, seconds, bytes or None).
+
+def bench_extract_mock(workload: Workload):
+    timer, records = Timer(), 0
+    for _url, doc in workload.iter_pages():
+        with timer:
+            records += len(parse_creatives(doc))
+    return records, timer.seconds, None
+
+def make_extract_html(page_size: int) -> Callable[[Workload], Any]:
+    def bench(workload: Workload):
+        timer, records, nbytes = Timer(), 0, 0
+        for batch in workload.iter_item_batches(page_size):
+            page = html_page(batch)
+            nbytes += len(page.encode("utf-8"))
+            with timer:
+                records += len(parse_creatives({"mode": "html", "payload": page}))
+        return records, timer.seconds, nbytes
+
+    return bench
+
+def bench_normalize_record(workload: Workload):
+    timer, records = Timer(), 0
+    normalizer = Normalizer(origin_url="")
+    for url, doc in workload.iter_pages():
+        normalizer.origin_url = url
+        items = doc["payload"]["items"]
+        with timer:
+            for raw in items:
+                normalizer.normalize_record(raw)
+        records += len(items)
+    return records, timer.seconds, None
+
+def bench_normalize_page(workload: Workload):
+    timer, records = Timer(), 0
+    normalizer = Normalizer(origin_url="")
+    for url, doc in workload.iter_pages():
+        normalizer.origin_url = url
+        with timer:
+            records += len(normalizer.normalize_page_records(doc["payload"]["items"]))
+    return records, timer.seconds, None
+
+def make_write(formats: List[str], json_encoder: str) -> Callable[[Workload], Any]:
+    def bench(workload: Workload):
+        timer, records = Timer(), 0
+        normalizer = Normalizer(origin_url="")
+        with tempfile.TemporaryDirectory(prefix="bench_write_") as tmp:
+            out = Path(tmp)
+            writer = DatasetWriter(
+                jsonl_path=out / "out.jsonl" if "jsonl" in formats else None,
+                csv_path=out / "out.csv" if "csv" in formats else None,
+                parquet_dir=out / "parquet" if "parquet" in formats else None,
+                json_encoder=json_encoder,
+            )
+            try:
+                for url, doc in workload.iter_pages():
+                    normalizer.origin_url = url
+                    recs = normalizer.normalize_page_records(doc["payload"]["items"])
+                    with timer:
+                        for rec in recs:
+                            writer.write(rec)
+                    records += len(recs)
+            finally:
+                with timer:
+                    writer.close()
+            nbytes = sum(p.stat().st_size for p in out.rglob("*") if p.is_file())
+        return records, timer.seconds, nbytes
+
+    return bench
+
+def make_full_run(workers: int) -> Callable[[Workload], Any]:
+    """
+    End to end through main.run() with mock pages: one origin URL per
+    synthetic advertiser (100 creatives each). More than one URL goes through
+    the multi-process batch runner.
+    """
+
+    def bench(workload: Workload):
+        with tempfile.TemporaryDirectory(prefix="bench_full_") as tmp:
+            out = Path(tmp)
+            urls_file = out / "urls.txt"
+            urls_file.write_text("\n".join(workload.origin_urls()) + "\n", encoding="utf-8")
+            input_path = out / "input.json"
+            input_path.write_text(json.dumps({"originUrlsFile": str(urls_file), "maxItems": 100}), encoding="utf-8")
+            settings_path = out / "settings.json"
+            settings_path.write_text(json.dumps({"mock": True, "prefetchPages": 1}), encoding="utf-8")
+            argv = [
+                "main.py",
+                "--input", str(input_path),
+                "--settings", str(settings_path),
+                "--out-jsonl", str(out / "out.jsonl"),
+                "--out-csv", str(out / "out.csv"),
+                "--media-dir", str(out / "media"),
+                "--workers", str(workers),
+                "--log-level", "WARNING",
+            ]  # fmt: skip
+            root = logging.getLogger()
+            saved_argv, saved_level = sys.argv, root.level
+            # run() only configures logging if nothing has yet; quieten it here.
+            sys.argv = argv
+            root.setLevel(logging.WARNING)
+            try:
+                started = time.perf_counter()
+                scraper_main.run()
+                seconds = time.perf_counter() - started
+            finally:
+                sys.argv = saved_argv
+                root.setLevel(saved_level)
+            records = 0
+            for path in out.glob("out*.jsonl"):
+                with path.open("rb") as f:
+                    records += sum(1 for _ in f)
+            nbytes = sum(p.stat().st_size for p in out.glob("out*") if p.is_file() and not p.name.endswith(".json"))
+        return records, seconds, nbytes
+
+    return bench
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) * scale / 1e6, 1)
+
+# -------------------- DRIVER -------------------- #
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}; choose from {', '.join(STAGES)}")
+
+    benches: List[tuple] = []
+    for stage in stages:
+        if stage == "extract_html":
+            for size in (int(s) for s in args.html_sizes.split(",")):
+                benches.append((f"extract_html_{size}", make_extract_html(size)))
+        elif stage == "write":
+            benches.append((f"write_{'+'.join(args.write_formats)}", make_write(args.write_formats, args.json_encoder)))
+        elif stage == "full_run":
+            benches.append(("full_run", make_full_run(args.workers)))
+        else:
+            benches.append((stage, globals()[f"bench_{stage}"]))
+
+    results: List[StageResult] = []
+    for name, bench in benches:
+        workload = Workload(args.creatives, seed=args.seed)
+        try:
+            records, seconds, nbytes = bench(workload)
+        finally:
+            workload.close()
+        result = StageResult.build(name, records, seconds, nbytes)
+
+        if name == "full_run":
+            result.peakMemMB = _peak_rss_mb()
+        elif args.memory_sample > 0:
+            sample = Workload(min(args.creatives, args.memory_sample), seed=args.seed)
+            try:
+                with traced_peak() as mem:
+                    bench(sample)
+            finally:
+                sample.close()
+            result.peakMemMB = mem["peakMB"]
+
+        results.append(result)
+        logging.info(
+            "%-24s %9d rec %8.2fs %12.1f rec/s %8s MB/s %8s MB peak",
+            result.stage,
+            result.records,
+            result.seconds,
+            result.recordsPerSec,
+            "-" if result.mbPerSec is None else f"{result.mbPerSec:.2f}",
+            "-" if result.peakMemMB is None else f"{result.peakMemMB:.1f}",
+        )
+
+    return {
+        "startedAt": utc_now_iso(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "creatives": args.creatives,
+        "seed": args.seed,
+        "memorySample": args.memory_sample,
+        "stages": [asdict(r) for r in results],
+    }
+
+def compare(current: Dict[str, Any], baseline_path: Path) -> None:
+    with baseline_path.open("r", encoding="utf-8") as f:
+        baseline = {s["stage"]: s for s in json.load(f).get("stages", [])}
+    for stage in current["stages"]:
+        base = baseline.get(stage["stage"])
+        if not base or not base.get("recordsPerSec"):
+            continue
+        logging.info(
+            "%-24s %6.2fx rec/s vs %s",
+            stage["stage"],
+            stage["recordsPerSec"] / base["recordsPerSec"],
+            baseline_path.name,
+        )
+
+def resolve_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stage-level throughput benchmarks on synthetic workloads")
+    parser.add_argument("--creatives", type=int, default=20000, help="Creatives per stage.")
+    parser.add_argument("--seed", type=int, default=0, help="Workload seed (same seed, same pages).")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of: {', '.join(STAGES)}.")
+    parser.add_argument(
+        "--html-sizes",
+        default="20,200,2000",
+        help="Creatives per synthetic HTML page, one extract_html run per size.",
+    )
+    parser.add_argument(
+        "--write-formats",
+        type=lambda v: [f.strip() for f in v.split(",") if f.strip()],
+        default=["jsonl", "csv"],
+        help="Backends enabled for the write stage (jsonl, csv, parquet).",
+    )
+    parser.add_argument("--json-encoder", default="json", help="JSON encoder for the write stage (json, orjson, auto).")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for full_run.")
+    parser.add_argument(
+        "--memory-sample",
+        type=int,
+        default=10000,
+        help="Creatives in the extra traced run used for peak memory (0 disables it).",
+    )
+    parser.add_argument(
+        "--out",
+        default=None,
+        help="Results JSON path (default: benchmarks/results/bench_<timestamp>.json).",
+    )
+    parser.add_argument("--compare", default=None, help="Previous results JSON to report speedups against.")
+    return parser.parse_args()
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(message)s")
+    args = resolve_args()
+    results = run_benchmarks(args)
+    out = (
+        Path(args.out)
+        if args.out
+        else Path(__file__).resolve().parent / "results" / f"bench_{results['startedAt'].replace(':', '').replace('-', '')}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with out.open("w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    logging.info("Results written to %s", out)
+    if args.compare:
+        compare(results, Path(args.compare))
+
+if __name__ == "__main__":
+    main()
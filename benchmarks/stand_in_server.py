@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from workload import FIXED_NOW, ITEMS_PER_PAGE, html_page
+
+from clients.transparency_center_client import RPC_PATH, XSSI_PREFIX, ClientSettings, TransparencyCenterClient
+
+ADVERTISER_RE = re.compile(r"^/advertiser/([^/]+)/?$")
+CREATIVE_RE = re.compile(r"^/advertiser/([^/]+)/creative/([^/]+)/?$")
+MEDIA_RE = re.compile(r"^/media/([A-Za-z0-9_-]+)\.(jpg|mp4)$")
+
+@dataclass
+class StandInConfig:
+    seed: int = 0
+    page_size: int = 20
+    pages: int = 5
+    # Added to every page response: latency_ms +/- jitter_ms (uniform).
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Fractions of page requests answered with 429 (plus Retry-After) or a 5xx.
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_sec: int = 1
+    # Per-response send rate in KB/s (0: unlimited).
+    bandwidth_kbps: float = 0.0
+    image_kb: int = 16
+    video_kb: int = 256
+    # Leave stats out of result pages (detail pages keep them), like many
+    # real search listings.
+    sparse_listings: bool = False
+
+def page_token(page: int) -> str:
+    return base64.urlsafe_b64encode(f"page:{page}".encode("ascii")).decode("ascii").rstrip("=")
+
+def page_from_token(token: str) -> Optional[int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+    except (ValueError, UnicodeDecodeError):
+        return None
+    prefix, _, number = raw.partition(":")
+    return int(number) if prefix == "page" and number.isdigit() else None
+
+class StandInServer:
+    """
+    Local stand-in for the Transparency Center, serving the pages the real
+    HTTP path consumes: advertiser result pages (HTML with the creatives
+    embedded as AF_initDataCallback JSON, paginated with ?page=N or a
+    pageToken), the search RPC that returns later pages as JSON, creative
+    detail pages and the images/videos they reference.
+
+    Content is deterministic for a seed. Latency, 429/5xx injection and
+    bandwidth caps apply to page requests (bandwidth also to media), so
+    concurrency, retry and cache settings can be tuned without a network.
+    Responses carry an ETag and honour If-None-Match.
+    """
+
+    def __init__(self, config: StandInConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self._mock = TransparencyCenterClient(ClientSettings(user_agent="stand-in", cookies=None, proxies=None, mock=True))
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.status_counts: Counter = Counter()
+        self.bytes_sent = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._items = lru_cache(maxsize=4096)(self._page_items)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._mock.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": sum(self.status_counts.values()),
+                "status": {str(k): v for k, v in sorted(self.status_counts.items())},
+                "bytesSent": self.bytes_sent,
+            }
+
+    # -------------------- CONTENT -------------------- #
+
+    def _page_items(self, advertiser: str, page: int) -> Tuple[Dict[str, Any], ...]:
+        """
+        Creatives on one result page, cut from the mock generator's 20-item
+        pages so any page size is served from the same underlying sequence.
+        """
+        size = self.config.page_size
+        origin = f"https://{TransparencyCenterClient.BASE_HOST}/advertiser/{advertiser}"
+        start = (page - 1) * size
+        items: List[Dict[str, Any]] = []
+        chunk = start // ITEMS_PER_PAGE
+        while len(items) < size:
+            payload = self._mock._mock_payload(origin, chunk + 1, now=FIXED_NOW + self.config.seed)
+            items.extend(payload["items"])
+            chunk += 1
+        offset = start % ITEMS_PER_PAGE
+        return tuple(items[offset : offset + size])
+
+    def _served(self, item: Dict[str, Any], advertiser: str, base: str, listing: bool) -> Dict[str, Any]:
+        """
+        A generated creative as served: media on this server, detail URL
+        under its advertiser and, for sparse listings, without stats.
+        """
+        cid = item["creativeId"]
+        item = dict(item)
+        region = item["url"].rpartition("region=")[2]
+        item["url"] = f"https://{TransparencyCenterClient.BASE_HOST}/advertiser/{advertiser}/creative/{cid}?region={region}"
+        if listing and self.config.sparse_listings:
+            item["countryStats"] = []
+            item["audienceSelections"] = []
+        ext = "mp4" if item.get("format") == "VIDEO" else "jpg"
+        item["previewUrl"] = f"{base}/media/{cid}.{ext}"
+        item["variants"] = [
+            {**variant, "images": [f"{base}/media/{cid}-{i}.jpg"], "imageStoreKeys": []}
+            for i, variant in enumerate(item.get("variants") or [])
+        ]
+        return item
+
+    def render_page(self, advertiser: str, page: int, base: str) -> Optional[str]:
+        if page < 1 or page > self.config.pages:
+            return None
+        items = [self._served(item, advertiser, base, listing=True) for item in self._items(advertiser, page)]
+        return html_page(items, title=f"Ads Transparency Center - {advertiser}", extra=self.page_extra(page))
+
+    def page_extra(self, page: int) -> Dict[str, Any]:
+        has_next = page < self.config.pages
+        return {"page": page, "hasNext": has_next, "nextPageToken": page_token(page + 1) if has_next else None}
+
+    def render_rpc(self, advertiser: str, page: int, base: str) -> Optional[str]:
+        if page < 2 or page > self.config.pages:
+            return None
+        items = [self._served(item, advertiser, base, listing=True) for item in self._items(advertiser, page)]
+        data = {"creatives": items, **self.page_extra(page)}
+        return XSSI_PREFIX + "\n" + json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def render_creative(self, advertiser: str, creative_id: str, base: str) -> Optional[str]:
+        for page in range(1, self.config.pages + 1):
+            for item in self._items(advertiser, page):
+                if item["creativeId"] == creative_id:
+                    return html_page([self._served(item, advertiser, base, listing=False)], title=f"Ads Transparency Center - {creative_id}")
+        return None
+
+    def media_bytes(self, name: str, ext: str) -> bytes:
+        size = (self.config.video_kb if ext == "mp4" else self.config.image_kb) * 1024
+        rng = random.Random(zlib.crc32(name.encode("utf-8")))
+        return rng.randbytes(size)
+
+    # -------------------- FAULTS -------------------- #
+
+    def page_fault(self) -> Optional[int]:
+        """
+        Sleeps for the configured latency, then returns the status to inject
+        for this request, if any.
+        """
+        cfg = self.config
+        with self._lock:
+            delay = max(0.0, cfg.latency_ms + self._rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)) / 1000
+            roll = self._rng.random()
+            server_error = self._rng.choice((500, 502, 503))
+        if delay:
+            time.sleep(delay)
+        if roll < cfg.throttle_rate:
+            return 429
+        if roll < cfg.throttle_rate + cfg.error_rate:
+            return server_error
+        return None
+
+    def record(self, status: int, nbytes: int) -> None:
+        with self._lock:
+            self.status_counts[status] += 1
+            self.bytes_sent += nbytes
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                base = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+                if parts.path == "/__stats":
+                    self._send(200, json.dumps(server.stats()).encode("utf-8"), "application/json")
+                    return
+
+                m = MEDIA_RE.match(parts.path)
+                if m:
+                    ctype = "video/mp4" if m.group(2) == "mp4" else "image/jpeg"
+                    self._send(200, server.media_bytes(m.group(1), m.group(2)), ctype)
+                    return
+
+                body: Optional[str] = None
+                ctype = "text/html; charset=utf-8"
+                m = ADVERTISER_RE.match(parts.path)
+                c = CREATIVE_RE.match(parts.path)
+                rpc = parts.path == RPC_PATH
+                if m or c or rpc:
+                    fault = server.page_fault()
+                    if fault is not None:
+                        headers = {"Retry-After": str(server.config.retry_after_sec)} if fault == 429 else {}
+                        self._send(fault, b"", "text/plain", headers)
+                        return
+                    if rpc:
+                        target = ADVERTISER_RE.match((query.get("path") or [""])[0])
+                        page = page_from_token((query.get("pageToken") or [""])[0])
+                        ctype = "application/json; charset=utf-8"
+                        body = server.render_rpc(target.group(1), page or 0, base) if target else None
+                    elif m:
+                        token = (query.get("pageToken") or [""])[0]
+                        page = page_from_token(token) if token else int((query.get("page") or ["1"])[0] or 1)
+                        body = server.render_page(m.group(1), page or 0, base)
+                    else:
+                        body = server.render_creative(c.group(1), c.group(2), base)
+                if body is None:
+                    self._send(404, b"not found", "text/plain")
+                    return
+
+                data = body.encode("utf-8")
+                etag = '"%08x"' % zlib.crc32(data)
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, b"", None, {"ETag": etag})
+                    return
+                self._send(200, data, ctype, {"ETag": etag})
+
+            def _send(self, status: int, data: bytes, ctype: Optional[str], headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                if ctype:
+                    self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                try:
+                    self._write_capped(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                server.record(status, len(data))
+
+            def _write_capped(self, data: bytes) -> None:
+                rate = server.config.bandwidth_kbps * 1024
+                if not rate or not data:
+                    self.wfile.write(data)
+                    return
+                # Send in ~50ms slices, sleeping to hold the configured rate.
+                step = max(1024, int(rate / 20))
+                started = time.perf_counter()
+                for offset in range(0, len(data), step):
+                    self.wfile.write(data[offset : offset + step])
+                    ahead = (offset + step) / rate - (time.perf_counter() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+            def log_message(self, fmt: str, *args: Any) -> None:
+                logging.debug("stand-in: " + fmt, *args)
+
+        return Handler
+
+def resolve_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local Transparency Center stand-in for load-testing the real HTTP path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--seed", type=int, default=0, help="Content seed (same seed, same pages).")
+    parser.add_argument("--page-size", type=int, default=20, help="Creatives per result page.")
+    parser.add_argument("--pages", type=int, default=5, help="Result pages per advertiser.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per page request.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform jitter around --latency-ms.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of page requests answered 429.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of page requests answered 500/502/503.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="Per-response send rate in KB/s (0: unlimited).")
+    parser.add_argument("--image-kb", type=int, default=16, help="Size of served images.")
+    parser.add_argument("--video-kb", type=int, default=256, help="Size of served videos.")
+    parser.add_argument(
+        "--sparse-listings",
+        action="store_true",
+        help="Omit countryStats/audienceSelections from result pages (detail pages keep them).",
+    )
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return parser.parse_args()
+
+def main() -> None:
+    args = resolve_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="%(asctime)s | %(levelname)-8s | %(message)s")
+    config = StandInConfig(
+        seed=args.seed,
+        page_size=args.page_size,
+        pages=args.pages,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after_sec=args.retry_after,
+        bandwidth_kbps=args.bandwidth_kbps,
+        image_kb=args.image_kb,
+        video_kb=args.video_kb,
+        sparse_listings=args.sparse_listings,
+    )
+    server = StandInServer(config, host=args.host, port=args.port)
+    logging.info("Stand-in serving at %s (%s); set settings.baseHost to it", server.base_url, json.dumps(asdict(config)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Stand-in stats: %s", json.dumps(server.stats()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import html
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from clients.transparency_center_client import ClientSettings, TransparencyCenterClient
+
+ITEMS_PER_PAGE = 20
+PAGES_PER_ADVERTISER = 5
+# Fixed clock for the mock's shown-at dates, so runs are reproducible.
+FIXED_NOW = 1_760_000_000
+
+class Workload:
+    """
+    Deterministic stream of mock result pages, built on the client's mock
+    generator. Creatives are spread over synthetic advertisers, five pages of
+    twenty each, and generated lazily, so millions of creatives can be
+    streamed without holding them in memory or touching the network. The same
+    (creatives, seed) always yields the same pages.
+    """
+
+    def __init__(self, creatives: int, seed: int = 0, now: int = FIXED_NOW):
+        self.creatives = creatives
+        self.seed = seed
+        self.now = now
+        self._client = TransparencyCenterClient(
+            ClientSettings(user_agent="benchmark", cookies=None, proxies=None, mock=True)
+        )
+
+    def origin_url(self, advertiser: int) -> str:
+        return (
+            f"https://{TransparencyCenterClient.BASE_HOST}/advertiser/"
+            f"AR{self.seed:04d}{advertiser:010d}?region=anywhere"
+        )
+
+    def origin_urls(self) -> List[str]:
+        per_advertiser = ITEMS_PER_PAGE * PAGES_PER_ADVERTISER
+        return [self.origin_url(i) for i in range(-(-self.creatives // per_advertiser))]
+
+    def iter_pages(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields (origin_url, page_doc) in crawl order; page_doc has the same
+        shape as TransparencyCenterClient.fetch_page() in mock mode.
+        """
+        remaining = self.creatives
+        advertiser = 0
+        while remaining > 0:
+            url = self.origin_url(advertiser)
+            for page in range(1, PAGES_PER_ADVERTISER + 1):
+                payload = self._client._mock_payload(url, page, now=self.now)
+                payload["items"] = payload["items"][:remaining]
+                remaining -= len(payload["items"])
+                payload["hasNext"] = remaining > 0 and page < PAGES_PER_ADVERTISER
+                yield url, {"mode": "mock", "payload": payload}
+                if remaining <= 0:
+                    return
+            advertiser += 1
+
+    def iter_items(self) -> Iterator[Dict[str, Any]]:
+        for _url, doc in self.iter_pages():
+            yield from doc["payload"]["items"]
+
+    def iter_item_batches(self, size: int) -> Iterator[List[Dict[str, Any]]]:
+        batch: List[Dict[str, Any]] = []
+        for item in self.iter_items():
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self) -> None:
+        self._client.close()
+
+def html_page(
+    items: List[Dict[str, Any]],
+    title: str = "Ads Transparency Center",
+    extra: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Synthetic results page shaped like the real one: markup with one card
+    (image + text) per creative, comments and unrelated scripts, and the
+    creatives embedded as JSON in an AF_initDataCallback script. extra adds
+    fields (e.g. pagination) next to "creatives" in that JSON.
+    """
+    parts = [
+        "<!doctype html><html><head>",
+        f"<title>{html.escape(title)}</title>",
+        "<script>window.WIZ_global_data = {\"boq\": \"transparency\", \"lang\": \"en\"};</script>",
+        "<!-- page chrome -->",
+        "</head><body><main>",
+    ]
+    for item in items:
+        variant = (item.get("variants") or [{}])[0]
+        image = (variant.get("images") or [""])[0]
+        parts.append(
+            '<div class="creative-card"><a href="{url}">'
+            '<img class="preview" src="{img}" alt="preview" loading="lazy"></a>'
+            '<span class="text">{text}</span><span class="advertiser">{adv}</span></div>'.format(
+                url=html.escape(item.get("url") or ""),
+                img=html.escape(image),
+                text=html.escape(variant.get("textContent") or ""),
+                adv=html.escape(item.get("advertiserName") or ""),
+            )
+        )
+    data = json.dumps({"creatives": items, **(extra or {})}, ensure_ascii=False).replace("</", "<\\/")
+    parts.append("</main>")
+    parts.append(f"<script>AF_initDataCallback({{key: 'ds:1', hash: '1', data: {data}, sideChannel: {{}}}});</script>")
+    parts.append("</body></html>")
+    return "".join(parts)
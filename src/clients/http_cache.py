@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used for cache keys: lower-case scheme and host, sorted
+    query parameters, no fragment.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+@dataclass
+class CacheEntry:
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    fresh: bool
+
+class HttpCache:
+    """
+    Persistent response cache for page fetches, keyed by normalized URL and
+    page number. Bodies live in one file per entry; metadata (validators,
+    timestamps, sizes) lives in a small SQLite index so that LRU eviction can
+    keep the cache under max_bytes. Entries older than ttl_sec are stale and
+    must be revalidated with a conditional GET.
+
+    Safe to share between threads, and between processes pointing at the same
+    directory. Counters: hits (served fresh), revalidated (304), misses
+    (downloaded in full), evictions.
+    """
+
+    def __init__(self, cache_dir: Path, ttl_sec: int = 6 * 3600, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(cache_dir / "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, url TEXT, page INTEGER, etag TEXT, last_modified TEXT,"
+            " stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at)")
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(url: str, page: int) -> str:
+        return hashlib.sha1(f"{normalize_url(url)}#{page}".encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.body"
+
+    def lookup(self, url: str, page: int) -> Optional[CacheEntry]:
+        key = self.key_for(url, page)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, stored_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            body = self._body_path(key).read_text(encoding="utf-8")
+        except OSError:
+            self._delete(key)
+            return None
+
+        now = time.time()
+        etag, last_modified, stored_at = row
+        fresh = now - stored_at < self.ttl_sec
+        with self._lock:
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            if fresh:
+                self.hits += 1
+        return CacheEntry(
+            body=body,
+            etag=etag,
+            last_modified=last_modified,
+            stored_at=stored_at,
+            fresh=fresh,
+        )
+
+    def store(self, url: str, page: int, body: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        key = self.key_for(url, page)
+        path = self._body_path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = body.encode("utf-8")
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), page, etag, last_modified, now, now, len(data)),
+            )
+            self._db.commit()
+            self.misses += 1
+        self._evict()
+
+    def refresh(self, url: str, page: int) -> None:
+        """
+        Mark an entry fresh again after the origin answered 304 Not Modified.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, self.key_for(url, page)),
+            )
+            self._db.commit()
+            self.revalidated += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+        try:
+            self._body_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        with self._lock:
+            (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+        for key in victims:
+            self._delete(key)
+        with self._lock:
+            self.evictions += len(victims)
+        logging.debug("HttpCache: evicted %d entries", len(victims))
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import email.utils
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+# Responses that mean "slow down / try again later"; anything else 4xx is final.
+RETRY_STATUSES: Tuple[int, ...] = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES: Tuple[int, ...] = (429, 503)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After as seconds to wait: either delta-seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay_sec: float = 0.5
+    max_delay_sec: float = 30.0
+    # Upper bound on a server-requested Retry-After before giving up instead.
+    max_retry_after_sec: float = 300.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds to sleep before retry number `attempt` (1-based): full-jitter
+        exponential backoff, but never less than Retry-After. None means the
+        server asked for a longer wait than max_retry_after_sec.
+        """
+        backoff = random.uniform(0, min(self.max_delay_sec, self.base_delay_sec * 2 ** (attempt - 1)))
+        if retry_after is None:
+            return backoff
+        if retry_after > self.max_retry_after_sec:
+            return None
+        return max(retry_after, backoff)
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket (requests/sec) combined with an AIMD concurrency window,
+    shared by every request the client makes.
+
+    Healthy responses raise the rate additively and grow the window by about
+    one slot per window of successes. A throttling response (429/503) halves
+    both, and its Retry-After pauses all requests until it has passed; other
+    server or network errors halve the window only. The limiter thereby
+    settles just below the rate the server starts throttling at.
+    """
+
+    def __init__(
+        self,
+        rate_per_sec: float = 2.0,
+        min_rate_per_sec: float = 0.2,
+        max_rate_per_sec: float = 20.0,
+        max_concurrency: int = 10,
+        rate_step: float = 0.2,
+    ):
+        self.min_rate = min_rate_per_sec
+        self.max_rate = max(max_rate_per_sec, min_rate_per_sec)
+        self.rate = min(max(rate_per_sec, self.min_rate), self.max_rate)
+        self.rate_step = rate_step
+        self.max_concurrency = max(1, max_concurrency)
+        self.window = float(min(2, self.max_concurrency))
+
+        self._cond = threading.Condition()
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self.throttled = 0
+        self.succeeded = 0
+
+    def _refill(self, now: float) -> None:
+        # Burst is capped at one second's worth of tokens.
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._active >= int(self.window):
+                    wait = None
+                elif self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self._active += 1
+                    return
+                self._cond.wait(wait)
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.succeeded += 1
+            self.rate = min(self.max_rate, self.rate + self.rate_step)
+            self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._cond:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.window = max(1.0, self.window / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_error(self) -> None:
+        with self._cond:
+            self.window = max(1.0, self.window / 2)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "ratePerSec": round(self.rate, 3),
+                "concurrency": int(self.window),
+                "succeeded": self.succeeded,
+                "throttled": self.throttled,
+            }
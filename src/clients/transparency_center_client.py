@@ -4,10 +4,26 @@ import json
 import logging
 import random
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, Optional
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from storage.response_archive import ArchivedResponse, ResponseArchive
+from utils.metrics import Metrics
+from utils.proxies import ProxyPool, ProxyState, build_requests_proxy
+
+from .http_cache import HttpCache
+from .rate_limit import RETRY_STATUSES, THROTTLE_STATUSES, AdaptiveRateLimiter, RetryPolicy, parse_retry_after
+
+# Search RPC that serves results pages after the first, as JSON.
+RPC_PATH = "/anji/_/rpc/SearchService/SearchCreatives"
+# Anti-JSON-hijacking prefix Google puts in front of RPC responses.
+XSSI_PREFIX = ")]}'"
 
 @dataclass
 class ClientSettings:
@@ -16,6 +32,76 @@ class ClientSettings:
     proxies: Optional[Dict[str, str]]
     mock: bool
     timeout_sec: int = 30
+    # Upper bound on pooled keep-alive connections; should cover the paginator's prefetch window.
+    max_connections: int = 10
+    # Optional persistent response cache; disabled when cache_dir is None.
+    cache_dir: Optional[Path] = None
+    cache_ttl_sec: int = 6 * 3600
+    cache_max_bytes: int = 512 * 1024 * 1024
+    # Retries (429/5xx/network errors) with jittered exponential backoff.
+    max_attempts: int = 5
+    retry_base_sec: float = 0.5
+    retry_max_sec: float = 30.0
+    # Adaptive request rate: starts at rate_per_sec, grows while healthy.
+    rate_per_sec: float = 2.0
+    max_rate_per_sec: float = 20.0
+    # Serve mock pages when a real fetch fails for good (off: the error propagates).
+    mock_fallback: bool = False
+    # Proxy pool: one session, cookie jar and rate limiter per proxy URL. When
+    # set, it replaces `proxies`. Cookie jars are assigned to proxies round-robin
+    # (default: every proxy starts from `cookies`).
+    proxy_pool: List[str] = field(default_factory=list)
+    cookie_jars: List[Dict[str, str]] = field(default_factory=list)
+    proxy_cooldown_sec: float = 60.0
+    # Send page requests to this scheme://host[:port] instead of the URL's own
+    # host (e.g. a local stand-in server); path and query are kept.
+    base_host: Optional[str] = None
+    rpc_path: str = RPC_PATH
+    # Optional record of every response for offline replay; disabled when
+    # archive_dir is None.
+    archive_dir: Optional[Path] = None
+    archive_segment_mb: int = 256
+    archive_compression: str = "gzip"
+
+class FetchError(RuntimeError):
+    """
+    A page could not be fetched, after retries where they apply.
+    """
+
+def decode_rpc_body(body: str) -> Dict[str, Any]:
+    """
+    The JSON payload of a search RPC response (ValueError if it is not one).
+    """
+    return json.loads(body[len(XSSI_PREFIX) :] if body.startswith(XSSI_PREFIX) else body)
+
+class _Route:
+    """
+    One exit for page requests: a pooled session (with its own cookie jar),
+    the proxy it goes through and the rate limiter for that exit IP.
+    """
+
+    def __init__(
+        self,
+        settings: ClientSettings,
+        proxies: Optional[Dict[str, str]],
+        cookies: Optional[Dict[str, str]],
+    ):
+        self.proxies = proxies
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.max_connections,
+            pool_maxsize=settings.max_connections,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": settings.user_agent})
+        if cookies:
+            self.session.cookies.update(cookies)
+        self.limiter = AdaptiveRateLimiter(
+            rate_per_sec=settings.rate_per_sec,
+            max_rate_per_sec=settings.max_rate_per_sec,
+            max_concurrency=settings.max_connections,
+        )
 
 class TransparencyCenterClient:
     """
@@ -30,25 +116,143 @@ class TransparencyCenterClient:
 
     BASE_HOST = "adstransparency.google.com"
 
-    def __init__(self, settings: ClientSettings):
+    def __init__(self, settings: ClientSettings, metrics: Optional[Metrics] = None):
         self.settings = settings
-        self._session = requests.Session()
-        self._session.headers.update({"User-Agent": self.settings.user_agent})
-        if settings.cookies:
-            self._session.cookies.update(settings.cookies)
+        # Fetch latency/bytes and HTTP status counts are recorded here when set.
+        self.metrics = metrics
+        self.proxy_pool: Optional[ProxyPool] = None
+        self._routes: Dict[Optional[str], _Route] = {}
+        if settings.proxy_pool:
+            self.proxy_pool = ProxyPool(settings.proxy_pool, cooldown_sec=settings.proxy_cooldown_sec)
+            jars = settings.cookie_jars or [settings.cookies or {}]
+            for i, url in enumerate(settings.proxy_pool):
+                self._routes[url] = _Route(settings, build_requests_proxy(url), jars[i % len(jars)])
+        else:
+            self._routes[None] = _Route(settings, settings.proxies, settings.cookies)
+        self.retry_policy = RetryPolicy(
+            max_attempts=max(1, settings.max_attempts),
+            base_delay_sec=settings.retry_base_sec,
+            max_delay_sec=settings.retry_max_sec,
+        )
+        self.cache: Optional[HttpCache] = None
+        if settings.cache_dir is not None:
+            self.cache = HttpCache(
+                settings.cache_dir,
+                ttl_sec=settings.cache_ttl_sec,
+                max_bytes=settings.cache_max_bytes,
+            )
+        self.archive: Optional[ResponseArchive] = None
+        if settings.archive_dir is not None:
+            self.archive = ResponseArchive(
+                settings.archive_dir,
+                segment_bytes=settings.archive_segment_mb * 1024 * 1024,
+                compression=settings.archive_compression,
+            )
 
-    def _http_get(self, url: str) -> str:
-        try:
-            resp = self._session.get(
+    def _http_get(self, url: str, page: int = 1) -> str:
+        cached = self.cache.lookup(url, page) if self.cache else None
+        if cached is not None and cached.fresh:
+            logging.debug("Cache hit: %s (page=%s)", url, page)
+            self._count_status("cached")
+            return cached.body
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        policy = self.retry_policy
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            # Each attempt picks a route afresh, so retries move to healthier proxies.
+            route, proxy = self._acquire_route()
+            elapsed: Optional[float] = None
+            try:
+                with route.limiter.slot():
+                    started = time.perf_counter()
+                    resp = route.session.get(
+                        url,
+                        headers=headers,
+                        timeout=self.settings.timeout_sec,
+                        proxies=route.proxies,
+                    )
+                    elapsed = time.perf_counter() - started
+            except requests.RequestException as e:
+                self._count_status("error")
+                route.limiter.on_error()
+                self._release_route(proxy, ok=False)
+                failure = f"{type(e).__name__}: {e}"
+            else:
+                self._count_status(resp.status_code)
+                # A final 4xx says nothing about the proxy's health.
+                self._release_route(
+                    proxy,
+                    ok=resp.status_code not in RETRY_STATUSES,
+                    latency=elapsed,
+                    throttled=resp.status_code in THROTTLE_STATUSES,
+                )
+                if resp.status_code == 304 and cached is not None:
+                    route.limiter.on_success()
+                    self.cache.refresh(url, page)
+                    return cached.body
+                if resp.status_code < 400:
+                    route.limiter.on_success()
+                    if self.cache is not None and resp.text:
+                        self.cache.store(
+                            url,
+                            page,
+                            resp.text,
+                            etag=resp.headers.get("ETag"),
+                            last_modified=resp.headers.get("Last-Modified"),
+                        )
+                    return resp.text
+                if resp.status_code not in RETRY_STATUSES:
+                    raise FetchError(f"HTTP {resp.status_code} for {url} (page={page})")
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                if resp.status_code in THROTTLE_STATUSES:
+                    route.limiter.on_throttle(retry_after)
+                else:
+                    route.limiter.on_error()
+                failure = f"HTTP {resp.status_code}"
+
+            if attempt >= policy.max_attempts:
+                raise FetchError(f"{failure} for {url} (page={page}) after {attempt} attempts")
+            delay = policy.delay(attempt, retry_after)
+            if delay is None:
+                raise FetchError(f"{failure} for {url} (page={page}); Retry-After of {retry_after:.0f}s is too long")
+            logging.warning(
+                "%s for %s (page=%s); retry %d/%d in %.1fs",
+                failure,
                 url,
-                timeout=self.settings.timeout_sec,
-                proxies=self.settings.proxies,
+                page,
+                attempt,
+                policy.max_attempts - 1,
+                delay,
             )
-            resp.raise_for_status()
-            return resp.text
-        except Exception as e:
-            logging.warning("HTTP fetch failed: %s; falling back to mock.", e)
-            return ""
+            time.sleep(delay)
+
+    def _acquire_route(self) -> Tuple[_Route, Optional[ProxyState]]:
+        if self.proxy_pool is None:
+            return self._routes[None], None
+        proxy = self.proxy_pool.acquire()
+        return self._routes[proxy.url], proxy
+
+    def _release_route(
+        self,
+        proxy: Optional[ProxyState],
+        ok: bool,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+    ) -> None:
+        if proxy is not None:
+            self.proxy_pool.release(proxy, ok, latency=latency, throttled=throttled)
+
+    def _count_status(self, status: Any) -> None:
+        if self.metrics is not None:
+            self.metrics.count_status("page", status)
 
     def fetch_page(self, url: str, page: int) -> Dict[str, Any]:
         """
@@ -58,46 +262,185 @@ class TransparencyCenterClient:
           "mode": "mock" | "html",
           "payload": { ... } or "<html> ... </html>"
         }
+
+        In real mode this is the origin page itself; later pages come from
+        fetch_rpc_page().
         """
+        if self.metrics is None:
+            return self._fetch_page(url, page)
+        with self.metrics.timed("fetch") as sample:
+            page_doc = self._fetch_page(url, page)
+            if page_doc["mode"] == "html":
+                sample.bytes = len(page_doc["payload"])
+            return page_doc
+
+    def _fetch_page(self, url: str, page: int) -> Dict[str, Any]:
         if self.settings.mock:
             logging.debug("Mock fetch: %s (page=%s)", url, page)
-            return {
+            page_doc = {
                 "mode": "mock",
                 "payload": self._mock_payload(url=url, page=page),
             }
+            self._archive_doc("page", url, url, page, page_doc)
+            return page_doc
 
-        html = self._http_get(url)
-        if not html:
+        try:
+            html = self._http_get(self.resolve_url(url), page)
+        except FetchError as e:
+            if not self.settings.mock_fallback:
+                raise
+            logging.warning("%s; falling back to mock.", e)
+            html = ""
+        if not html and self.settings.mock_fallback:
             # synthesize small payload if network fails
-            return {
+            page_doc = {
                 "mode": "mock",
                 "payload": self._mock_payload(url=url, page=page),
             }
+        else:
+            page_doc = {"mode": "html", "payload": html}
+        self._archive_doc("page", url, url, page, page_doc)
+        return page_doc
+
+    def fetch_detail(self, url: str) -> Dict[str, Any]:
+        """
+        Fetches a creative's detail page (its `url`) as an html page document.
+        Mock listings are already complete, so mock mode returns no items.
+        Failures raise FetchError regardless of mock_fallback.
+        """
+        if self.settings.mock:
+            return {"mode": "mock", "payload": {"items": []}}
+        # Detail pages are cached as "page 0" of their URL.
+        page_doc = {"mode": "html", "payload": self._http_get(self.resolve_url(url), 0)}
+        self._archive_doc("detail", url, url, 0, page_doc)
+        return page_doc
+
+    def fetch_rpc_page(self, origin_url: str, page_token: str, page: int) -> Dict[str, Any]:
+        """
+        Fetches a later results page from the search RPC endpoint, continuing
+        from the token carried by the previous page:
+
+        {"mode": "rpc", "payload": {"creatives": [...], "nextPageToken": ...}}
+        """
+        if self.metrics is None:
+            return self._fetch_rpc_page(origin_url, page_token, page)[0]
+        with self.metrics.timed("fetch") as sample:
+            page_doc, sample.bytes = self._fetch_rpc_page(origin_url, page_token, page)
+            return page_doc
+
+    def _fetch_rpc_page(self, origin_url: str, page_token: str, page: int) -> Tuple[Dict[str, Any], int]:
+        rpc_url = self.rpc_url(origin_url, page_token)
+        url = self.resolve_url(rpc_url)
+        try:
+            body = self._http_get(url, page)
+            try:
+                payload = decode_rpc_body(body)
+            except ValueError as e:
+                raise FetchError(f"Unexpected RPC response for {url} (page={page}): {e}") from e
+        except FetchError as e:
+            if not self.settings.mock_fallback:
+                raise
+            logging.warning("%s; falling back to mock.", e)
+            page_doc = {"mode": "mock", "payload": self._mock_payload(url=origin_url, page=page)}
+            self._archive_doc("rpc", rpc_url, origin_url, page, page_doc)
+            return page_doc, 0
+        self._archive("rpc", "rpc", rpc_url, origin_url, page, body)
+        return {"mode": "rpc", "payload": payload}, len(body)
+
+    def _archive_doc(self, kind: str, url: str, origin_url: str, page: int, page_doc: Dict[str, Any]) -> None:
+        if self.archive is None:
+            return
+        payload = page_doc["payload"]
+        body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        self._archive(kind, page_doc["mode"], url, origin_url, page, body)
+
+    def _archive(self, kind: str, mode: str, url: str, origin_url: str, page: int, body: str) -> None:
+        """
+        Appends a response, as the pipeline received it, to the archive (if
+        any). Cache hits are archived too, so a replay sees the whole crawl.
+        """
+        if self.archive is None:
+            return
+        self.archive.append(
+            ArchivedResponse(
+                kind=kind, mode=mode, url=url, origin_url=origin_url, page=page, fetched_at=time.time(), body=body
+            )
+        )
+
+    def rpc_url(self, origin_url: str, page_token: str) -> str:
+        """
+        Search RPC request for the page after page_token: the origin's query
+        (region, filters) plus its path, which names the advertiser or search.
+        """
+        parts = urlsplit(origin_url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        query += [("path", parts.path), ("pageToken", page_token)]
+        return urlunsplit((parts.scheme, parts.netloc, self.settings.rpc_path, urlencode(query), ""))
+
+    def resolve_url(self, url: str) -> str:
+        """
+        The URL actually requested for url, after applying base_host.
+        """
+        base = self.settings.base_host
+        if not base:
+            return url
+        if "://" not in base:
+            base = f"http://{base}"
+        target = urlsplit(base)
+        parts = urlsplit(url)
+        return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, parts.fragment))
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats() if self.cache else {}
+
+    def rate_limit_stats(self) -> Dict[str, float]:
+        """
+        Limiter state summed over all routes (one per proxy).
+        """
+        total: Dict[str, float] = {}
+        for route in self._routes.values():
+            for key, value in route.limiter.stats().items():
+                total[key] = round(total.get(key, 0) + value, 3)
+        return total
+
+    def proxy_stats(self) -> List[Dict[str, Any]]:
+        return self.proxy_pool.stats() if self.proxy_pool else []
 
-        return {"mode": "html", "payload": html}
+    def close(self) -> None:
+        for route in self._routes.values():
+            route.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
 
     # -------------------- MOCK GENERATOR -------------------- #
 
-    def _mock_payload(self, url: str, page: int) -> Dict[str, Any]:
-        random.seed(hash((url, page)) & 0xFFFFFFFF)
+    def _mock_payload(self, url: str, page: int, now: Optional[int] = None) -> Dict[str, Any]:
+        # Private generator: pages may be produced concurrently from worker threads.
+        # Seeded from (url, page) with a stable hash, so given a fixed `now` the
+        # page is identical across processes (the benchmark workload relies on it).
+        rng = random.Random(zlib.crc32(f"{url}\x00{page}".encode("utf-8")))
+        if now is None:
+            now = int(time.time())
         # emulate 20 creatives per page
         items = []
         for i in range(20):
-            creative_id = f"CR{page:02d}{i:02d}{random.randint(10,99)}{random.randint(100000,999999)}"
-            lower = random.choice([1000, 5000, 10000, 50000, 100000, 300000, 500000])
-            upper = lower + random.choice([500, 1000, 5000, 10000, 100000])
-            ts = int(time.time()) - random.randint(0, 60 * 60 * 24 * 365)
-            last = ts + random.randint(0, 60 * 60 * 24 * 200)
-            country = random.choice(["DE", "US", "GB", "FR", "ES", "IT", "NL", "SE"])
+            creative_id = f"CR{page:02d}{i:02d}{rng.randint(10,99)}{rng.randint(100000,999999)}"
+            lower = rng.choice([1000, 5000, 10000, 50000, 100000, 300000, 500000])
+            upper = lower + rng.choice([500, 1000, 5000, 10000, 100000])
+            ts = now - rng.randint(0, 60 * 60 * 24 * 365)
+            last = ts + rng.randint(0, 60 * 60 * 24 * 200)
+            country = rng.choice(["DE", "US", "GB", "FR", "ES", "IT", "NL", "SE"])
             items.append(
                 {
                     "id": creative_id,
-                    "advertiserId": f"AR{random.randint(10**18, 10**19 - 1)}",
+                    "advertiserId": f"AR{rng.randint(10**18, 10**19 - 1)}",
                     "creativeId": creative_id,
-                    "advertiserName": random.choice(
+                    "advertiserName": rng.choice(
                         ["Acme GmbH", "My Jewellery B.V", "Globex Corp", "Initech", "Umbrella SA"]
                     ),
-                    "format": random.choice(["IMAGE", "TEXT", "VIDEO"]),
+                    "format": rng.choice(["IMAGE", "TEXT", "VIDEO"]),
                     "url": f"https://{self.BASE_HOST}/advertiser/AR123/creative/{creative_id}?region={country}",
                     "previewUrl": "https://encrypted-tbn2.gstatic.com/shopping?q=tbn:ANd9GcQ",
                     "firstShownAt": str(ts),
@@ -125,7 +468,7 @@ class TransparencyCenterClient:
                     ],
                     "variants": [
                         {
-                            "textContent": random.choice(
+                            "textContent": rng.choice(
                                 [
                                     "Great offer on shoes",
                                     "Handykette mit Leopardenmuster",
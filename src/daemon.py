@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import socketserver
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Ensure imports work when running this file directly
+CURRENT_DIR = Path(__file__).resolve().parent
+if str(CURRENT_DIR) not in sys.path:
+    sys.path.insert(0, str(CURRENT_DIR))
+
+from main import load_settings  # noqa: E402
+from pipelines.runner import COMPRESSION_SUFFIXES, parse_formats  # noqa: E402
+from pipelines.service import ScrapeService, ServiceConfig  # noqa: E402
+from storage.job_queue import JOB_STATUSES  # noqa: E402
+
+JOB_RE = re.compile(r"^/jobs/(\d+)(/output)?/?$")
+
+_CHUNK = 64 * 1024
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+def make_handler(service: ScrapeService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        """
+        POST /jobs              submit {"originUrl", "maxItems", "downloadMedia"}
+                                (or {"jobs": [...]})
+        GET  /jobs[?status=]    recent jobs (at most ?limit=, default 100)
+        GET  /jobs/N            one job, with live progress and throughput
+        GET  /jobs/N/output     the job's committed JSONL so far
+        DELETE /jobs/N          cancel a queued job
+        GET  /stats             service throughput, cache and rate limiter state
+        """
+
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            parts = urlsplit(self.path)
+            if parts.path in ("/stats", "/healthz"):
+                self._json(200, service.stats() if parts.path == "/stats" else {"ok": True})
+                return
+            if parts.path.rstrip("/") == "/jobs":
+                query = parse_qs(parts.query)
+                status = (query.get("status") or [None])[0]
+                if status is not None and status not in JOB_STATUSES:
+                    self._json(400, {"error": f"status must be one of {', '.join(JOB_STATUSES)}"})
+                    return
+                try:
+                    limit = int((query.get("limit") or ["100"])[0])
+                except ValueError:
+                    limit = 0
+                if limit < 1:
+                    self._json(400, {"error": "limit must be a positive integer"})
+                    return
+                self._json(200, {"jobs": service.queue.list(status=status, limit=limit)})
+                return
+            m = JOB_RE.match(parts.path)
+            if m is None:
+                self._json(404, {"error": "not found"})
+                return
+            job_id = int(m.group(1))
+            if m.group(2):
+                self._send_output(job_id)
+                return
+            job = service.job(job_id)
+            if job is None:
+                self._json(404, {"error": f"no job {job_id}"})
+                return
+            self._json(200, job)
+
+        def do_POST(self) -> None:
+            if urlsplit(self.path).path.rstrip("/") != "/jobs":
+                self._json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if isinstance(payload, dict) and isinstance(payload.get("jobs"), list):
+                    self._json(202, {"jobs": [service.submit(p) for p in payload["jobs"]]})
+                elif isinstance(payload, dict):
+                    self._json(202, service.submit(payload))
+                else:
+                    raise ValueError("Body must be a JSON object")
+            except (ValueError, TypeError) as e:
+                self._json(400, {"error": str(e)})
+
+        def do_DELETE(self) -> None:
+            m = JOB_RE.match(urlsplit(self.path).path)
+            if m is None or m.group(2):
+                self._json(404, {"error": "not found"})
+                return
+            job_id = int(m.group(1))
+            if service.cancel(job_id):
+                self._json(200, service.job(job_id))
+            elif service.job(job_id) is None:
+                self._json(404, {"error": f"no job {job_id}"})
+            else:
+                self._json(409, {"error": f"job {job_id} is no longer queued"})
+
+        def _send_output(self, job_id: int) -> None:
+            path, size = service.output_path(job_id)
+            if path is None or not path.exists():
+                self._json(404, {"error": f"no output yet for job {job_id}"})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            # Only the committed part: bytes past it may be a half-written page.
+            with path.open("rb") as f:
+                remaining = size
+                while remaining > 0:
+                    chunk = f.read(min(_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+        def _json(self, status: int, body: Any) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def address_string(self) -> str:
+            # Unix-socket peers have no address.
+            return str(self.client_address[0]) if self.client_address else "unix"
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            logging.debug("api: " + fmt, *args)
+
+    return Handler
+
+def resolve_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Scraper service: warm sessions, a persistent job queue and a local HTTP API."
+    )
+    parser.add_argument(
+        "--settings",
+        default=str(CURRENT_DIR / "config" / "settings.example.json"),
+        help="Path to settings JSON (same keys as main.py).",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP API address.")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP API port.")
+    parser.add_argument("--unix-socket", default=None, help="Serve the API on this Unix socket instead of TCP.")
+    parser.add_argument(
+        "--out-dir",
+        default=str(Path.cwd() / "service"),
+        help="Job queue, per-job outputs (job-NNNNNN/) and the shared media directory.",
+    )
+    parser.add_argument(
+        "--formats",
+        default="jsonl,csv",
+        help="Comma-separated output backends per job: jsonl, csv, parquet, sqlite (sqlite is shared by all jobs).",
+    )
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES), default="none")
+    parser.add_argument("--job-workers", type=int, default=2, help="Jobs crawled concurrently.")
+    parser.add_argument("--real-http", action="store_true", help="Force real HTTP mode even if settings.mock=true.")
+    parser.add_argument("--prefetch", type=int, default=None, help="Overrides settings.prefetchPages.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip creatives already recorded in the seen index (<out-dir>/seen_creatives.sqlite).",
+    )
+    parser.add_argument("--drain-sec", type=float, default=30.0, help="On shutdown, wait this long for running jobs.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return parser.parse_args()
+
+def run() -> None:
+    args = resolve_args()
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format="%(asctime)s | %(levelname)-8s | %(threadName)s | %(message)s",
+    )
+    settings_raw = load_settings(Path(args.settings))
+    out_dir = Path(args.out_dir)
+    config = ServiceConfig(
+        settings_raw=settings_raw,
+        out_dir=out_dir,
+        real_http=args.real_http,
+        prefetch=args.prefetch or int(settings_raw.get("prefetchPages") or 1),
+        formats=tuple(parse_formats(args.formats)),
+        compress=args.compress,
+        job_workers=args.job_workers,
+        seen_index_path=out_dir / "seen_creatives.sqlite" if args.incremental else None,
+    )
+    out_dir.mkdir(parents=True, exist_ok=True)
+    service = ScrapeService(config)
+
+    httpd: Optional[socketserver.BaseServer]
+    if args.unix_socket:
+        httpd = UnixHTTPServer(args.unix_socket, make_handler(service))
+        where = args.unix_socket
+    else:
+        httpd = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+        httpd.daemon_threads = True
+        where = "http://%s:%d" % httpd.server_address[:2]
+
+    def shutdown(signum: int, frame: Any) -> None:
+        # shutdown() blocks until serve_forever returns, so not from its thread.
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    service.start()
+    logging.info(
+        "Scraper service listening on %s | outputs in %s | mock=%s", where, out_dir, service.client.settings.mock
+    )
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        logging.info("Shutting down; waiting up to %gs for running jobs", args.drain_sec)
+        service.stop(drain_sec=args.drain_sec)
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+if __name__ == "__main__":
+    run()
@@ -3,14 +3,18 @@ from __future__ import annotations
 import json
 import logging
 import re
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
 
-from .variants_parser import extract_variants_from_html
+from .html_scanner import scan_html_chunks
+from .variants_parser import variants_from_scan
+
+_NEXT_PAGE_TOKEN_RE = re.compile(r'"nextPageToken"\s*:\s*"((?:[^"\\]|\\.)*)"')
 
 def parse_creatives(page_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
-    Convert a page document (mock or raw HTML) into a list of creative dicts
-    ready for normalization.
+    Convert a page document (mock, raw HTML or RPC JSON) into a list of creative dicts
+    ready for normalization. HTML payloads may be a string or an iterable of
+    text chunks (e.g. a streamed response); either way they are scanned once.
     """
     mode = page_doc.get("mode")
     payload = page_doc.get("payload")
@@ -20,24 +24,25 @@ def parse_creatives(page_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
         logging.debug("Extractor (mock): %d items", len(items))
         return items
 
-    if mode == "html" and isinstance(payload, str):
-        html = payload
-        # Attempt to find JSON objects embedded in the page (common in SPAs)
-        json_blobs = _extract_json_blobs(html)
+    if mode == "rpc" and isinstance(payload, (dict, list)):
+        items = []
+        _collect_creatives(payload, items)
+        logging.debug("Extractor (rpc): %d items", len(items))
+        return items
+
+    if mode == "html" and payload is not None:
+        chunks: Iterable[str] = [payload] if isinstance(payload, str) else payload
+        scan = scan_html_chunks(chunks)
+        # JSON objects embedded in the page (common in SPAs)
         items: List[Dict[str, Any]] = []
-        for blob in json_blobs:
-            if isinstance(blob, dict) and "creativeId" in blob:
-                items.append(blob)
-            elif isinstance(blob, list):
-                for inner in blob:
-                    if isinstance(inner, dict) and "creativeId" in inner:
-                        items.append(inner)
+        for blob in scan.blobs:
+            _collect_creatives(blob, items)
         if items:
             logging.debug("Extractor (html): %d JSON-backed items", len(items))
             return items
 
         # As a fallback, create a minimal item for demo purposes.
-        variants = extract_variants_from_html(html)
+        variants = variants_from_scan(scan)
         logging.debug("Extractor (html): found %d variants as fallback", len(variants))
         return [
             {
@@ -62,24 +67,50 @@ def parse_creatives(page_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
     logging.warning("Unsupported page document type; returning empty list.")
     return []
 
-def _extract_json_blobs(html: str) -> List[Any]:
+def next_page_token(page_doc: Dict[str, Any]) -> Optional[str]:
     """
-    Greedy but useful: find <script> tags that look like JSON, then parse.
+    Token for the page after this one, or None on the last page. HTML pages
+    carry it in their embedded JSON; it is found with a regex rather than a
+    second full scan of the page.
     """
-    blobs: List[Any] = []
-    for match in re.finditer(r"<script[^>]*>(.*?)</script>", html, flags=re.S | re.I):
-        content = match.group(1).strip()
-        content = _strip_html_comments(content)
-        content = content.strip()
-        if not content:
-            continue
-        # Identify JSON-like content
-        if content.startswith("{") or content.startswith("["):
-            try:
-                blobs.append(json.loads(content))
-            except Exception:
-                continue
-    return blobs
+    mode = page_doc.get("mode")
+    payload = page_doc.get("payload")
+    token: Any = None
+    if mode == "rpc" and isinstance(payload, dict):
+        token = payload.get("nextPageToken")
+    elif mode == "html" and isinstance(payload, str):
+        m = _NEXT_PAGE_TOKEN_RE.search(payload)
+        if m:
+            token = json.loads(f'"{m.group(1)}"')
+    return token if isinstance(token, str) and token else None
 
-def _strip_html_comments(text: str) -> str:
-    return re.sub(r"<!--.*?-->", "", text, flags=re.S)
\ No newline at end of file
+def estimate_creatives(page_doc: Dict[str, Any]) -> int:
+    """
+    Cheap count of the creatives on a page, without parsing it. May
+    overcount (nested creativeIds), so only use it to limit speculation.
+    """
+    payload = page_doc.get("payload")
+    if page_doc.get("mode") == "html" and isinstance(payload, str):
+        return payload.count('"creativeId"')
+    if isinstance(payload, dict):
+        for key in ("creatives", "items"):
+            if isinstance(payload.get(key), list):
+                return len(payload[key])
+    return 0
+
+def _collect_creatives(blob: Any, out: List[Dict[str, Any]]) -> None:
+    """
+    Depth-first walk collecting dicts that carry a creativeId. A creative's own
+    children are not searched.
+    """
+    if isinstance(blob, dict):
+        if "creativeId" in blob:
+            out.append(blob)
+            return
+        for value in blob.values():
+            if isinstance(value, (dict, list)):
+                _collect_creatives(value, out)
+    elif isinstance(blob, list):
+        for inner in blob:
+            if isinstance(inner, (dict, list)):
+                _collect_creatives(inner, out)
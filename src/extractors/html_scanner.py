@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional, Pattern, Tuple
+
+# Constructs whose bodies need handling; <img> tags between them are matched in bulk.
+_TAG_RE = re.compile(r"<(!--|script\b|title\b)", re.I)
+_IMG_RE = re.compile(r"""<img\b[^>]*?\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)')[^>]*>""", re.I)
+_SCRIPT_END_RE = re.compile(r"</script\s*>", re.I)
+_TITLE_END_RE = re.compile(r"</title\s*>", re.I)
+_COMMENT_END_RE = re.compile(r"-->")
+_TAG_END_RE = re.compile(r">")
+_TAIL_KEEP = 16
+
+_DECODER = json.JSONDecoder()
+# Brackets that can open a non-empty JSON value: an object with a key, or an
+# array of strings, objects, arrays or numbers. Script code like `{a:1}` or
+# `a[i]` is skipped without trying to decode it.
+_JSON_START_RE = re.compile(r'\{\s*"|\[\s*[-"{\[\d]')
+_OPENERS_RE = re.compile(r"[\[{\s]+")
+# First decode window, in characters; see _decode_at.
+_WINDOW = 256
+
+@dataclass
+class ScanResult:
+    blobs: List[Any] = field(default_factory=list)
+    title: str = ""
+    images: List[str] = field(default_factory=list)
+
+class HtmlScanner:
+    """
+    Incremental, single-pass scanner for Transparency Center pages.
+
+    Feed the page in chunks (e.g. from a streamed HTTP response) and call
+    close() to get the JSON blobs found in <script> tags, the first <title>
+    and every <img src>. Only the unconsumed tail of the input is buffered:
+    a construct split across chunks (an open script, title or img tag) waits
+    for the rest, everything before it is dropped.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        # While a construct is open, new chunks are only probed for its closing
+        # marker and parked here, so a long script split over many chunks is
+        # joined once instead of on every feed.
+        self._waiting: Optional[Pattern[str]] = None
+        self._pending: List[str] = []
+        self._tail = ""
+        self._result = ScanResult()
+        self._title_seen = False
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        if self._waiting is not None:
+            probe = self._tail + chunk
+            if not self._waiting.search(probe):
+                self._pending.append(chunk)
+                self._tail = probe[-_TAIL_KEEP:]
+                return
+            self._pending.append(chunk)
+            chunk = "".join(self._pending)
+            self._pending = []
+            self._waiting = None
+        self._buf += chunk
+        self._consume()
+
+    def close(self) -> ScanResult:
+        if self._pending:
+            self._buf += "".join(self._pending)
+            self._pending = []
+            self._waiting = None
+        self._consume(final=True)
+        self._buf = ""
+        return self._result
+
+    def _wait_for(self, marker: Pattern[str], buf: str) -> None:
+        self._waiting = marker
+        self._tail = buf[-_TAIL_KEEP:]
+
+    def _consume(self, final: bool = False) -> None:
+        buf = self._buf
+        pos = 0
+        while True:
+            m = _TAG_RE.search(buf, pos)
+            if m is None:
+                # A tag may be split across chunks: leave everything from the
+                # last "<" for the next feed.
+                end = len(buf) if final else buf.rfind("<", pos)
+                if end < 0:
+                    end = len(buf)
+                self._scan_images(buf, pos, end)
+                pos = end
+                break
+
+            start = m.start()
+            self._scan_images(buf, pos, start)
+            kind = m.group(1).lower()
+            if kind == "!--":
+                end = buf.find("-->", m.end())
+                if end < 0:
+                    self._wait_for(_COMMENT_END_RE, buf)
+                    pos = start
+                    break
+                pos = end + 3
+            else:
+                open_end = buf.find(">", m.end())
+                if open_end < 0:
+                    self._wait_for(_TAG_END_RE, buf)
+                    pos = start
+                    break
+                end_re = _SCRIPT_END_RE if kind == "script" else _TITLE_END_RE
+                close = end_re.search(buf, open_end + 1)
+                if close is None:
+                    self._wait_for(end_re, buf)
+                    pos = start
+                    break
+                body = buf[open_end + 1 : close.start()]
+                if kind == "script":
+                    self._handle_script(body)
+                elif not self._title_seen:
+                    self._result.title = body.strip()
+                    self._title_seen = True
+                pos = close.end()
+
+        self._buf = buf[pos:]
+
+    def _scan_images(self, buf: str, start: int, end: int) -> None:
+        if end > start:
+            self._result.images.extend(
+                m.group(1) if m.group(1) is not None else m.group(2) for m in _IMG_RE.finditer(buf, start, end)
+            )
+
+    def _handle_script(self, body: str) -> None:
+        if "<!--" in body:
+            body = _strip_html_comments(body)
+        content = body.strip()
+        if not content:
+            return
+        if '"creativeId"' in content:
+            self._result.blobs.extend(_decode_embedded(content))
+        elif content[0] in "{[":
+            try:
+                obj, _ = _DECODER.raw_decode(content)
+            except (ValueError, RecursionError):
+                return
+            self._result.blobs.append(obj)
+
+def _decode_embedded(text: str) -> List[Any]:
+    """
+    Locate JSON objects/arrays embedded in script code (e.g. `var data = {...};`)
+    by decoding at each bracket that can start one.
+    """
+    found: List[Any] = []
+    pos = 0
+    while True:
+        m = _JSON_START_RE.search(text, pos)
+        if m is None:
+            break
+        start = m.start()
+        try:
+            obj, end = _decode_at(text, start)
+        except ValueError:
+            pos = start + 1
+            continue
+        except RecursionError:
+            # Every bracket in this run of openers is nested too deep as well.
+            pos = _OPENERS_RE.match(text, start).end()
+            continue
+        if isinstance(obj, (dict, list)) and obj:
+            found.append(obj)
+        pos = end
+    return found
+
+def _decode_at(text: str, start: int) -> Tuple[Any, int]:
+    """
+    Decode the object/array opening at text[start] from a window of the text
+    that doubles while the value runs past its end. A JSONDecodeError works
+    out its line and column from the start of the string it was given, so a
+    miss then costs the window, not everything before the bracket.
+    """
+    size = _WINDOW
+    while True:
+        window = text[start : start + size]
+        try:
+            obj, end = _DECODER.scan_once(window, 0)
+        except (StopIteration, json.JSONDecodeError) as e:
+            # scan_once signals a missing value with StopIteration(position).
+            failed_at = e.value if isinstance(e, StopIteration) else e.pos
+            cut_short = start + size < len(text) and (
+                failed_at >= len(window) - _TAIL_KEEP
+                or isinstance(e, json.JSONDecodeError)
+                and e.msg.startswith("Unterminated string")
+            )
+            if not cut_short:
+                raise ValueError(f"No JSON value at {start}") from None
+            size *= 2
+            continue
+        # An object or array ends at its closing bracket, inside the window.
+        return obj, start + end
+
+def _strip_html_comments(text: str) -> str:
+    out = []
+    pos = 0
+    while True:
+        start = text.find("<!--", pos)
+        if start < 0:
+            out.append(text[pos:])
+            break
+        end = text.find("-->", start + 4)
+        if end < 0:
+            out.append(text[pos:])
+            break
+        out.append(text[pos:start])
+        pos = end + 3
+    return "".join(out)
+
+def scan_html(html: str) -> ScanResult:
+    scanner = HtmlScanner()
+    scanner.feed(html)
+    return scanner.close()
+
+def scan_html_chunks(chunks: Iterable[str]) -> ScanResult:
+    scanner = HtmlScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    result = scanner.close()
+    logging.debug(
+        "HtmlScanner: %d blobs, %d images, title=%r", len(result.blobs), len(result.images), result.title[:40]
+    )
+    return result
@@ -1,25 +1,26 @@
 from __future__ import annotations
 
-import re
 from typing import Any, Dict, List
 
+from .html_scanner import ScanResult, scan_html
+
 def extract_variants_from_html(html: str) -> List[Dict[str, Any]]:
     """
     Very small heuristic: extract the <title> and image tags as variants if no JSON is present.
     """
-    variants: List[Dict[str, Any]] = []
-    title = _first_or_none(re.findall(r"<title[^>]*>(.*?)</title>", html, flags=re.S | re.I))
-    imgs = re.findall(r'<img[^>]+src=["\\\']([^"\\\']+)["\\\']', html, flags=re.I)
+    return variants_from_scan(scan_html(html))
 
-    if title or imgs:
+def variants_from_scan(scan: ScanResult) -> List[Dict[str, Any]]:
+    """
+    Same heuristic, built from an existing scan so the page is not read again.
+    """
+    variants: List[Dict[str, Any]] = []
+    if scan.title or scan.images:
         variants.append(
             {
-                "textContent": title or "",
-                "images": imgs or [],
+                "textContent": scan.title or "",
+                "images": list(scan.images),
                 "imageStoreKeys": [],
             }
         )
     return variants
-
-def _first_or_none(lst: List[str]) -> str:
-    return lst[0].strip() if lst else ""
\ No newline at end of file
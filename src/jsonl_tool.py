@@ -0,0 +1,73 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+# Ensure imports work when running this file directly
+CURRENT_DIR = Path(__file__).resolve().parent
+if str(CURRENT_DIR) not in sys.path:
+    sys.path.insert(0, str(CURRENT_DIR))
+
+from storage.jsonl_index import JsonlIndex  # noqa: E402
+
+def resolve_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Index, look up and merge JSONL outputs through a memory-mapped offset index."
+    )
+    parser.add_argument(
+        "--index",
+        default=str(Path.cwd() / "jsonl_index.sqlite"),
+        help="Sidecar index file (creativeId -> file, byte offset).",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("index", help="Index new or changed JSONL files (incremental).")
+    build.add_argument("files", nargs="+", help="Uncompressed JSONL outputs.")
+
+    get = sub.add_parser("get", help="Print the newest record for a creativeId.")
+    get.add_argument("creative_id")
+    get.add_argument("--all", action="store_true", help="Print every indexed copy, newest first.")
+
+    merge = sub.add_parser(
+        "merge", help="Write one record per creativeId (newest lastShownAt wins), ordered by creativeId."
+    )
+    merge.add_argument("files", nargs="*", help="Files to merge (indexed first); default: every indexed file.")
+    merge.add_argument("--out", default=None, help="Output JSONL path (default: stdout).")
+
+    sub.add_parser("stats", help="Print file, entry and distinct creative counts.")
+    return parser.parse_args()
+
+def run() -> None:
+    args = resolve_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(message)s", stream=sys.stderr)
+    index = JsonlIndex(Path(args.index))
+    try:
+        if args.command in ("index", "merge") and args.files:
+            started = time.monotonic()
+            added = index.update(Path(f) for f in args.files)
+            logging.info("Indexed %d new lines in %.2fs", sum(added.values()), time.monotonic() - started)
+
+        if args.command == "get":
+            records = index.lookup(args.creative_id, all_versions=args.all)
+            if not records:
+                logging.error("%s is not indexed", args.creative_id)
+                sys.exit(1)
+            for rec in records:
+                sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        elif args.command == "merge":
+            paths = [Path(f) for f in args.files] or None
+            if args.out:
+                with open(args.out, "wb") as out:
+                    count = index.merge(out, paths)
+            else:
+                count = index.merge(sys.stdout.buffer, paths)
+            logging.info("Merged %d unique creatives", count)
+        elif args.command == "stats":
+            print(json.dumps(index.stats()))
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    run()
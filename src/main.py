@@ -4,22 +4,31 @@ import logging
 import os
 import sys
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, List
 
 # Ensure imports work when running this file directly
 CURRENT_DIR = Path(__file__).resolve().parent
 if str(CURRENT_DIR) not in sys.path:
     sys.path.insert(0, str(CURRENT_DIR))
 
+from utils.metrics import Metrics, profiled  # noqa: E402
 from utils.timefmt import utc_now_iso  # noqa: E402
-from utils.cookies import load_cookies  # noqa: E402
-from utils.proxies import build_requests_proxy  # noqa: E402
-from storage.dataset_writer import DatasetWriter  # noqa: E402
-from storage.media_store import MediaStore  # noqa: E402
-from clients.transparency_center_client import TransparencyCenterClient, ClientSettings  # noqa: E402
+from storage.checkpoint import Checkpoint  # noqa: E402
+from storage.seen_index import SeenIndex  # noqa: E402
+from clients.transparency_center_client import TransparencyCenterClient  # noqa: E402
 from pipelines.pagination import Paginator  # noqa: E402
 from pipelines.normalize import Normalizer  # noqa: E402
-from extractors.ad_parser import parse_creatives  # noqa: E402
+from pipelines.runner import (  # noqa: E402
+    COMPRESSION_SUFFIXES,
+    build_client_settings,
+    build_enricher,
+    build_media_store,
+    build_writer,
+    parse_formats,
+    with_compression,
+)
+from pipelines.batch import BatchConfig, read_url_list, run_batch  # noqa: E402
+from pipelines.staged import run_origin  # noqa: E402
 
 def load_settings(example_settings_path: Path) -> Dict[str, Any]:
     if example_settings_path.exists():
@@ -31,6 +40,24 @@ def read_json(path: Path) -> Dict[str, Any]:
     with path.open("r", encoding="utf-8") as f:
         return json.load(f)
 
+def resolve_origin_urls(input_payload: Dict[str, Any], input_path: Path) -> List[str]:
+    """
+    Accepts a single 'originUrl' (or 'url'), a list in 'originUrls', and/or a
+    text file with one URL per line in 'originUrlsFile' (relative to the input).
+    """
+    urls: List[str] = []
+    single = input_payload.get("originUrl") or input_payload.get("url")
+    if single:
+        urls.append(single)
+    urls.extend(u for u in input_payload.get("originUrls") or [] if u)
+    if input_payload.get("originUrlsFile"):
+        urls_file = Path(input_payload["originUrlsFile"])
+        if not urls_file.is_absolute():
+            urls_file = input_path.parent / urls_file
+        urls.extend(read_url_list(urls_file))
+    # Keep first occurrence order, drop duplicates
+    return list(dict.fromkeys(urls))
+
 def resolve_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Google Ads Transparency Center scraper (fast, normalized)."
@@ -43,7 +70,7 @@ def resolve_args() -> argparse.Namespace:
     parser.add_argument(
         "--settings",
         default=str(CURRENT_DIR / "config" / "settings.example.json"),
-        help="Path to settings JSON (cookiesFile, proxy, userAgent, mock).",
+        help="Path to settings JSON (cookiesFile, proxy, proxiesFile, userAgent, mock).",
     )
     parser.add_argument(
         "--out-jsonl",
@@ -55,6 +82,27 @@ def resolve_args() -> argparse.Namespace:
         default=str(Path.cwd() / f"ads_{utc_now_iso().replace(':', '').replace('-', '')}.csv"),
         help="Output CSV file path.",
     )
+    parser.add_argument(
+        "--out-parquet",
+        default=None,
+        help="Output directory for Parquet tables (default: <out-jsonl stem>_parquet).",
+    )
+    parser.add_argument(
+        "--out-sqlite",
+        default=None,
+        help="Output SQLite query store (default: <out-jsonl stem>.sqlite); see src/query.py.",
+    )
+    parser.add_argument(
+        "--formats",
+        default="jsonl,csv",
+        help="Comma-separated output backends to enable: jsonl, csv, parquet, sqlite.",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=sorted(COMPRESSION_SUFFIXES),
+        default="none",
+        help="Compress JSONL/CSV output (adds .gz / .zst to the output paths).",
+    )
     parser.add_argument(
         "--media-dir",
         default=str(Path.cwd() / "media"),
@@ -65,6 +113,56 @@ def resolve_args() -> argparse.Namespace:
         action="store_true",
         help="Force real HTTP mode even if settings.mock=true.",
     )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=None,
+        help="Number of page requests kept in flight (overrides settings.prefetchPages).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for multi-URL batches (overrides settings.workers; default: CPU count).",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Checkpoint file for single-URL runs (default: <out-jsonl>.checkpoint.json).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its checkpoint, appending to its outputs.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip creatives already recorded in the seen index and stop at the first all-known page.",
+    )
+    parser.add_argument(
+        "--seen-index",
+        default=str(Path.cwd() / "seen_creatives.sqlite"),
+        help="SQLite file holding creative IDs already emitted per advertiser (used with --incremental).",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        default=None,
+        help="JSON file for per-stage timings, byte counts and HTTP statuses (default: <out-jsonl>.metrics.json).",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default=None,
+        help="Also write the metrics as a Prometheus textfile (e.g. for node_exporter's textfile collector).",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help=(
+            "Write a cProfile dump of the run, its threads included, to this file "
+            "(batch workers write <file>.shardNNN; parse worker processes are not profiled)."
+        ),
+    )
     parser.add_argument(
         "--log-level",
         default="INFO",
@@ -79,10 +177,27 @@ def setup_logging(level: str) -> None:
         format="%(asctime)s | %(levelname)-8s | %(message)s",
     )
 
+def export_metrics(metrics: Metrics, args: argparse.Namespace, out_jsonl: Path) -> None:
+    metrics.finish()
+    metrics_path = Path(args.metrics_out) if args.metrics_out else out_jsonl.with_name(out_jsonl.name + ".metrics.json")
+    metrics.write_json(metrics_path)
+    if args.metrics_prom:
+        metrics.write_prometheus(Path(args.metrics_prom))
+    stages = metrics.to_dict()["stages"]
+    logging.info(
+        "Stage seconds | %s | metrics at %s",
+        " ".join(f"{name}={s['seconds']:.2f}" for name, s in stages.items() if s["latency"]["count"]),
+        metrics_path,
+    )
+
 def run() -> None:
     args = resolve_args()
     setup_logging(args.log_level)
+    with profiled(Path(args.profile) if args.profile else None):
+        scrape(args)
 
+def scrape(args: argparse.Namespace) -> None:
+    metrics = Metrics()
     input_path = Path(args.input)
     settings_path = Path(args.settings)
     media_dir = Path(args.media_dir)
@@ -95,74 +210,154 @@ def run() -> None:
     input_payload = read_json(input_path)
     settings_raw = load_settings(settings_path)
 
-    cookies = None
-    if settings_raw.get("cookiesFile"):
-        try:
-            cookies = load_cookies(Path(settings_raw["cookiesFile"]))
-        except FileNotFoundError:
-            logging.warning("cookiesFile not found; continuing without cookies")
+    prefetch = args.prefetch or int(settings_raw.get("prefetchPages") or 1)
+    formats = parse_formats(args.formats)
+    out_parquet = Path(args.out_parquet) if args.out_parquet else None
+    out_jsonl = Path(args.out_jsonl)
+    out_parquet = out_parquet or out_jsonl.with_name(out_jsonl.stem + "_parquet")
+    out_sqlite = Path(args.out_sqlite) if args.out_sqlite else out_jsonl.with_name(out_jsonl.stem + ".sqlite")
+    out_jsonl = with_compression(out_jsonl, args.compress)
+    out_csv = with_compression(Path(args.out_csv), args.compress)
+    client_settings = build_client_settings(settings_raw, real_http=args.real_http, prefetch=prefetch)
 
-    proxies = build_requests_proxy(settings_raw.get("proxy")) if settings_raw.get("proxy") else None
-    user_agent = settings_raw.get("userAgent") or (
-        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
-    )
-    mock_mode = settings_raw.get("mock", True) and not args.real_http
+    origin_urls = resolve_origin_urls(input_payload, input_path)
+    if not origin_urls:
+        raise ValueError(
+            "Input must include 'originUrl', 'originUrls' or 'originUrlsFile' "
+            "(Transparency Center search/detail URLs)."
+        )
+
+    max_items = int(input_payload.get("maxItems") or 100)
+    download_media = bool(input_payload.get("downloadMedia") or False)
 
-    client_settings = ClientSettings(
-        user_agent=user_agent,
-        cookies=cookies,
-        proxies=proxies,
-        mock=mock_mode,
-        timeout_sec=int(settings_raw.get("timeoutSec") or 30),
+    if len(origin_urls) > 1:
+        workers = args.workers or int(settings_raw.get("workers") or os.cpu_count() or 1)
+        logging.info(
+            "Starting batch | urls=%d | workers=%d | maxItems=%s | downloadMedia=%s | mock=%s",
+            len(origin_urls),
+            min(workers, len(origin_urls)),
+            max_items,
+            download_media,
+            client_settings.mock,
+        )
+        config = BatchConfig(
+            settings_raw=settings_raw,
+            real_http=args.real_http,
+            prefetch=prefetch,
+            max_items=max_items,
+            download_media=download_media,
+            out_jsonl=out_jsonl,
+            out_csv=out_csv,
+            out_parquet=out_parquet,
+            out_sqlite=out_sqlite,
+            media_dir=media_dir,
+            formats=tuple(formats),
+            log_level=args.log_level,
+            seen_index_path=Path(args.seen_index) if args.incremental else None,
+            profile_path=Path(args.profile) if args.profile else None,
+        )
+        summary = run_batch(origin_urls, config, workers=workers, metrics=metrics)
+        logging.info(
+            "Finished batch. Wrote %d records from %d/%d URLs; summary at %s",
+            summary["totalRecords"],
+            summary["succeeded"],
+            summary["urls"],
+            config.summary_path,
+        )
+        export_metrics(metrics, args, out_jsonl)
+        return
+
+    origin_url = origin_urls[0]
+    checkpoint_path = (
+        Path(args.checkpoint) if args.checkpoint else out_jsonl.with_name(out_jsonl.name + ".checkpoint.json")
     )
-    client = TransparencyCenterClient(client_settings)
 
-    origin_url = input_payload.get("originUrl") or input_payload.get("url")
-    if not origin_url:
-        raise ValueError("Input must include 'originUrl' (Transparency Center search/detail URL).")
+    checkpoint = None
+    if args.resume:
+        checkpoint = Checkpoint.load(checkpoint_path)
+        if checkpoint is None:
+            raise FileNotFoundError(f"--resume given but no checkpoint found at: {checkpoint_path}")
+        if checkpoint.origin_url != origin_url:
+            raise ValueError(f"Checkpoint is for {checkpoint.origin_url}, not {origin_url}")
+        if checkpoint.complete:
+            logging.info(
+                "Checkpoint %s is already complete (%d records); nothing to do.", checkpoint_path, checkpoint.written
+            )
+            return
+        out_jsonl = Path(checkpoint.jsonl_path)
+        out_csv = Path(checkpoint.csv_path)
+        logging.info(
+            "Resuming from page %d with %d records already written", checkpoint.next_page, checkpoint.written
+        )
+    else:
+        checkpoint = Checkpoint(origin_url=origin_url, jsonl_path=str(out_jsonl), csv_path=str(out_csv))
 
-    max_items = int(input_payload.get("maxItems") or 100)
-    download_media = bool(input_payload.get("downloadMedia") or False)
+    client = TransparencyCenterClient(client_settings, metrics=metrics)
 
     logging.info(
-        "Starting scrape | originUrl=%s | maxItems=%s | downloadMedia=%s | mock=%s",
+        "Starting scrape | originUrl=%s | maxItems=%s | downloadMedia=%s | mock=%s | prefetch=%s",
         origin_url,
         max_items,
         download_media,
         client_settings.mock,
+        prefetch,
     )
 
-    paginator = Paginator(client=client, max_items=max_items)
+    paginator = Paginator(client=client, max_items=max_items, prefetch=prefetch)
     normalizer = Normalizer(origin_url=origin_url)
-    media_store = MediaStore(media_dir=media_dir)
-
-    writer = DatasetWriter(jsonl_path=Path(args.out_jsonl), csv_path=Path(args.out_csv))
-    total = 0
-
-    # Fetch -> Extract -> Normalize -> Store
-    for page_idx, page_content in enumerate(paginator.iter_pages(origin_url), start=1):
-        logging.debug("Processing page %d", page_idx)
-        raw_creatives = parse_creatives(page_content)
-        logging.debug("Raw creatives on page %d: %d", page_idx, len(raw_creatives))
-        normalized: Iterable[Dict[str, Any]] = map(normalizer.normalize_record, raw_creatives)
-
-        for rec in normalized:
-            if download_media:
-                media_keys = media_store.capture_media(rec)
-                if media_keys:
-                    rec["mediaStoreKeys"] = media_keys
-
-            writer.write(rec)
-            total += 1
-            if total >= max_items:
-                break
-
-        if total >= max_items:
-            break
-
-    writer.close()
-    logging.info("Finished. Wrote %d records to %s and %s", total, writer.jsonl_path, writer.csv_path)
+    media_store = build_media_store(settings_raw, media_dir, metrics=metrics)
+    seen_index = SeenIndex(Path(args.seen_index)) if args.incremental else None
+    enricher = build_enricher(settings_raw, client, metrics=metrics)
+
+    writer = build_writer(
+        settings_raw,
+        formats,
+        jsonl_path=out_jsonl,
+        csv_path=out_csv,
+        parquet_dir=out_parquet,
+        resume_offsets=checkpoint.offsets if args.resume else None,
+        sqlite_path=out_sqlite,
+    )
+    try:
+        total = run_origin(
+            settings_raw,
+            origin_url,
+            prefetch,
+            paginator=paginator,
+            normalizer=normalizer,
+            writer=writer,
+            media_store=media_store,
+            max_items=max_items,
+            download_media=download_media,
+            checkpoint=checkpoint,
+            checkpoint_path=checkpoint_path,
+            seen_index=seen_index,
+            metrics=metrics,
+            enricher=enricher,
+        )
+    finally:
+        if seen_index is not None:
+            seen_index.close()
+        if enricher is not None:
+            enricher.close()
+        client.close()
+        media_store.close()
+        writer.close()
+    cache_note = ""
+    if client.cache is not None:
+        cache_note = " | cache hits={hits} misses={misses} revalidated={revalidated} evictions={evictions}".format(
+            **client.stats()
+        )
+    logging.info("Finished. Wrote %d records to %s%s", total, ", ".join(writer.outputs()), cache_note)
+    if client.cache is not None:
+        metrics.extra["cache"] = client.stats()
+    if enricher is not None:
+        metrics.extra["enrichment"] = enricher.stats()
+    if not client_settings.mock:
+        metrics.extra["rateLimiter"] = client.rate_limit_stats()
+        if client.proxy_pool is not None:
+            metrics.extra["proxies"] = client.proxy_stats()
+    export_metrics(metrics, args, out_jsonl)
 
 if __name__ == "__main__":
     run()
\ No newline at end of file
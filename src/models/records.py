@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Union
+
+# An impression bound or count: an int when the source value is a plain
+# integer, otherwise the source text, so serialization is lossless.
+Bound = Union[int, str]
+
+def compact_bound(value: Any) -> Bound:
+    """
+    Stores str(value or "0") as an int when that round-trips exactly.
+    """
+    value = value or "0"
+    if type(value) is int:
+        return value
+    text = str(value)
+    if text.isascii() and text.isdigit() and (text == "0" or text[0] != "0"):
+        return int(text)
+    return text
+
+def _impressions(lower: Bound, upper: Bound) -> Dict[str, str]:
+    return {"lowerBound": str(lower), "upperBound": str(upper)}
+
+class PlatformStat:
+    __slots__ = ("name", "code", "impressions_lower", "impressions_upper")
+
+    def __init__(self, name: Optional[str], code: Optional[str], impressions_lower: Bound, impressions_upper: Bound):
+        self.name = name
+        self.code = code
+        self.impressions_lower = impressions_lower
+        self.impressions_upper = impressions_upper
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "code": self.code,
+            "impressions": _impressions(self.impressions_lower, self.impressions_upper),
+        }
+
+class CountryStat:
+    __slots__ = (
+        "code",
+        "name",
+        "first_shown_at",
+        "last_shown_at",
+        "impressions_lower",
+        "impressions_upper",
+        "platform_stats",
+    )
+
+    def __init__(
+        self,
+        code: Optional[str],
+        name: Optional[str],
+        first_shown_at: str,
+        last_shown_at: str,
+        impressions_lower: Bound,
+        impressions_upper: Bound,
+        platform_stats: List[PlatformStat],
+    ):
+        self.code = code
+        self.name = name
+        self.first_shown_at = first_shown_at
+        self.last_shown_at = last_shown_at
+        self.impressions_lower = impressions_lower
+        self.impressions_upper = impressions_upper
+        self.platform_stats = platform_stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "name": self.name,
+            "firstShownAt": self.first_shown_at,
+            "lastShownAt": self.last_shown_at,
+            "impressions": _impressions(self.impressions_lower, self.impressions_upper),
+            "platformStats": [p.to_dict() for p in self.platform_stats],
+        }
+
+class Variant:
+    __slots__ = ("text_content", "images", "image_store_keys")
+
+    _KEYS = ("textContent", "images", "imageStoreKeys")
+
+    def __init__(self, text_content: str, images: List[str], image_store_keys: Optional[List[str]] = None):
+        self.text_content = text_content
+        self.images = images
+        self.image_store_keys = image_store_keys if image_store_keys is not None else []
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> Union["Variant", Any]:
+        """
+        Variant for the usual {textContent, images, imageStoreKeys} shape;
+        anything else is kept as extracted so it serializes unchanged.
+        """
+        if isinstance(raw, dict) and tuple(raw) == cls._KEYS:
+            return cls(raw["textContent"], raw["images"], raw["imageStoreKeys"])
+        return raw
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "textContent": self.text_content,
+            "images": self.images,
+            "imageStoreKeys": self.image_store_keys,
+        }
+
+class CreativeRecord:
+    """
+    Normalized creative. Serializes with to_dict() to the JSONL/CSV schema;
+    "id" and "creativeId" share one field, and the flattened platformStats
+    are derived from the country stats rather than stored twice.
+    """
+
+    __slots__ = (
+        "creative_id",
+        "advertiser_id",
+        "advertiser_name",
+        "format",
+        "url",
+        "preview_url",
+        "preview_store_key",
+        "first_shown_at",
+        "last_shown_at",
+        "impressions",
+        "shown_countries",
+        "country_stats",
+        "audience_selections",
+        "variants",
+        "origin_url",
+        "media_store_keys",
+    )
+
+    def __init__(
+        self,
+        creative_id: str,
+        advertiser_id: str,
+        advertiser_name: Any,
+        format: Any,
+        url: Any,
+        preview_url: Any,
+        first_shown_at: str,
+        last_shown_at: str,
+        impressions: Bound,
+        shown_countries: List[Any],
+        country_stats: List[CountryStat],
+        audience_selections: List[Any],
+        variants: List[Union[Variant, Any]],
+        origin_url: str,
+        preview_store_key: str = "",
+        media_store_keys: Optional[List[str]] = None,
+    ):
+        self.creative_id = creative_id
+        self.advertiser_id = advertiser_id
+        self.advertiser_name = advertiser_name
+        self.format = format
+        self.url = url
+        self.preview_url = preview_url
+        self.preview_store_key = preview_store_key
+        self.first_shown_at = first_shown_at
+        self.last_shown_at = last_shown_at
+        self.impressions = impressions
+        self.shown_countries = shown_countries
+        self.country_stats = country_stats
+        self.audience_selections = audience_selections
+        self.variants = variants
+        self.origin_url = origin_url
+        self.media_store_keys = media_store_keys if media_store_keys is not None else []
+
+    def platform_stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "country": c.name,
+                "countryCode": c.code,
+                "name": p.name,
+                "code": p.code,
+                "impressions": _impressions(p.impressions_lower, p.impressions_upper),
+            }
+            for c in self.country_stats
+            for p in c.platform_stats
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.creative_id,
+            "advertiserId": self.advertiser_id,
+            "creativeId": self.creative_id,
+            "advertiserName": self.advertiser_name,
+            "format": self.format,
+            "url": self.url,
+            "previewUrl": self.preview_url,
+            "previewStoreKey": self.preview_store_key,
+            "firstShownAt": self.first_shown_at,
+            "lastShownAt": self.last_shown_at,
+            "impressions": str(self.impressions),
+            "shownCountries": self.shown_countries,
+            "countryStats": [c.to_dict() for c in self.country_stats],
+            "platformStats": self.platform_stats(),
+            "audienceSelections": self.audience_selections,
+            "variants": [v.to_dict() if isinstance(v, Variant) else v for v in self.variants],
+            "originUrl": self.origin_url,
+            "mediaStoreKeys": self.media_store_keys,
+        }
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing as mp
+import queue
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from clients.transparency_center_client import TransparencyCenterClient
+from pipelines.normalize import Normalizer
+from pipelines.pagination import Paginator
+from pipelines.runner import (
+    build_client_settings,
+    build_enricher,
+    build_media_store,
+    build_writer,
+    scrape_origin,
+    tagged_path,
+)
+from storage.seen_index import SeenIndex
+from utils.metrics import Metrics, profiled
+from utils.timefmt import utc_now_iso
+
+@dataclass
+class BatchConfig:
+    """
+    Everything a worker process needs to build its own client, normalizer,
+    media store and shard writer. Must stay picklable.
+    """
+
+    settings_raw: Dict[str, Any]
+    real_http: bool
+    prefetch: int
+    max_items: int
+    download_media: bool
+    out_jsonl: Path
+    out_csv: Path
+    out_parquet: Path
+    media_dir: Path
+    # One query store shared by every shard; SQLite serializes their writes.
+    out_sqlite: Optional[Path] = None
+    formats: Tuple[str, ...] = ("jsonl", "csv")
+    log_level: str = "INFO"
+    seen_index_path: Optional[Path] = None
+    # cProfile output; each worker writes <profile_path>.shardNNN.
+    profile_path: Optional[Path] = None
+
+    def shard_paths(self, shard: int) -> Dict[str, Path]:
+        tag = f"shard{shard:03d}"
+        paths = {
+            "jsonl": tagged_path(self.out_jsonl, tag),
+            "csv": tagged_path(self.out_csv, tag),
+            "parquet": self.out_parquet.with_name(f"{self.out_parquet.name}.{tag}"),
+        }
+        if self.out_sqlite is not None:
+            paths["sqlite"] = self.out_sqlite
+        return {k: v for k, v in paths.items() if k in self.formats}
+
+    @property
+    def summary_path(self) -> Path:
+        return self.out_jsonl.with_name(self.out_jsonl.stem + ".summary.json")
+
+def read_url_list(path: Path) -> List[str]:
+    """
+    One URL per line; blank lines and lines starting with '#' are ignored.
+    """
+    urls = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+    return urls
+
+def _worker_main(shard: int, config: BatchConfig, tasks: mp.Queue, results: mp.Queue) -> None:
+    logging.basicConfig(
+        level=getattr(logging, config.log_level),
+        format=f"%(asctime)s | %(levelname)-8s | shard{shard:03d} | %(message)s",
+        force=True,
+    )
+    paths = config.shard_paths(shard)
+    metrics = Metrics()
+    client = TransparencyCenterClient(
+        build_client_settings(config.settings_raw, config.real_http, config.prefetch), metrics=metrics
+    )
+    normalizer = Normalizer(origin_url="")
+    media_store = build_media_store(config.settings_raw, config.media_dir, metrics=metrics)
+    writer = build_writer(
+        config.settings_raw,
+        config.formats,
+        jsonl_path=paths.get("jsonl"),
+        csv_path=paths.get("csv"),
+        parquet_dir=paths.get("parquet"),
+        sqlite_path=paths.get("sqlite"),
+    )
+    seen_index = SeenIndex(config.seen_index_path) if config.seen_index_path else None
+    enricher = build_enricher(config.settings_raw, client, metrics=metrics)
+    profile_path = (
+        config.profile_path.with_name(f"{config.profile_path.name}.shard{shard:03d}") if config.profile_path else None
+    )
+
+    try:
+        with profiled(profile_path):
+            while True:
+                task = tasks.get()
+                if task is None:
+                    break
+                idx, origin_url = task
+                started = time.monotonic()
+                result: Dict[str, Any] = {"index": idx, "originUrl": origin_url, "shard": shard}
+                try:
+                    paginator = Paginator(client=client, max_items=config.max_items, prefetch=config.prefetch)
+                    result["records"] = scrape_origin(
+                        origin_url,
+                        paginator=paginator,
+                        normalizer=normalizer,
+                        writer=writer,
+                        media_store=media_store,
+                        max_items=config.max_items,
+                        download_media=config.download_media,
+                        seen_index=seen_index,
+                        metrics=metrics,
+                        enricher=enricher,
+                    )
+                    result["error"] = None
+                except Exception as e:
+                    logging.exception("Scrape failed for %s", origin_url)
+                    result["records"] = 0
+                    result["error"] = f"{type(e).__name__}: {e}"
+                result["seconds"] = round(time.monotonic() - started, 3)
+                results.put(result)
+    finally:
+        if client.cache is not None:
+            logging.info("Shard finished | cache=%s", client.stats())
+        if seen_index is not None:
+            seen_index.close()
+        if enricher is not None:
+            enricher.close()
+        client.close()
+        media_store.close()
+        writer.close()
+        # Last message from this worker: its metrics, merged by run_batch.
+        results.put({"shard": shard, "metrics": metrics.to_dict()})
+
+def run_batch(
+    origin_urls: List[str], config: BatchConfig, workers: int, metrics: Optional[Metrics] = None
+) -> Dict[str, Any]:
+    """
+    Fan origin URLs out across worker processes. Each worker writes its own
+    shard files; a merged summary is written next to the outputs. A failing
+    URL (or a crashed worker) is reported in the summary and never stops the
+    rest of the batch. Worker metrics are merged into metrics when given.
+    """
+    workers = max(1, min(workers, len(origin_urls)))
+    started_at = utc_now_iso()
+    tasks: mp.Queue = mp.Queue()
+    results: mp.Queue = mp.Queue()
+    for idx, url in enumerate(origin_urls):
+        tasks.put((idx, url))
+    for _ in range(workers):
+        tasks.put(None)
+
+    procs = [
+        mp.Process(target=_worker_main, args=(shard, config, tasks, results), name=f"shard{shard:03d}")
+        for shard in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    collected: Dict[int, Dict[str, Any]] = {}
+    reported = 0
+    while len(collected) < len(origin_urls) or reported < workers:
+        try:
+            res = results.get(timeout=1.0)
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break
+            continue
+        if "index" not in res:
+            reported += 1
+            if metrics is not None:
+                metrics.merge(res["metrics"])
+            continue
+        collected[res["index"]] = res
+        logging.info(
+            "[%d/%d] %s | records=%s | error=%s",
+            len(collected),
+            len(origin_urls),
+            res["originUrl"],
+            res["records"],
+            res["error"],
+        )
+
+    for p in procs:
+        p.join()
+
+    ordered: List[Dict[str, Any]] = []
+    for idx, url in enumerate(origin_urls):
+        res: Optional[Dict[str, Any]] = collected.get(idx)
+        if res is None:
+            res = {"index": idx, "originUrl": url, "shard": None, "records": 0, "error": "worker exited"}
+        ordered.append(res)
+
+    summary = {
+        "startedAt": started_at,
+        "finishedAt": utc_now_iso(),
+        "workers": workers,
+        "urls": len(origin_urls),
+        "succeeded": sum(1 for r in ordered if not r["error"]),
+        "failed": sum(1 for r in ordered if r["error"]),
+        "totalRecords": sum(r["records"] for r in ordered),
+        "shards": [
+            {k: str(v) for k, v in config.shard_paths(shard).items()}
+            for shard in range(workers)
+        ],
+        "results": ordered,
+    }
+    with config.summary_path.open("w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
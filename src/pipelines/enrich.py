@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from clients.transparency_center_client import FetchError, TransparencyCenterClient
+from extractors.ad_parser import parse_creatives
+from utils.metrics import Metrics
+
+# Fields a detail page can fill in when the search listing left them empty.
+DETAIL_FIELDS = (
+    "countryStats",
+    "audienceSelections",
+    "shownCountries",
+    "impressions",
+    "firstShownAt",
+    "lastShownAt",
+    "variants",
+)
+
+def needs_detail(raw: Dict[str, Any]) -> bool:
+    """
+    True when the listing lacks countryStats, platformStats (nested in the
+    country stats) or audienceSelections.
+    """
+    return not raw.get("audienceSelections") or not _has_platform_stats(raw.get("countryStats"))
+
+def _has_platform_stats(stats: Any) -> bool:
+    return bool(stats) and any(isinstance(s, dict) and s.get("platformStats") for s in stats)
+
+def merge_detail(raw: Dict[str, Any], detail: Dict[str, Any]) -> None:
+    """
+    Fills raw's empty fields from the detail item in place. Country stats are
+    also replaced when only the detail carries platform stats.
+    """
+    for key in DETAIL_FIELDS:
+        if not raw.get(key) and detail.get(key):
+            raw[key] = detail[key]
+    if not _has_platform_stats(raw.get("countryStats")) and _has_platform_stats(detail.get("countryStats")):
+        raw["countryStats"] = detail["countryStats"]
+
+class DetailEnricher:
+    """
+    Optional stage between parse_creatives and the Normalizer: fetches the
+    detail page (the creative's `url`) for creatives whose listing entry is
+    missing stats, and merges the result into the raw dict.
+
+    Fetches run on a bounded thread pool through the client, so they share
+    its sessions, rate limiting and response cache; a fresh cached detail
+    page costs no request. Extracted details are also kept in memory per
+    creative, so a creative seen again (on another page or origin) is merged
+    without a fetch, and concurrent requests for the same creative share one.
+    """
+
+    def __init__(
+        self,
+        client: TransparencyCenterClient,
+        max_workers: int = 4,
+        max_cached: int = 10000,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.client = client
+        self.metrics = metrics
+        self.max_cached = max(0, max_cached)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="detail")
+        self._lock = threading.Lock()
+        self._details: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self.enriched = 0
+        self.failed = 0
+
+    def enrich(self, raws: List[Dict[str, Any]]) -> int:
+        """
+        Merges detail data into the raws that need it; returns how many were
+        enriched. Waits for this page's fetches before returning.
+        """
+        waiting: List[tuple] = []
+        for raw in raws:
+            if not needs_detail(raw):
+                continue
+            creative_id = raw.get("creativeId") or raw.get("id")
+            url = raw.get("url")
+            if not creative_id or not url:
+                continue
+            waiting.append((raw, self._submit(str(creative_id), url)))
+
+        enriched = 0
+        for raw, fut in waiting:
+            detail = fut.result()
+            if detail:
+                merge_detail(raw, detail)
+                enriched += 1
+        with self._lock:
+            self.enriched += enriched
+        return enriched
+
+    def _submit(self, creative_id: str, url: str) -> Future:
+        with self._lock:
+            if creative_id in self._details:
+                self._details.move_to_end(creative_id)
+                done: Future = Future()
+                done.set_result(self._details[creative_id])
+                return done
+            fut = self._in_flight.get(creative_id)
+            if fut is None:
+                fut = self._executor.submit(self._fetch, creative_id, url)
+                self._in_flight[creative_id] = fut
+            return fut
+
+    def _fetch(self, creative_id: str, url: str) -> Optional[Dict[str, Any]]:
+        detail: Optional[Dict[str, Any]] = None
+        fetched = failed = False
+        try:
+            if self.metrics is not None:
+                with self.metrics.timed("detail") as sample:
+                    page_doc = self.client.fetch_detail(url)
+                    payload = page_doc.get("payload")
+                    sample.bytes = len(payload) if isinstance(payload, str) else 0
+                    sample.records = 1
+            else:
+                page_doc = self.client.fetch_detail(url)
+            items = parse_creatives(page_doc)
+            detail = next(
+                (item for item in items if (item.get("creativeId") or item.get("id")) == creative_id),
+                None,
+            )
+            if detail is None:
+                logging.debug("Detail page for %s does not contain it", creative_id)
+            fetched = True
+        except FetchError as e:
+            failed = True
+            logging.warning("Detail fetch failed for %s: %s", creative_id, e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(creative_id, None)
+                # Only completed fetches are remembered: after a failure (or
+                # an unexpected error, which propagates) a later page may try again.
+                self.failed += failed
+                if self.max_cached and fetched:
+                    self._details[creative_id] = detail
+                    while len(self._details) > self.max_cached:
+                        self._details.popitem(last=False)
+        return detail
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"enriched": self.enriched, "failed": self.failed, "cached": len(self._details)}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
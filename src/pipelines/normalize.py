@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import hashlib
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
+from models.records import CountryStat, CreativeRecord, PlatformStat, Variant, compact_bound
 from utils.timefmt import to_iso_utc, to_epoch_str
 
 class Normalizer:
@@ -16,89 +17,90 @@ class Normalizer:
         self.origin_url = origin_url
 
     def normalize_record(self, raw: Dict[str, Any]) -> Dict[str, Any]:
-        # Defensive access
-        creative_id = raw.get("creativeId") or raw.get("id") or self._guess_id(raw)
-        advertiser_id = raw.get("advertiserId") or "AR_UNKNOWN"
-        advertiser_name = raw.get("advertiserName") or "Unknown"
-        fmt = raw.get("format") or self._guess_format(raw)
-        url = raw.get("url") or self.origin_url
-        preview = raw.get("previewUrl") or self._first_image(raw)
+        return self.normalize_page([raw])[0]
 
-        first_ts = to_epoch_str(raw.get("firstShownAt"))
-        last_ts = to_epoch_str(raw.get("lastShownAt"))
+    def normalize_page(self, raws: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Same as normalize_page_records, serialized to plain dicts.
+        """
+        return [rec.to_dict() for rec in self.normalize_page_records(raws)]
 
-        country_stats = self._normalize_country_stats(raw.get("countryStats") or [])
-        shown_countries = list({c.get("name") for c in country_stats if c.get("name")}) or raw.get("shownCountries") or []
+    def normalize_page_records(self, raws: Iterable[Dict[str, Any]]) -> List[CreativeRecord]:
+        """
+        Normalizes a page of extracted items in one pass. Timestamp conversions
+        are memoized in utils.timefmt, so dates repeated across the page's
+        countryStats are parsed once (and share one string object).
+        """
+        origin_url = self.origin_url
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        records: List[CreativeRecord] = []
+        for raw in raws:
+            # Defensive access
+            creative_id = raw.get("creativeId") or raw.get("id") or self._guess_id(raw)
+            advertiser_id = raw.get("advertiserId") or "AR_UNKNOWN"
+            advertiser_name = raw.get("advertiserName") or "Unknown"
+            fmt = raw.get("format") or self._guess_format(raw)
+            url = raw.get("url") or origin_url
+            preview = raw.get("previewUrl") or self._first_image(raw)
 
-        variants = raw.get("variants") or []
-        audience = raw.get("audienceSelections") or []
+            country_stats, names = self._normalize_country_stats(raw.get("countryStats") or [])
 
-        record = {
-            "id": str(creative_id),
-            "advertiserId": str(advertiser_id),
-            "creativeId": str(creative_id),
-            "advertiserName": advertiser_name,
-            "format": fmt,
-            "url": url,
-            "previewUrl": preview,
-            "previewStoreKey": "",
-            "firstShownAt": first_ts,
-            "lastShownAt": last_ts,
-            "impressions": str((raw.get("impressions") or "0")),
-            "shownCountries": shown_countries,
-            "countryStats": country_stats,
-            "platformStats": self._flatten_platforms(country_stats),
-            "audienceSelections": audience,
-            "variants": variants,
-            "originUrl": self.origin_url,
-            "mediaStoreKeys": [],
-        }
-        logging.debug("Normalized record %s", record.get("id"))
-        return record
-
-    def _normalize_country_stats(self, stats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        norm = []
-        for s in stats:
-            norm.append(
-                {
-                    "code": s.get("code"),
-                    "name": s.get("name"),
-                    "firstShownAt": to_iso_utc(s.get("firstShownAt")),
-                    "lastShownAt": to_iso_utc(s.get("lastShownAt")),
-                    "impressions": {
-                        "lowerBound": str(((s.get("impressions") or {}).get("lowerBound") or "0")),
-                        "upperBound": str(((s.get("impressions") or {}).get("upperBound") or "0")),
-                    },
-                    "platformStats": [
-                        {
-                            "name": p.get("name"),
-                            "code": p.get("code"),
-                            "impressions": {
-                                "lowerBound": str(((p.get("impressions") or {}).get("lowerBound") or "0")),
-                                "upperBound": str(((p.get("impressions") or {}).get("upperBound") or "0")),
-                            },
-                        }
-                        for p in (s.get("platformStats") or [])
-                    ],
-                }
+            record = CreativeRecord(
+                creative_id=str(creative_id),
+                advertiser_id=str(advertiser_id),
+                advertiser_name=advertiser_name,
+                format=fmt,
+                url=url,
+                preview_url=preview,
+                first_shown_at=to_epoch_str(raw.get("firstShownAt")),
+                last_shown_at=to_epoch_str(raw.get("lastShownAt")),
+                impressions=compact_bound(raw.get("impressions")),
+                shown_countries=list(names) or raw.get("shownCountries") or [],
+                country_stats=country_stats,
+                audience_selections=raw.get("audienceSelections") or [],
+                variants=[Variant.from_raw(v) for v in raw.get("variants") or []],
+                origin_url=origin_url,
             )
-        return norm
+            if debug:
+                logging.debug("Normalized record %s", record.creative_id)
+            records.append(record)
+        return records
 
-    def _flatten_platforms(self, stats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        # Build per-country platform stats in a single list
-        out: List[Dict[str, Any]] = []
+    def _normalize_country_stats(self, stats: List[Dict[str, Any]]) -> Tuple[List[CountryStat], Set[str]]:
+        """
+        Returns the normalized countryStats and, built in the same pass, the
+        set of country names.
+        """
+        norm: List[CountryStat] = []
+        names: Set[str] = set()
         for s in stats:
-            for p in s.get("platformStats", []):
-                out.append(
-                    {
-                        "country": s.get("name"),
-                        "countryCode": s.get("code"),
-                        "name": p.get("name"),
-                        "code": p.get("code"),
-                        "impressions": p.get("impressions"),
-                    }
+            name = s.get("name")
+            if name:
+                names.add(name)
+            platforms = []
+            for p in s.get("platformStats") or []:
+                imp = p.get("impressions") or {}
+                platforms.append(
+                    PlatformStat(
+                        p.get("name"),
+                        p.get("code"),
+                        compact_bound(imp.get("lowerBound")),
+                        compact_bound(imp.get("upperBound")),
+                    )
                 )
-        return out
+            imp = s.get("impressions") or {}
+            norm.append(
+                CountryStat(
+                    code=s.get("code"),
+                    name=name,
+                    first_shown_at=to_iso_utc(s.get("firstShownAt")),
+                    last_shown_at=to_iso_utc(s.get("lastShownAt")),
+                    impressions_lower=compact_bound(imp.get("lowerBound")),
+                    impressions_upper=compact_bound(imp.get("upperBound")),
+                    platform_stats=platforms,
+                )
+            )
+        return norm, names
 
     @staticmethod
     def _guess_id(raw: Dict[str, Any]) -> str:
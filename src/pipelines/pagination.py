@@ -1,41 +1,151 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Iterator
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
 
 from clients.transparency_center_client import TransparencyCenterClient
+from extractors.ad_parser import estimate_creatives, next_page_token
 
 class Paginator:
     """
     Iterates over pages from the Transparency Center until max items obtained
     or the source reports no next page.
+
+    With prefetch > 1, up to that many page requests are kept in flight while
+    the caller processes the current page, on a pool of worker threads. Pages
+    are still yielded in order. Once the crawl is complete, requests not
+    started yet are dropped; ones already sent run to completion in the
+    background and are discarded.
+
+    Real pages are chained by token: page 1 is the origin HTML, every later
+    page a search RPC call with the token from the page before, and the crawl
+    ends at the first page without one. Only the next page can be prefetched.
     """
 
-    def __init__(self, client: TransparencyCenterClient, max_items: int):
+    MAX_PAGES = 50
+
+    def __init__(self, client: TransparencyCenterClient, max_items: int, prefetch: int = 1):
         self.client = client
         self.max_items = max_items
+        self.prefetch = max(1, int(prefetch))
+
+    def iter_pages(
+        self,
+        origin_url: str,
+        start_page: int = 1,
+        fetched: int = 0,
+        page_token: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields page documents starting at start_page. fetched is the number of
+        items already obtained from earlier pages (e.g. when resuming), and
+        page_token the token for start_page in real mode.
+        """
+        if not self.client.settings.mock:
+            yield from self._iter_pages_chained(origin_url, start_page, fetched, page_token)
+            return
+        if self.prefetch > 1:
+            yield from self._iter_pages_prefetch(origin_url, start_page, fetched)
+            return
 
-    def iter_pages(self, origin_url: str) -> Iterator[Dict[str, Any]]:
-        page = 1
-        fetched = 0
+        page = start_page
 
         while True:
             page_doc = self.client.fetch_page(url=origin_url, page=page)
             yield page_doc
 
-            # Determine whether more pages exist. In mock mode, the payload indicates it.
-            if page_doc.get("mode") == "mock":
-                payload = page_doc.get("payload", {})
-                items_count = len(payload.get("items", []))
-                fetched += items_count
-                has_next = bool(payload.get("hasNext"))
-                logging.debug("Paginator (mock): page=%s items=%s fetched=%s", page, items_count, fetched)
-                if fetched >= self.max_items or not has_next:
+            has_more, fetched = self._advance(page_doc, page, fetched)
+            if not has_more:
+                break
+            page += 1
+
+    def _iter_pages_prefetch(self, origin_url: str, start_page: int, fetched: int) -> Iterator[Dict[str, Any]]:
+        executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix="prefetch")
+        in_flight: Deque[Future] = deque()
+        next_page = start_page
+        page = start_page
+        per_page = 0
+
+        try:
+            while True:
+                while not in_flight or len(in_flight) < self.prefetch and next_page <= self.MAX_PAGES:
+                    # Once the page size is known, don't speculate past what max_items needs.
+                    if in_flight and per_page and fetched + per_page * len(in_flight) >= self.max_items:
+                        break
+                    in_flight.append(executor.submit(self.client.fetch_page, origin_url, next_page))
+                    next_page += 1
+
+                page_doc = in_flight.popleft().result()
+                if page_doc.get("mode") == "mock" and not per_page:
+                    per_page = len(page_doc.get("payload", {}).get("items", []))
+                yield page_doc
+
+                has_more, fetched = self._advance(page_doc, page, fetched)
+                if not has_more:
                     break
                 page += 1
-            else:
-                # In HTML mode we can't reliably detect; stop when we have enough.
-                # The caller will break based on item count.
+        finally:
+            if in_flight:
+                logging.debug("Paginator: dropping %d prefetched page(s)", len(in_flight))
+            # Requests not started yet are cancelled; running ones finish in
+            # the background and their pages are discarded.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_pages_chained(
+        self,
+        origin_url: str,
+        start_page: int,
+        fetched: int,
+        page_token: Optional[str],
+    ) -> Iterator[Dict[str, Any]]:
+        if start_page > 1 and not page_token:
+            raise ValueError(f"Page {start_page} of {origin_url} needs the token from page {start_page - 1}")
+
+        def fetch(page: int, token: Optional[str]) -> Dict[str, Any]:
+            if page == 1:
+                return self.client.fetch_page(url=origin_url, page=1)
+            return self.client.fetch_rpc_page(origin_url, token, page)
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") if self.prefetch > 1 else None
+        pending: Optional[Future] = None
+        page = start_page
+        try:
+            page_doc = fetch(page, page_token)
+            while True:
+                page_token = next_page_token(page_doc)
+                fetched += estimate_creatives(page_doc)
+                has_more = page_token is not None and page < self.MAX_PAGES
+                logging.debug("Paginator (%s): page=%s fetched~%s next=%s", page_doc.get("mode"), page, fetched, has_more)
+                if has_more and executor is not None and fetched < self.max_items:
+                    pending = executor.submit(fetch, page + 1, page_token)
+                yield page_doc
+
+                # The caller stops consuming once it has max_items.
+                if not has_more:
+                    break
                 page += 1
-                if fetched >= self.max_items or page > 50:
-                    break
\ No newline at end of file
+                page_doc = pending.result() if pending is not None else fetch(page, page_token)
+                pending = None
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _advance(self, page_doc: Dict[str, Any], page: int, fetched: int) -> Tuple[bool, int]:
+        """
+        Returns (has_more, fetched) after the given page has been consumed.
+        """
+        # Determine whether more pages exist. In mock mode, the payload indicates it.
+        if page_doc.get("mode") == "mock":
+            payload = page_doc.get("payload", {})
+            items_count = len(payload.get("items", []))
+            fetched += items_count
+            has_next = bool(payload.get("hasNext"))
+            logging.debug("Paginator (mock): page=%s items=%s fetched=%s", page, items_count, fetched)
+            return fetched < self.max_items and has_next, fetched
+
+        # Pages served as mock fallback in real mode carry no token; stop there.
+        return False, fetched
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing as mp
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from clients.transparency_center_client import FetchError, decode_rpc_body
+from extractors.ad_parser import next_page_token, parse_creatives
+from pipelines.enrich import DetailEnricher
+from pipelines.normalize import Normalizer
+from pipelines.runner import build_writer, tagged_path
+from storage.response_archive import ArchiveReader, ArchivedResponse
+from utils.metrics import Metrics
+from utils.timefmt import utc_now_iso
+
+@dataclass
+class ReplayConfig:
+    """
+    What a replay worker needs to reprocess one archive segment. Must stay
+    picklable.
+    """
+
+    archive_dir: Path
+    settings_raw: Dict[str, Any]
+    out_jsonl: Path
+    out_csv: Path
+    out_parquet: Path
+    # One query store shared by every segment; SQLite serializes their writes.
+    out_sqlite: Optional[Path] = None
+    formats: Tuple[str, ...] = ("jsonl",)
+    # Only responses fetched in [since, until] (epoch seconds).
+    since: Optional[float] = None
+    until: Optional[float] = None
+    log_level: str = "INFO"
+
+    def segment_paths(self, segment: str) -> Dict[str, Path]:
+        tag = segment.split(".", 1)[0]
+        paths = {
+            "jsonl": tagged_path(self.out_jsonl, tag),
+            "csv": tagged_path(self.out_csv, tag),
+            "parquet": self.out_parquet.with_name(f"{self.out_parquet.name}.{tag}"),
+        }
+        if self.out_sqlite is not None:
+            paths["sqlite"] = self.out_sqlite
+        return {k: v for k, v in paths.items() if k in self.formats}
+
+    @property
+    def summary_path(self) -> Path:
+        return self.out_jsonl.with_name(self.out_jsonl.stem + ".summary.json")
+
+def page_document(resp: ArchivedResponse) -> Dict[str, Any]:
+    """
+    The page document the client returned for an archived response.
+    """
+    if resp.mode == "html":
+        return {"mode": "html", "payload": resp.body}
+    if resp.mode == "rpc":
+        return {"mode": "rpc", "payload": decode_rpc_body(resp.body)}
+    return {"mode": resp.mode, "payload": json.loads(resp.body)}
+
+def _is_last_page(page_doc: Dict[str, Any]) -> bool:
+    if page_doc.get("mode") == "mock":
+        return not page_doc.get("payload", {}).get("hasNext")
+    return next_page_token(page_doc) is None
+
+class _Listing:
+    """
+    Replay state of one origin's crawl: pages are released in page order
+    from page 1, and none after the page that ended the listing.
+    """
+
+    def __init__(self) -> None:
+        self.expect = 1
+        self.held: Dict[int, Tuple[ArchivedResponse, Dict[str, Any]]] = {}
+        self.ended = False
+
+    def add(
+        self, resp: ArchivedResponse, page_doc: Dict[str, Any]
+    ) -> Iterator[Tuple[ArchivedResponse, Dict[str, Any]]]:
+        if self.ended or resp.page < self.expect:
+            return
+        self.held.setdefault(resp.page, (resp, page_doc))
+        while not self.ended and self.expect in self.held:
+            item = self.held.pop(self.expect)
+            self.expect += 1
+            self.ended = _is_last_page(item[1])
+            yield item
+
+    def started(self) -> bool:
+        return self.expect > 1 or 1 in self.held
+
+    def flush(self) -> Iterator[Tuple[ArchivedResponse, Dict[str, Any]]]:
+        # Pages after a gap: a resumed crawl, or pages split across segments.
+        if not self.ended:
+            for page in sorted(self.held):
+                yield self.held[page]
+        self.held.clear()
+
+def crawl_pages(responses: Iterable[ArchivedResponse]) -> Iterator[Tuple[ArchivedResponse, Dict[str, Any]]]:
+    """
+    Search pages from archived responses, as the crawls consumed them: in
+    page order per origin, without the pages a prefetching paginator
+    requested past the end of a listing. A second page 1 response for an
+    origin starts a new crawl of it. Unreadable responses are logged and
+    skipped.
+    """
+    listings: Dict[str, _Listing] = {}
+    for resp in responses:
+        if resp.kind == "detail":
+            continue
+        try:
+            page_doc = page_document(resp)
+        except ValueError as e:
+            logging.warning("Skipping unreadable %s response for %s: %s", resp.kind, resp.url, e)
+            continue
+        listing = listings.get(resp.origin_url)
+        if listing is not None and resp.page == 1 and listing.started():
+            yield from listing.flush()
+            listing = None
+        if listing is None:
+            listing = listings[resp.origin_url] = _Listing()
+        yield from listing.add(resp, page_doc)
+    for listing in listings.values():
+        yield from listing.flush()
+
+class ArchivedDetails:
+    """
+    Stands in for the client in a DetailEnricher: serves detail pages from
+    the archive (the newest copy of each), never from the network.
+    """
+
+    def __init__(self, reader: ArchiveReader):
+        self.reader = reader
+
+    def fetch_detail(self, url: str) -> Dict[str, Any]:
+        resp = self.reader.lookup(url, kind="detail")
+        if resp is None:
+            raise FetchError(f"No archived detail page for {url}")
+        return page_document(resp)
+
+def replay_segment(config: ReplayConfig, segment: str) -> Dict[str, Any]:
+    """
+    Extract -> Normalize -> Store for the archived search pages of one
+    segment (see crawl_pages). Detail pages are used only to enrich (when
+    settings.enrichDetails is on). Every page a crawl consumed is written in
+    full, so a crawl that stopped at maxItems mid-page replays the rest of
+    that page too. Returns the segment's result with its metrics.
+    """
+    started = time.monotonic()
+    paths = config.segment_paths(segment)
+    metrics = Metrics()
+    reader = ArchiveReader(config.archive_dir)
+    writer = build_writer(
+        config.settings_raw,
+        config.formats,
+        jsonl_path=paths.get("jsonl"),
+        csv_path=paths.get("csv"),
+        parquet_dir=paths.get("parquet"),
+        sqlite_path=paths.get("sqlite"),
+    )
+    enricher = None
+    if config.settings_raw.get("enrichDetails"):
+        enricher = DetailEnricher(
+            ArchivedDetails(reader),
+            max_workers=int(config.settings_raw.get("detailWorkers") or 4),
+            metrics=metrics,
+        )
+    normalizer = Normalizer(origin_url="")
+    pages = 0
+    try:
+        responses = reader.iter_segment(segment, since=config.since, until=config.until)
+        for resp, page_doc in metrics.timed_iter(crawl_pages(responses), "fetch_wait"):
+            with metrics.timed("extract") as sample:
+                raws = parse_creatives(page_doc)
+                sample.bytes = len(resp.body)
+                sample.records = len(raws)
+            pages += 1
+            if enricher is not None and raws:
+                with metrics.timed("detail_wait") as sample:
+                    sample.records = enricher.enrich(raws)
+            with metrics.timed("normalize") as sample:
+                normalizer.origin_url = resp.origin_url
+                records = normalizer.normalize_page_records(raws)
+                sample.records = len(records)
+            with metrics.timed("write") as sample:
+                for rec in records:
+                    writer.write(rec)
+                sample.records = len(records)
+        with metrics.timed("write"):
+            writer.commit()
+    finally:
+        if enricher is not None:
+            enricher.close()
+        writer.close()
+        reader.close()
+    metrics.finish()
+    return {
+        "segment": segment,
+        "pages": pages,
+        "records": metrics.records,
+        "seconds": round(time.monotonic() - started, 3),
+        "outputs": {k: str(v) for k, v in paths.items()},
+        "metrics": metrics.to_dict(),
+    }
+
+def _init_worker(log_level: str) -> None:
+    logging.basicConfig(
+        level=getattr(logging, log_level),
+        format="%(asctime)s | %(levelname)-8s | %(processName)s | %(message)s",
+        force=True,
+    )
+
+def run_replay(config: ReplayConfig, workers: int, metrics: Optional[Metrics] = None) -> Dict[str, Any]:
+    """
+    Reprocesses the archive's segments in parallel, one worker process per
+    segment at a time, each writing its own output files. A failing segment
+    is reported in the summary and never stops the rest. Worker metrics are
+    merged into metrics when given.
+    """
+    started_at = utc_now_iso()
+    reader = ArchiveReader(config.archive_dir)
+    try:
+        segments = reader.segments(since=config.since, until=config.until)
+    finally:
+        reader.close()
+    config.out_jsonl.parent.mkdir(parents=True, exist_ok=True)
+    results: Dict[str, Dict[str, Any]] = {}
+    if segments:
+        workers = max(1, min(workers, len(segments)))
+        # Largest first, so one big segment does not start last.
+        by_size = sorted(segments, key=lambda s: s["bytes"], reverse=True)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config.log_level,),
+        ) as pool:
+            futures = {pool.submit(replay_segment, config, s["segment"]): s["segment"] for s in by_size}
+            for fut in as_completed(futures):
+                segment = futures[fut]
+                try:
+                    res = fut.result()
+                    res["error"] = None
+                except Exception as e:
+                    logging.exception("Replay failed for segment %s", segment)
+                    res = {"segment": segment, "pages": 0, "records": 0, "error": f"{type(e).__name__}: {e}"}
+                data = res.pop("metrics", None)
+                if data is not None and metrics is not None:
+                    metrics.merge(data)
+                results[segment] = res
+                logging.info(
+                    "[%d/%d] %s | pages=%d | records=%d | error=%s",
+                    len(results),
+                    len(segments),
+                    segment,
+                    res["pages"],
+                    res["records"],
+                    res["error"],
+                )
+
+    ordered: List[Dict[str, Any]] = [results[s["segment"]] for s in segments]
+    summary = {
+        "startedAt": started_at,
+        "finishedAt": utc_now_iso(),
+        "archiveDir": str(config.archive_dir),
+        "workers": workers,
+        "segments": len(segments),
+        "failed": sum(1 for r in ordered if r["error"]),
+        "pages": sum(r["pages"] for r in ordered),
+        "totalRecords": sum(r["records"] for r in ordered),
+        "results": ordered,
+    }
+    with config.summary_path.open("w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
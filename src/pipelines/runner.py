@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from clients.transparency_center_client import RPC_PATH, ClientSettings, TransparencyCenterClient
+from extractors.ad_parser import next_page_token, parse_creatives
+from models.records import CreativeRecord
+from pipelines.enrich import DetailEnricher
+from pipelines.normalize import Normalizer
+from pipelines.pagination import Paginator
+from storage.checkpoint import Checkpoint
+from storage.dataset_writer import DatasetWriter, compression_for
+from storage.media_store import MediaStore, PendingMedia
+from storage.seen_index import SeenIndex, advertiser_scope
+from utils.cookies import load_cookies
+from utils.metrics import Metrics
+from utils.proxies import build_requests_proxy, load_proxy_list
+
+OUTPUT_FORMATS = ("jsonl", "csv", "parquet", "sqlite")
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
+)
+
+def build_client_settings(settings_raw: Dict[str, Any], real_http: bool, prefetch: int) -> ClientSettings:
+    # cookiesFile may list several exports; with a proxy pool they rotate across proxies.
+    cookie_files = settings_raw.get("cookiesFile") or []
+    if isinstance(cookie_files, str):
+        cookie_files = [cookie_files]
+    cookie_jars: List[Dict[str, str]] = []
+    for cookie_file in cookie_files:
+        try:
+            cookie_jars.append(load_cookies(Path(cookie_file)))
+        except FileNotFoundError:
+            logging.warning("cookiesFile %s not found; continuing without it", cookie_file)
+    cookies = cookie_jars[0] if cookie_jars else None
+
+    proxies_file = Path(settings_raw["proxiesFile"]) if settings_raw.get("proxiesFile") else None
+    proxy_urls = load_proxy_list(settings_raw.get("proxy"), proxies_file)
+    proxies = build_requests_proxy(proxy_urls[0]) if len(proxy_urls) == 1 else None
+    user_agent = settings_raw.get("userAgent") or DEFAULT_USER_AGENT
+    mock_mode = settings_raw.get("mock", True) and not real_http
+    cache_dir = Path(settings_raw["cacheDir"]) if settings_raw.get("cacheDir") else None
+    archive_dir = Path(settings_raw["archiveDir"]) if settings_raw.get("archiveDir") else None
+
+    return ClientSettings(
+        user_agent=user_agent,
+        cookies=cookies,
+        proxies=proxies,
+        mock=mock_mode,
+        timeout_sec=int(settings_raw.get("timeoutSec") or 30),
+        max_connections=max(10, prefetch),
+        cache_dir=cache_dir,
+        cache_ttl_sec=int(settings_raw.get("cacheTtlSec") or 6 * 3600),
+        cache_max_bytes=int(settings_raw.get("cacheMaxMb") or 512) * 1024 * 1024,
+        max_attempts=int(settings_raw.get("maxAttempts") or 5),
+        retry_base_sec=float(settings_raw.get("retryBaseSec") or 0.5),
+        retry_max_sec=float(settings_raw.get("retryMaxSec") or 30),
+        rate_per_sec=float(settings_raw.get("ratePerSec") or 2),
+        max_rate_per_sec=float(settings_raw.get("maxRatePerSec") or 20),
+        mock_fallback=bool(settings_raw.get("mockFallback", False)),
+        proxy_pool=proxy_urls if len(proxy_urls) > 1 else [],
+        cookie_jars=cookie_jars,
+        proxy_cooldown_sec=float(settings_raw.get("proxyCooldownSec") or 60),
+        base_host=settings_raw.get("baseHost") or None,
+        rpc_path=settings_raw.get("rpcPath") or RPC_PATH,
+        archive_dir=archive_dir,
+        archive_segment_mb=int(settings_raw.get("archiveSegmentMb") or 256),
+        archive_compression=str(settings_raw.get("archiveCompression") or "gzip"),
+    )
+
+def build_media_store(settings_raw: Dict[str, Any], media_dir: Path, metrics: Optional[Metrics] = None) -> MediaStore:
+    return MediaStore(
+        media_dir=media_dir,
+        max_workers=int(settings_raw.get("mediaWorkers") or 8),
+        per_host_limit=int(settings_raw.get("mediaPerHost") or 4),
+        metrics=metrics,
+    )
+
+def build_enricher(
+    settings_raw: Dict[str, Any],
+    client: TransparencyCenterClient,
+    metrics: Optional[Metrics] = None,
+) -> Optional[DetailEnricher]:
+    """
+    The detail enrichment stage, if settings.enrichDetails is on.
+    """
+    if not settings_raw.get("enrichDetails"):
+        return None
+    return DetailEnricher(
+        client,
+        max_workers=int(settings_raw.get("detailWorkers") or 4),
+        metrics=metrics,
+    )
+
+def parse_formats(value: str) -> List[str]:
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"Unsupported output format(s) {unknown}; choose from {', '.join(OUTPUT_FORMATS)}")
+    return formats
+
+def with_compression(path: Path, compress: str) -> Path:
+    """
+    Add the ".gz"/".zst" suffix for the requested compression, unless the path
+    already names a compressed file.
+    """
+    suffix = COMPRESSION_SUFFIXES.get(compress, "")
+    if not suffix or compression_for(path):
+        return path
+    return path.with_name(path.name + suffix)
+
+def tagged_path(path: Path, tag: str) -> Path:
+    """
+    path with ".<tag>" before its format suffix, e.g. ads.jsonl.gz ->
+    ads.<tag>.jsonl.gz, so per-shard outputs keep their extensions.
+    """
+    compressed = path.suffix if compression_for(path) else ""
+    base = Path(path.name[: len(path.name) - len(compressed)])
+    return path.with_name(f"{base.stem}.{tag}{base.suffix}{compressed}")
+
+def build_writer(
+    settings_raw: Dict[str, Any],
+    formats: Sequence[str],
+    jsonl_path: Path,
+    csv_path: Path,
+    parquet_dir: Path,
+    resume_offsets: Optional[Dict[str, int]] = None,
+    sqlite_path: Optional[Path] = None,
+) -> DatasetWriter:
+    return DatasetWriter(
+        jsonl_path=jsonl_path if "jsonl" in formats else None,
+        csv_path=csv_path if "csv" in formats else None,
+        parquet_dir=parquet_dir if "parquet" in formats else None,
+        parquet_row_group_size=int(settings_raw.get("parquetRowGroupSize") or 10000),
+        resume_offsets=resume_offsets,
+        buffer_bytes=int(settings_raw.get("writeBufferKb") or 1024) * 1024,
+        json_encoder=str(settings_raw.get("jsonEncoder") or "json"),
+        sqlite_path=sqlite_path if "sqlite" in formats else None,
+        sqlite_batch_size=int(settings_raw.get("sqliteBatchSize") or 500),
+    )
+
+def resume_point(
+    origin_url: str,
+    paginator: Paginator,
+    checkpoint: Optional[Checkpoint],
+) -> Tuple[int, Optional[str], int, Set[str]]:
+    """
+    (start_page, page_token, records written, creative IDs emitted) to
+    continue a crawl from checkpoint; a fresh crawl without one.
+    """
+    if checkpoint is None:
+        return 1, None, 0, set()
+    start_page = checkpoint.next_page
+    start_token = checkpoint.next_page_token
+    if start_page > 1 and not start_token and not paginator.client.settings.mock:
+        # Real pages can only be reached through the token chain; creatives
+        # already written are skipped on the way.
+        logging.warning("Checkpoint has no page token; re-crawling %s from page 1", origin_url)
+        start_page = 1
+    return start_page, start_token, checkpoint.written, set(checkpoint.emitted_ids)
+
+def filter_page(
+    raw_ids: List[Optional[str]],
+    total: int,
+    max_items: int,
+    already_emitted: Set[str],
+    seen_index: Optional[SeenIndex] = None,
+    scope: str = "",
+    emitted_now: Optional[Set[str]] = None,
+) -> Optional[List[int]]:
+    """
+    Indices of a page's raw creatives worth normalizing, or None when the
+    crawl should stop: in incremental mode, at a page with only known
+    creatives (from the seen index, or emitted_now for ones written earlier
+    in this run that it may not hold yet).
+    """
+    keep = list(range(len(raw_ids)))
+    if seen_index is not None and keep:
+        known = seen_index.known(scope, (cid for cid in raw_ids if cid))
+        if emitted_now:
+            known |= emitted_now.intersection(cid for cid in raw_ids if cid)
+        if all(cid in known for cid in raw_ids):
+            return None
+        keep = [i for i in keep if raw_ids[i] not in known]
+    if not already_emitted:
+        # Every item is kept, so there is no need to normalize past maxItems.
+        keep = keep[: max_items - total]
+    return keep
+
+def enrich_page(
+    enricher: Optional[DetailEnricher],
+    raws: List[Dict[str, Any]],
+    already_emitted: Set[str],
+    metrics: Metrics,
+) -> None:
+    """
+    Merge detail pages into the raw creatives that will be written.
+    """
+    if enricher is None or not raws:
+        return
+    with metrics.timed("detail_wait") as sample:
+        pending = [raw for raw in raws if (raw.get("creativeId") or raw.get("id")) not in already_emitted]
+        sample.records = enricher.enrich(pending)
+
+def take_new_records(
+    normalized: List[CreativeRecord],
+    total: int,
+    max_items: int,
+    already_emitted: Set[str],
+) -> Tuple[List[CreativeRecord], int]:
+    """
+    The page's records not emitted before the resume point, up to maxItems,
+    and the new running total.
+    """
+    page_records: List[CreativeRecord] = []
+    for rec in normalized:
+        if rec.creative_id in already_emitted:
+            continue
+        page_records.append(rec)
+        total += 1
+        if total >= max_items:
+            break
+    return page_records, total
+
+@dataclass
+class PageBatch:
+    """
+    One page's records ready to write, with their pending media (None when
+    media is not downloaded) and the running total after them.
+    """
+
+    page_no: int
+    page_token: Optional[str]
+    records: List[CreativeRecord]
+    media: Optional[List[PendingMedia]]
+    total: int
+
+def submit_media(
+    media_store: MediaStore, records: List[CreativeRecord], download_media: bool
+) -> Optional[List[PendingMedia]]:
+    # Media for the whole page downloads in the background; PageCommitter
+    # writes each record as soon as its own downloads have finished.
+    return [media_store.submit(rec) for rec in records] if download_media else None
+
+class PageCommitter:
+    """
+    Writes pages' records in order. With a checkpoint, outputs are made
+    durable and the checkpoint saved at most every interval_sec, and by
+    finish(): each commit ends a gzip member, syncs the outputs and spools
+    buffered Parquet rows, too much to pay for every small page. A resume
+    then repeats up to interval_sec of work. Creatives are added to the seen
+    index once committed.
+    """
+
+    def __init__(
+        self,
+        writer: DatasetWriter,
+        metrics: Metrics,
+        checkpoint: Optional[Checkpoint] = None,
+        checkpoint_path: Optional[Path] = None,
+        seen_index: Optional[SeenIndex] = None,
+        scope: str = "",
+        interval_sec: float = 0.0,
+    ):
+        self.writer = writer
+        self.metrics = metrics
+        self.checkpoint = checkpoint if checkpoint_path is not None else None
+        self.checkpoint_path = checkpoint_path
+        self.seen_index = seen_index
+        self.scope = scope
+        self.interval_sec = interval_sec
+        self._last: Optional[PageBatch] = None
+        self._uncommitted: List[str] = []
+        self._committed_at = time.monotonic()
+        # Set while a page is being written: a page that failed midway must
+        # not be committed.
+        self._writing = False
+
+    def write(self, batch: PageBatch) -> None:
+        written_before = self.writer.bytes_written()
+        self._writing = True
+        if batch.media is not None:
+            for job in batch.media:
+                with self.metrics.timed("media_wait"):
+                    media_keys = job.result()
+                if media_keys:
+                    job.record.media_store_keys = media_keys
+                with self.metrics.timed("write") as sample:
+                    self.writer.write(job.record)
+                    sample.records = 1
+        else:
+            with self.metrics.timed("write") as sample:
+                for rec in batch.records:
+                    self.writer.write(rec)
+                sample.records = len(batch.records)
+        self._writing = False
+
+        ids = [rec.creative_id for rec in batch.records]
+        if self.checkpoint is None:
+            if self.seen_index is not None:
+                self.seen_index.add(self.scope, ids)
+        else:
+            self._last = batch
+            self._uncommitted.extend(ids)
+            if time.monotonic() - self._committed_at >= self.interval_sec:
+                self.commit()
+        self.metrics.add("write", nbytes=self.writer.bytes_written() - written_before)
+
+    def commit(self) -> None:
+        """
+        Make the pages written so far durable and save the checkpoint.
+        """
+        batch = self._last
+        if batch is None:
+            return
+        checkpoint = self.checkpoint
+        with self.metrics.timed("write"):
+            checkpoint.offsets = self.writer.commit()
+        checkpoint.next_page = batch.page_no + 1
+        checkpoint.next_page_token = batch.page_token
+        checkpoint.written = batch.total
+        checkpoint.add_emitted(self._uncommitted)
+        checkpoint.save(self.checkpoint_path)
+        if self.seen_index is not None:
+            self.seen_index.add(self.scope, self._uncommitted)
+        self._last = None
+        self._uncommitted = []
+        self._committed_at = time.monotonic()
+
+    def finish(self) -> None:
+        """
+        Commit the pages written so far, unless one was left half-written.
+        """
+        if not self._writing:
+            self.commit()
+
+def scrape_origin(
+    origin_url: str,
+    paginator: Paginator,
+    normalizer: Normalizer,
+    writer: DatasetWriter,
+    media_store: MediaStore,
+    max_items: int,
+    download_media: bool,
+    checkpoint: Optional[Checkpoint] = None,
+    checkpoint_path: Optional[Path] = None,
+    seen_index: Optional[SeenIndex] = None,
+    metrics: Optional[Metrics] = None,
+    enricher: Optional[DetailEnricher] = None,
+    commit_interval_sec: float = 0.0,
+) -> int:
+    """
+    Fetch -> Extract -> Normalize -> Store for one origin URL. Returns the
+    number of records written (including those from a resumed checkpoint).
+
+    With a checkpoint, outputs are made durable and the checkpoint is saved
+    every commit_interval_sec (see PageCommitter) and when the crawl ends or
+    fails; a resumed crawl continues from checkpoint.next_page.
+    Creatives emitted before the resume point are not written again.
+
+    With a seen_index (incremental mode), creatives already recorded for this
+    advertiser are dropped before normalization, and pagination stops at the
+    first page that consists only of known creatives.
+
+    With an enricher, creatives whose listing lacks stats get their detail
+    pages merged in before normalization.
+
+    Per-stage timings go to metrics (a throwaway instance if none is given).
+    """
+    metrics = metrics or Metrics()
+    normalizer.origin_url = origin_url
+    start_page, start_token, total, already_emitted = resume_point(origin_url, paginator, checkpoint)
+    scope = advertiser_scope(origin_url)
+    if total >= max_items:
+        return total
+    if checkpoint is not None and checkpoint_path is not None:
+        # Saved up front, so a crawl failing on its first page can be resumed
+        # too (and a stale checkpoint from an earlier run is not).
+        checkpoint.save(checkpoint_path)
+
+    pages_iter = paginator.iter_pages(origin_url, start_page=start_page, fetched=total, page_token=start_token)
+    committer = PageCommitter(writer, metrics, checkpoint, checkpoint_path, seen_index, scope, commit_interval_sec)
+    # IDs written earlier in this run, which the seen index may not hold yet.
+    emitted_now: Set[str] = set()
+    with closing(pages_iter) as pages:
+        try:
+            for page_no, page_content in enumerate(metrics.timed_iter(pages, "fetch_wait"), start=start_page):
+                logging.debug("Processing page %d", page_no)
+                with metrics.timed("extract") as sample:
+                    raw_creatives = parse_creatives(page_content)
+                    payload = page_content.get("payload")
+                    sample.bytes = len(payload) if isinstance(payload, str) else 0
+                    sample.records = len(raw_creatives)
+                logging.debug("Raw creatives on page %d: %d", page_no, len(raw_creatives))
+                raw_ids = [raw.get("creativeId") or raw.get("id") for raw in raw_creatives]
+                keep = filter_page(raw_ids, total, max_items, already_emitted, seen_index, scope, emitted_now)
+                if keep is None:
+                    logging.info("Incremental: page %d has only known creatives; stopping", page_no)
+                    break
+                raw_creatives = [raw_creatives[i] for i in keep]
+                enrich_page(enricher, raw_creatives, already_emitted, metrics)
+
+                with metrics.timed("normalize") as sample:
+                    normalized = normalizer.normalize_page_records(raw_creatives)
+                    sample.records = len(normalized)
+
+                page_records, total = take_new_records(normalized, total, max_items, already_emitted)
+                emitted_now.update(rec.creative_id for rec in page_records)
+                media = submit_media(media_store, page_records, download_media)
+                batch = PageBatch(page_no, next_page_token(page_content), page_records, media, total)
+                committer.write(batch)
+
+                if total >= max_items:
+                    break
+        finally:
+            committer.finish()
+
+    if checkpoint is not None and checkpoint_path is not None:
+        checkpoint.complete = True
+        checkpoint.save(checkpoint_path)
+    return total
@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+from clients.transparency_center_client import TransparencyCenterClient
+from models.records import CreativeRecord
+from pipelines.enrich import DetailEnricher
+from pipelines.normalize import Normalizer
+from pipelines.pagination import Paginator
+from pipelines.runner import scrape_origin
+from storage.crawl_state import AdvertiserState, CrawlStateStore
+from storage.dataset_writer import DatasetWriter
+from storage.media_store import MediaStore
+from storage.seen_index import SeenIndex, advertiser_scope
+from utils.metrics import Metrics
+from utils.timefmt import to_epoch_str
+
+DAY = 86400.0
+
+class RequestBudget:
+    """
+    Global cap on requests per sliding hour. Crawls are charged what they
+    actually cost once they finish; wait_time() tells how long until an
+    estimated cost fits.
+    """
+
+    WINDOW = 3600.0
+
+    def __init__(self, per_hour: int):
+        self.per_hour = max(1, int(per_hour))
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._used = 0
+
+    def _expire(self, now: float) -> None:
+        while self._spent and self._spent[0][0] <= now - self.WINDOW:
+            self._used -= self._spent.popleft()[1]
+
+    def used(self, now: float) -> int:
+        self._expire(now)
+        return self._used
+
+    def spend(self, requests: int, now: float) -> None:
+        if requests > 0:
+            self._spent.append((now, requests))
+            self._used += requests
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """
+        Seconds until cost more requests fit in the window (0 if they do now).
+        """
+        self._expire(now)
+        cost = min(cost, self.per_hour)
+        over = self._used + cost - self.per_hour
+        if over <= 0:
+            return 0.0
+        freed = 0
+        for at, n in self._spent:
+            freed += n
+            if freed >= over:
+                return at + self.WINDOW - now
+        return self.WINDOW
+
+@dataclass
+class FreshnessPolicy:
+    """
+    Predicts how fast an advertiser produces new creatives (new_per_day, a
+    moving average of new creatives per day between crawls) and schedules
+    its next crawl when about target_new of them should have appeared,
+    within [min_interval_sec, max_interval_sec].
+
+    A first crawl finds the whole back catalogue, so its rate comes from
+    lastShownAt instead: the creatives shown in the last recent_days. An
+    advertiser whose newest creative was last shown longer ago than
+    max_interval_sec is treated as dormant.
+    """
+
+    target_new: float = 5.0
+    min_interval_sec: float = 3600.0
+    max_interval_sec: float = 14 * DAY
+    alpha: float = 0.3
+    recent_days: float = 30.0
+    # Cost assumed for an advertiser never crawled (origin page + one RPC page).
+    default_requests: float = 2.0
+
+    def update(self, state: AdvertiserState, new: int, requests: int, shown_at: List[int], now: float) -> None:
+        if state.last_crawl_at is None:
+            recent = sum(1 for s in shown_at if s >= now - self.recent_days * DAY)
+            sample = recent / self.recent_days
+        else:
+            sample = new / max((now - state.last_crawl_at) / DAY, 1 / 24)
+        state.new_per_day = self._ewma(state.new_per_day, sample)
+        state.requests_per_crawl = self._ewma(state.requests_per_crawl, float(requests))
+        if shown_at:
+            newest = max(shown_at)
+            state.newest_shown_at = max(newest, state.newest_shown_at or 0)
+            state.shown_spread_days = round((newest - min(shown_at)) / DAY, 2)
+        state.last_crawl_at = now
+        state.crawls += 1
+        state.last_new = new
+        state.new_total += new
+        state.next_due_at = now + self.interval(state, now)
+
+    def _ewma(self, prev: Optional[float], sample: float) -> float:
+        return sample if prev is None else self.alpha * sample + (1 - self.alpha) * prev
+
+    def interval(self, state: AdvertiserState, now: float) -> float:
+        rate = state.new_per_day or 0.0
+        dormant = state.newest_shown_at is not None and now - state.newest_shown_at > self.max_interval_sec
+        if rate <= 0 or dormant:
+            return self.max_interval_sec
+        return min(max(self.target_new / rate * DAY, self.min_interval_sec), self.max_interval_sec)
+
+    def expected_new(self, state: AdvertiserState, now: float) -> Optional[float]:
+        if state.last_crawl_at is None or state.new_per_day is None:
+            return None
+        return state.new_per_day * (now - state.last_crawl_at) / DAY
+
+    def cost(self, state: AdvertiserState) -> float:
+        return state.requests_per_crawl or self.default_requests
+
+class _ShownTap:
+    """
+    Passes records through to the writer, noting each one's lastShownAt.
+    """
+
+    def __init__(self, writer: DatasetWriter):
+        self.writer = writer
+        self.shown_at: List[int] = []
+
+    def write(self, rec: Union[CreativeRecord, Dict[str, Any]]) -> None:
+        value = rec.last_shown_at if isinstance(rec, CreativeRecord) else rec.get("lastShownAt")
+        epoch = int(to_epoch_str(value))
+        if epoch:
+            self.shown_at.append(epoch)
+        self.writer.write(rec)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.writer, name)
+
+def plan_schedule(states: Iterable[AdvertiserState], policy: FreshnessPolicy, now: float) -> List[Dict[str, Any]]:
+    """
+    The schedule as a list of advertisers, the next one due first.
+    """
+    return [
+        {
+            "scope": state.scope,
+            "originUrl": state.origin_url,
+            "dueInSec": round(max(0.0, state.next_due_at - now)),
+            "crawls": state.crawls,
+            "lastNew": state.last_new,
+            "newPerDay": None if state.new_per_day is None else round(state.new_per_day, 3),
+            "expectedNew": _round(policy.expected_new(state, now)),
+            "requestsPerCrawl": _round(state.requests_per_crawl),
+            "shownSpreadDays": state.shown_spread_days,
+        }
+        for state in sorted(states, key=lambda s: s.next_due_at)
+    ]
+
+class CrawlScheduler:
+    """
+    Re-crawls a portfolio of advertisers, most promising first: a min-heap
+    keyed by each advertiser's next due time (FreshnessPolicy), drained
+    under a RequestBudget. Crawls are incremental against seen_index, so
+    a crawl writes only new creatives and stops at the first page without
+    any; the count of new ones feeds the advertiser's predicted rate.
+
+    State is kept in a CrawlStateStore, so a scheduler restarted later picks
+    up the same schedule, the budget spent in the last hour and the
+    committed size of its outputs (see save_offsets).
+    """
+
+    def __init__(
+        self,
+        client: TransparencyCenterClient,
+        store: CrawlStateStore,
+        policy: FreshnessPolicy,
+        budget: RequestBudget,
+        writer: DatasetWriter,
+        seen_index: SeenIndex,
+        media_store: MediaStore,
+        max_items: int = 1000,
+        prefetch: int = 1,
+        download_media: bool = False,
+        enricher: Optional[DetailEnricher] = None,
+        metrics: Optional[Metrics] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.client = client
+        self.store = store
+        self.policy = policy
+        self.budget = budget
+        self.writer = writer
+        self.seen_index = seen_index
+        self.media_store = media_store
+        self.max_items = max_items
+        self.prefetch = prefetch
+        self.download_media = download_media
+        self.enricher = enricher
+        self.metrics = metrics or client.metrics or Metrics()
+        self.clock = clock
+        self.sleep = sleep
+        self.normalizer = Normalizer(origin_url="")
+        self.states: Dict[str, AdvertiserState] = store.load()
+        for at, requests in store.load_spend(clock() - budget.WINDOW):
+            budget.spend(requests, at)
+        self._heap: List[Tuple[float, str]] = [(s.next_due_at, scope) for scope, s in self.states.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, origin_url: str) -> AdvertiserState:
+        """
+        Registers an advertiser (due immediately if new); known ones keep
+        their schedule but take the latest origin URL.
+        """
+        scope = advertiser_scope(origin_url)
+        state = self.states.get(scope)
+        if state is None:
+            state = self.states[scope] = AdvertiserState(scope=scope, origin_url=origin_url)
+            heapq.heappush(self._heap, (state.next_due_at, scope))
+        state.origin_url = origin_url
+        self.store.save(state)
+        return state
+
+    def plan(self) -> List[Dict[str, Any]]:
+        return plan_schedule(self.states.values(), self.policy, self.clock())
+
+    def run(self, until: Optional[float] = None, max_crawls: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Crawls advertisers as they fall due, waiting for due times and for
+        budget, until the clock passes until (None: forever) or max_crawls
+        crawls have run. With max_crawls but no until, the session also ends
+        once no advertiser is due, instead of sleeping until one is.
+        Returns a summary of the session.
+        """
+        crawls = requests = new = 0
+        while self._heap and (max_crawls is None or crawls < max_crawls):
+            due, scope = self._heap[0]
+            now = self.clock()
+            if until is not None and max(due, now) > until:
+                break
+            if due > now:
+                if until is None and max_crawls is not None:
+                    break
+                self.sleep(min(due, until if until is not None else due) - now)
+                continue
+            state = self.states[scope]
+            wait = self.budget.wait_time(self.policy.cost(state), now)
+            if wait > 0:
+                if until is not None and now + wait > until:
+                    break
+                logging.info("Request budget spent (%d/h); waiting %.0fs", self.budget.per_hour, wait)
+                self.sleep(wait)
+                continue
+            heapq.heappop(self._heap)
+            found, spent = self._crawl(state)
+            heapq.heappush(self._heap, (state.next_due_at, scope))
+            crawls += 1
+            requests += spent
+            new += found
+        return {
+            "crawls": crawls,
+            "requests": requests,
+            "newCreatives": new,
+            "budgetUsed": self.budget.used(self.clock()),
+            "budgetPerHour": self.budget.per_hour,
+        }
+
+    def _requests_made(self) -> int:
+        data = self.metrics.to_dict()
+        if self.client.settings.mock:
+            stages = data["stages"]
+            return sum(stages[name]["latency"]["count"] for name in ("fetch", "detail") if name in stages)
+        # Every attempt that reached the network; cache hits cost nothing.
+        return sum(n for code, n in (data["httpStatus"].get("page") or {}).items() if code != "cached")
+
+    def _crawl(self, state: AdvertiserState) -> Tuple[int, int]:
+        before = self._requests_made()
+        tap = _ShownTap(self.writer)
+        new = 0
+        error: Optional[Exception] = None
+        try:
+            new = scrape_origin(
+                state.origin_url,
+                paginator=Paginator(client=self.client, max_items=self.max_items, prefetch=self.prefetch),
+                normalizer=self.normalizer,
+                writer=tap,
+                media_store=self.media_store,
+                max_items=self.max_items,
+                download_media=self.download_media,
+                seen_index=self.seen_index,
+                metrics=self.metrics,
+                enricher=self.enricher,
+            )
+            offsets = self.writer.commit()
+            paths = {"jsonl": self.writer.jsonl_path, "csv": self.writer.csv_path}
+            self.store.save_offsets({k: str(p) for k, p in paths.items() if p is not None}, offsets)
+        except Exception as e:
+            error = e
+            logging.exception("Crawl failed for %s", state.origin_url)
+        now = self.clock()
+        spent = self._requests_made() - before
+        self.budget.spend(spent, now)
+        self.store.record_spend(now, spent, keep_since=now - self.budget.WINDOW)
+        if error is None:
+            self.policy.update(state, new, spent, tap.shown_at, now)
+        else:
+            # Try again soon, without letting the failure move the prediction.
+            state.next_due_at = now + self.policy.min_interval_sec
+        self.store.save(state)
+        logging.info(
+            "Crawled %s | new=%d requests=%d | newPerDay=%.2f | next in %.1fh",
+            state.scope,
+            new,
+            spent,
+            state.new_per_day or 0.0,
+            (state.next_due_at - now) / 3600,
+        )
+        return new, spent
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from clients.transparency_center_client import TransparencyCenterClient
+from pipelines.normalize import Normalizer
+from pipelines.pagination import Paginator
+from pipelines.runner import build_client_settings, build_enricher, build_media_store, build_writer, with_compression
+from pipelines.staged import default_parse_workers, parse_pool, run_origin
+from storage.checkpoint import Checkpoint
+from storage.job_queue import JobQueue
+from storage.seen_index import SeenIndex
+from utils.metrics import Metrics
+
+@dataclass
+class ServiceConfig:
+    settings_raw: Dict[str, Any]
+    out_dir: Path
+    real_http: bool = False
+    prefetch: int = 1
+    formats: Tuple[str, ...] = ("jsonl", "csv")
+    compress: str = "none"
+    media_dir: Optional[Path] = None
+    job_workers: int = 2
+    seen_index_path: Optional[Path] = None
+    default_max_items: int = 100
+
+    @property
+    def queue_path(self) -> Path:
+        return self.out_dir / "jobs.sqlite"
+
+    def job_dir(self, job_id: int) -> Path:
+        return self.out_dir / f"job-{job_id:06d}"
+
+    def job_paths(self, job_id: int) -> Dict[str, Path]:
+        job_dir = self.job_dir(job_id)
+        return {
+            "jsonl": with_compression(job_dir / "ads.jsonl", self.compress),
+            "csv": with_compression(job_dir / "ads.csv", self.compress),
+            "parquet": job_dir / "ads_parquet",
+            # One query store for every job, so results can be queried together.
+            "sqlite": self.out_dir / "ads.sqlite",
+            "checkpoint": job_dir / "checkpoint.json",
+            "metrics": job_dir / "metrics.json",
+        }
+
+class ScrapeService:
+    """
+    Long-running scraper: one warm client (sessions, cookies, proxy pool,
+    rate limiter, response cache), media store, detail enricher, seen index
+    and parse pool shared by every job, so a small job costs only its own
+    requests.
+
+    Jobs come from a persistent JobQueue and run on job_workers threads,
+    each writing its own outputs and checkpoint under out_dir/job-NNNNNN. A
+    job interrupted by a restart resumes from its checkpoint.
+    """
+
+    def __init__(self, config: ServiceConfig):
+        self.config = config
+        self.started = time.monotonic()
+        settings_raw = config.settings_raw
+        self.metrics = Metrics()
+        self.client = TransparencyCenterClient(
+            build_client_settings(settings_raw, config.real_http, config.prefetch), metrics=self.metrics
+        )
+        self.media_store = build_media_store(
+            settings_raw, config.media_dir or config.out_dir / "media", metrics=self.metrics
+        )
+        self.enricher = build_enricher(settings_raw, self.client, metrics=self.metrics)
+        self.seen_index = SeenIndex(config.seen_index_path) if config.seen_index_path else None
+        self.queue = JobQueue(config.queue_path)
+        if self.queue.requeued:
+            logging.info("Requeued %d job(s) interrupted by the last shutdown", self.queue.requeued)
+
+        parse_workers = settings_raw.get("parseWorkers")
+        parse_workers = default_parse_workers() if parse_workers is None else int(parse_workers)
+        # Workers start on first use and then stay up between jobs.
+        self._pool: Optional[ProcessPoolExecutor] = parse_pool(parse_workers) if parse_workers else None
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopping = False
+        # job id -> (checkpoint, monotonic start) for jobs in progress
+        self._running: Dict[int, Tuple[Checkpoint, float]] = {}
+        self._workers = [
+            threading.Thread(target=self._work, name=f"job-worker{i}", daemon=True)
+            for i in range(max(1, config.job_workers))
+        ]
+
+    def start(self) -> None:
+        for t in self._workers:
+            t.start()
+
+    def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        origin_url = payload.get("originUrl") or payload.get("url")
+        if not origin_url or not isinstance(origin_url, str):
+            raise ValueError("Job needs an 'originUrl'")
+        max_items = int(payload.get("maxItems") or self.config.default_max_items)
+        if max_items < 1:
+            raise ValueError("'maxItems' must be positive")
+        job = self.queue.submit(origin_url, max_items, bool(payload.get("downloadMedia")))
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        return self.queue.cancel(job_id)
+
+    def job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        job = self.queue.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            running = self._running.get(job_id)
+        if running is not None:
+            checkpoint, started = running
+            job["records"] = checkpoint.written
+            job["seconds"] = round(time.monotonic() - started, 3)
+        if job["seconds"]:
+            job["recordsPerSec"] = round(job["records"] / job["seconds"], 1)
+        paths = self.config.job_paths(job_id)
+        job["outputs"] = {k: str(paths[k]) for k in self.config.formats}
+        return job
+
+    def output_path(self, job_id: int) -> Tuple[Optional[Path], int]:
+        """
+        The job's JSONL output and how many bytes of it are committed (safe
+        to read while the job is still writing).
+        """
+        paths = self.config.job_paths(job_id)
+        if "jsonl" not in self.config.formats:
+            return None, 0
+        checkpoint = Checkpoint.load(paths["checkpoint"])
+        if checkpoint is None:
+            return None, 0
+        return paths["jsonl"], int(checkpoint.offsets.get("jsonl") or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started
+        metrics = self.metrics.to_dict()
+        with self._lock:
+            running = sorted(self._running)
+        stats: Dict[str, Any] = {
+            "uptimeSec": round(uptime, 1),
+            "jobs": self.queue.counts(),
+            "running": running,
+            "records": metrics["records"],
+            "recordsPerSec": round(metrics["records"] / uptime, 1) if uptime else None,
+            "httpStatus": metrics["httpStatus"],
+            "stages": {name: s["seconds"] for name, s in metrics["stages"].items() if s["latency"]["count"]},
+        }
+        if self.client.cache is not None:
+            stats["cache"] = self.client.stats()
+        if self.client.archive is not None:
+            stats["archive"] = self.client.archive.stats()
+        if self.enricher is not None:
+            stats["enrichment"] = self.enricher.stats()
+        if not self.client.settings.mock:
+            stats["rateLimiter"] = self.client.rate_limit_stats()
+            if self.client.proxy_pool is not None:
+                stats["proxies"] = self.client.proxy_stats()
+        return stats
+
+    # -------------------- WORKERS -------------------- #
+
+    def _work(self) -> None:
+        while True:
+            with self._wake:
+                while True:
+                    if self._stopping:
+                        return
+                    job = self.queue.claim()
+                    if job is not None:
+                        break
+                    self._wake.wait(timeout=5.0)
+            self._run_job(job)
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        """
+        Crawls one job and writes its metrics.json. The warm client, media
+        store and enricher are shared by concurrent jobs and record into the
+        service metrics, so a job's metrics cover its own parse, normalize and
+        write stages only; fetch, detail and media timings and httpStatus are
+        service-wide, in stats().
+        """
+        config = self.config
+        job_id = job["id"]
+        paths = config.job_paths(job_id)
+        job_metrics = Metrics()
+        started = time.monotonic()
+
+        checkpoint = Checkpoint.load(paths["checkpoint"])
+        resume = checkpoint is not None
+        if checkpoint is None:
+            checkpoint = Checkpoint(
+                origin_url=job["originUrl"], jsonl_path=str(paths["jsonl"]), csv_path=str(paths["csv"])
+            )
+        elif checkpoint.complete:
+            self.queue.finish(job_id, checkpoint.written, 0.0)
+            return
+        else:
+            logging.info("Job %d: resuming at page %d", job_id, checkpoint.next_page)
+
+        logging.info("Job %d: started | originUrl=%s | maxItems=%d", job_id, job["originUrl"], job["maxItems"])
+        with self._lock:
+            self._running[job_id] = (checkpoint, started)
+        error: Optional[str] = None
+        writer = None
+        try:
+            paths["jsonl"].parent.mkdir(parents=True, exist_ok=True)
+            writer = build_writer(
+                config.settings_raw,
+                config.formats,
+                jsonl_path=paths["jsonl"],
+                csv_path=paths["csv"],
+                parquet_dir=paths["parquet"],
+                resume_offsets=checkpoint.offsets if resume else None,
+                sqlite_path=paths["sqlite"],
+            )
+            run_origin(
+                config.settings_raw,
+                job["originUrl"],
+                config.prefetch,
+                pool=self._pool,
+                paginator=Paginator(client=self.client, max_items=job["maxItems"], prefetch=config.prefetch),
+                normalizer=Normalizer(origin_url=job["originUrl"]),
+                writer=writer,
+                media_store=self.media_store,
+                max_items=job["maxItems"],
+                download_media=job["downloadMedia"],
+                checkpoint=checkpoint,
+                checkpoint_path=paths["checkpoint"],
+                seen_index=self.seen_index,
+                metrics=job_metrics,
+                enricher=self.enricher,
+            )
+        except Exception as e:
+            logging.exception("Job %d failed", job_id)
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if writer is not None:
+                writer.close()
+            with self._lock:
+                self._running.pop(job_id, None)
+
+        seconds = time.monotonic() - started
+        job_metrics.finish()
+        job_metrics.write_json(paths["metrics"])
+        self.metrics.merge(job_metrics.to_dict())
+        self.queue.finish(job_id, checkpoint.written, seconds, error)
+        logging.info(
+            "Job %d: %s | records=%d | %.2fs", job_id, "failed" if error else "done", checkpoint.written, seconds
+        )
+
+    def stop(self, drain_sec: float = 30.0) -> None:
+        """
+        Stops taking jobs and waits up to drain_sec for running ones. Jobs
+        still running afterwards are resumed on the next start.
+        """
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        deadline = time.monotonic() + drain_sec
+        for t in self._workers:
+            if t.is_alive():
+                t.join(max(0.0, deadline - time.monotonic()))
+        if any(t.is_alive() for t in self._workers):
+            logging.warning("Jobs %s still running; they resume on the next start", sorted(self._running))
+            return
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        if self.enricher is not None:
+            self.enricher.close()
+        if self.seen_index is not None:
+            self.seen_index.close()
+        self.client.close()
+        self.media_store.close()
+        self.queue.close()
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from extractors.ad_parser import next_page_token, parse_creatives
+from models.records import CreativeRecord
+from pipelines.enrich import DetailEnricher
+from pipelines.normalize import Normalizer
+from pipelines.pagination import Paginator
+from pipelines.runner import (
+    PageBatch,
+    PageCommitter,
+    enrich_page,
+    filter_page,
+    resume_point,
+    scrape_origin,
+    submit_media,
+    take_new_records,
+)
+from storage.checkpoint import Checkpoint
+from storage.dataset_writer import DatasetWriter
+from storage.media_store import MediaStore
+from storage.seen_index import SeenIndex, advertiser_scope
+from utils.metrics import Metrics
+
+_DONE = object()
+
+# How often blocked stages wake up to check for an abort.
+_POLL_SEC = 0.1
+
+@dataclass
+class PageResult:
+    """
+    Output of the parse stage for one page. raws is set when normalization
+    is left to the caller (detail enrichment must see the raw dicts first),
+    records otherwise; raw_ids lines up with either.
+    """
+
+    raw_ids: List[Optional[str]]
+    raws: Optional[List[Dict[str, Any]]]
+    records: Optional[List[CreativeRecord]]
+    extract_sec: float
+    normalize_sec: float
+    nbytes: int
+
+def process_page(page_doc: Dict[str, Any], origin_url: str, normalize: bool) -> PageResult:
+    """
+    Extract (and optionally normalize) one page. Runs in a worker process
+    for large HTML pages, inline otherwise.
+    """
+    started = time.perf_counter()
+    raws = parse_creatives(page_doc)
+    extracted = time.perf_counter()
+    payload = page_doc.get("payload")
+    nbytes = len(payload) if isinstance(payload, str) else 0
+    raw_ids = [raw.get("creativeId") or raw.get("id") for raw in raws]
+    if not normalize:
+        return PageResult(raw_ids, raws, None, extracted - started, 0.0, nbytes)
+    records = Normalizer(origin_url=origin_url).normalize_page_records(raws)
+    return PageResult(raw_ids, None, records, extracted - started, time.perf_counter() - extracted, nbytes)
+
+def default_parse_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)
+
+def parse_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn, not fork: the fetch, write and media threads are running.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+class StagedScrape:
+    """
+    Fetch -> Parse/Normalize -> Store for one origin URL as concurrent stages
+    connected by bounded queues, so network waits, parsing and disk writes
+    overlap:
+
+    - fetch: a thread driving the paginator, queue_pages pages ahead at most
+      (in incremental mode, no further ahead than the paginator's prefetch,
+      since the crawl may stop at the next page);
+    - parse: the calling thread; HTML pages of at least pool_min_bytes are
+      extracted and normalized in a process pool (parse_workers processes,
+      several pages in flight), smaller ones inline;
+    - write: a thread waiting for media and writing records, committing the
+      checkpoint and seen index every commit_interval_sec (see PageCommitter)
+      and once it stops.
+
+    Pages are handled in order and maxItems is applied in the parse stage,
+    so outputs match scrape_origin exactly. A fetch error ends the crawl like
+    the last page would: pages already fetched are still parsed and written
+    before it is re-raised from run(). An error in the parse or write stage
+    aborts the others at once. Either way the checkpoint reflects the last
+    fully written page.
+    """
+
+    def __init__(
+        self,
+        paginator: Paginator,
+        normalizer: Normalizer,
+        writer: DatasetWriter,
+        media_store: MediaStore,
+        max_items: int,
+        download_media: bool,
+        checkpoint: Optional[Checkpoint] = None,
+        checkpoint_path: Optional[Path] = None,
+        seen_index: Optional[SeenIndex] = None,
+        metrics: Optional[Metrics] = None,
+        enricher: Optional[DetailEnricher] = None,
+        parse_workers: int = 0,
+        pool_min_bytes: int = 256 * 1024,
+        queue_pages: int = 8,
+        pool: Optional[ProcessPoolExecutor] = None,
+        commit_interval_sec: float = 0.0,
+    ):
+        self.paginator = paginator
+        self.normalizer = normalizer
+        self.writer = writer
+        self.media_store = media_store
+        self.max_items = max_items
+        self.download_media = download_media
+        self.checkpoint = checkpoint
+        self.checkpoint_path = checkpoint_path
+        self.seen_index = seen_index
+        self.metrics = metrics or Metrics()
+        self.enricher = enricher
+        self.parse_workers = max(0, parse_workers)
+        self.pool_min_bytes = pool_min_bytes
+        self.queue_pages = max(1, queue_pages)
+        self.commit_interval_sec = commit_interval_sec
+
+        self._pages: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_pages)
+        self._batches: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_pages)
+        # _abort stops every stage (error or interrupt); _stop_fetch only the
+        # fetch stage, once the parse stage needs no more pages.
+        self._abort = threading.Event()
+        self._stop_fetch = threading.Event()
+        # Incremental mode: one credit per page that passed the seen-index
+        # check, each letting the fetch stage pull one more page.
+        self._fetch_credits = threading.Semaphore(0) if seen_index is not None else None
+        self._errors: List[BaseException] = []
+        # A pool passed in (e.g. kept warm across jobs) is the caller's to shut down.
+        self._pool = pool
+        self._owns_pool = pool is None
+
+    def run(self, origin_url: str) -> int:
+        self.normalizer.origin_url = origin_url
+        start_page, start_token, total, already_emitted = resume_point(origin_url, self.paginator, self.checkpoint)
+        if total >= self.max_items:
+            return total
+        if self.checkpoint is not None and self.checkpoint_path is not None:
+            # As in scrape_origin: resumable even if the first page fails.
+            self.checkpoint.save(self.checkpoint_path)
+
+        fetcher = threading.Thread(
+            target=self._guard, args=(self._fetch_stage, origin_url, start_page, total, start_token), name="fetch-stage"
+        )
+        writer = threading.Thread(target=self._guard, args=(self._write_stage, origin_url), name="write-stage")
+        fetcher.daemon = writer.daemon = True
+        fetcher.start()
+        writer.start()
+        try:
+            total = self._parse_stage(origin_url, total, already_emitted)
+            self._put(self._batches, _DONE)
+            while writer.is_alive():
+                writer.join(_POLL_SEC)
+        except BaseException as e:
+            self._errors.append(e)
+            self._abort.set()
+        finally:
+            self._stop_fetch.set()
+            writer.join()
+            fetcher.join()
+            if self._pool is not None and self._owns_pool:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+
+        if self._errors:
+            raise self._errors[0]
+        if self.checkpoint is not None and self.checkpoint_path is not None:
+            self.checkpoint.complete = True
+            self.checkpoint.save(self.checkpoint_path)
+        return total
+
+    def _guard(self, stage: Any, *args: Any) -> None:
+        try:
+            stage(*args)
+        except BaseException as e:
+            logging.debug("Stage %s failed: %s", threading.current_thread().name, e)
+            self._errors.append(e)
+            self._abort.set()
+
+    def _put(self, q: "queue.Queue[Any]", item: Any, stop: Optional[threading.Event] = None) -> bool:
+        """
+        Blocking put that gives up (returns False) once the pipeline aborts.
+        """
+        while not self._abort.is_set() and not (stop is not None and stop.is_set()):
+            try:
+                q.put(item, timeout=_POLL_SEC)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: "queue.Queue[Any]", block: bool = True) -> Any:
+        """
+        Next item, _DONE once the pipeline aborts, or None if block is False
+        and nothing is queued.
+        """
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=_POLL_SEC) if block else q.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return None
+        return _DONE
+
+    def _wait_for_credit(self) -> bool:
+        if self._fetch_credits is None:
+            return True
+        while not self._abort.is_set() and not self._stop_fetch.is_set():
+            if self._fetch_credits.acquire(timeout=_POLL_SEC):
+                return True
+        return False
+
+    # -------------------- STAGES -------------------- #
+
+    def _fetch_stage(self, origin_url: str, start_page: int, fetched: int, page_token: Optional[str]) -> None:
+        pages = self.paginator.iter_pages(origin_url, start_page=start_page, fetched=fetched, page_token=page_token)
+        try:
+            with closing(pages):
+                page_no = start_page
+                while True:
+                    if page_no > start_page and not self._wait_for_credit():
+                        return
+                    page_doc = next(pages, None)
+                    if page_doc is None:
+                        break
+                    if not self._put(self._pages, (page_no, page_doc), stop=self._stop_fetch):
+                        return
+                    page_no += 1
+        except Exception as e:
+            # Not an abort: the pages queued so far are still written.
+            logging.debug("Fetch stage failed: %s", e)
+            self._errors.append(e)
+        self._put(self._pages, _DONE, stop=self._stop_fetch)
+
+    def _parse_stage(self, origin_url: str, total: int, already_emitted: Set[str]) -> int:
+        metrics = self.metrics
+        scope = advertiser_scope(origin_url)
+        # IDs written earlier in this run, which the seen index may not hold yet.
+        emitted_now: Set[str] = set()
+        window: Deque[Tuple[int, Dict[str, Any], Future]] = deque()
+        fetch_done = False
+
+        while True:
+            while not fetch_done and len(window) < max(1, self.parse_workers):
+                started = time.perf_counter()
+                item = self._get(self._pages, block=not window)
+                if item is None:
+                    break
+                if item is _DONE:
+                    fetch_done = True
+                    break
+                metrics.observe("fetch_wait", time.perf_counter() - started)
+                page_no, page_doc = item
+                window.append((page_no, page_doc, self._submit(page_doc, origin_url)))
+            if not window:
+                return total
+
+            page_no, page_doc, fut = window.popleft()
+            result: PageResult = fut.result()
+            metrics.observe("extract", result.extract_sec, nbytes=result.nbytes, records=len(result.raw_ids))
+            logging.debug("Raw creatives on page %d: %d", page_no, len(result.raw_ids))
+            keep = filter_page(
+                result.raw_ids, total, self.max_items, already_emitted, self.seen_index, scope, emitted_now
+            )
+            if keep is None:
+                logging.info("Incremental: page %d has only known creatives; stopping", page_no)
+                return total
+            if self._fetch_credits is not None:
+                self._fetch_credits.release()
+
+            if result.records is not None:
+                normalized = [result.records[i] for i in keep]
+                metrics.observe("normalize", result.normalize_sec, records=len(result.records))
+            else:
+                raws = [result.raws[i] for i in keep]
+                enrich_page(self.enricher, raws, already_emitted, metrics)
+                with metrics.timed("normalize") as sample:
+                    normalized = self.normalizer.normalize_page_records(raws)
+                    sample.records = len(normalized)
+
+            page_records, total = take_new_records(normalized, total, self.max_items, already_emitted)
+            emitted_now.update(rec.creative_id for rec in page_records)
+
+            # Media starts downloading now; the write stage waits for it in order.
+            media = submit_media(self.media_store, page_records, self.download_media)
+            batch = PageBatch(page_no, next_page_token(page_doc), page_records, media, total)
+            if not self._put(self._batches, batch):
+                return total
+            if total >= self.max_items:
+                return total
+
+    def _submit(self, page_doc: Dict[str, Any], origin_url: str) -> Future:
+        normalize = self.enricher is None
+        payload = page_doc.get("payload")
+        if self.parse_workers and isinstance(payload, str) and len(payload) >= self.pool_min_bytes:
+            if self._pool is None:
+                self._pool = parse_pool(self.parse_workers)
+            return self._pool.submit(process_page, page_doc, origin_url, normalize)
+        done: Future = Future()
+        done.set_result(process_page(page_doc, origin_url, normalize))
+        return done
+
+    def _write_stage(self, origin_url: str) -> None:
+        committer = PageCommitter(
+            self.writer,
+            self.metrics,
+            self.checkpoint,
+            self.checkpoint_path,
+            self.seen_index,
+            advertiser_scope(origin_url),
+            self.commit_interval_sec,
+        )
+        try:
+            while True:
+                batch = self._get(self._batches)
+                if batch is _DONE:
+                    return
+                committer.write(batch)
+        finally:
+            committer.finish()
+
+def run_origin(
+    settings_raw: Dict[str, Any],
+    origin_url: str,
+    prefetch: int,
+    pool: Optional[ProcessPoolExecutor] = None,
+    **kwargs: Any,
+) -> int:
+    """
+    Scrapes one origin URL with StagedScrape, or with the sequential
+    scrape_origin when settings.stagedPipeline is off. kwargs are the
+    arguments the two share (paginator, normalizer, writer, ...).
+    """
+    kwargs.setdefault("commit_interval_sec", float(settings_raw.get("commitIntervalSec", 5)))
+    if not settings_raw.get("stagedPipeline", True):
+        return scrape_origin(origin_url, **kwargs)
+    parse_workers = settings_raw.get("parseWorkers")
+    return StagedScrape(
+        parse_workers=default_parse_workers() if parse_workers is None else int(parse_workers),
+        pool_min_bytes=int(settings_raw.get("parsePoolMinKb") or 256) * 1024,
+        queue_pages=max(prefetch, int(settings_raw.get("pipelineQueuePages") or 8)),
+        pool=pool,
+        **kwargs,
+    ).run(origin_url)
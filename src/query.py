@@ -0,0 +1,93 @@
+import argparse
+import datetime as dt
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+# Ensure imports work when running this file directly
+CURRENT_DIR = Path(__file__).resolve().parent
+if str(CURRENT_DIR) not in sys.path:
+    sys.path.insert(0, str(CURRENT_DIR))
+
+from storage.dataset_writer import open_text  # noqa: E402
+from storage.query_store import QueryStore  # noqa: E402
+
+def parse_when(value: str) -> int:
+    """
+    Epoch seconds from an epoch number or an ISO date/datetime (UTC unless
+    it carries an offset).
+    """
+    if value.isdigit():
+        return int(value)
+    parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return int(parsed.timestamp())
+
+def resolve_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Query (or bulk-load) the SQLite store of scraped creatives.")
+    parser.add_argument("--db", required=True, help="SQLite query store (written with --formats ...,sqlite).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    load = sub.add_parser("import", help="Bulk-load JSONL outputs (.jsonl, .jsonl.gz, .jsonl.zst).")
+    load.add_argument("files", nargs="+", help="JSONL files to import.")
+    load.add_argument("--batch-size", type=int, default=5000, help="Records inserted per transaction.")
+
+    find = sub.add_parser("find", help="Print matching creatives as JSON Lines, most recently shown first.")
+    find.add_argument("--advertiser", help="advertiserId (AR...).")
+    find.add_argument("--creative", help="creativeId (CR...).")
+    find.add_argument("--format", help="Creative format, e.g. IMAGE, VIDEO, TEXT.")
+    find.add_argument("--country", help="Country code, e.g. DE.")
+    find.add_argument("--platform", help="Platform code, e.g. YOUTUBE (within --country when given).")
+    find.add_argument("--shown-after", type=parse_when, help="Last shown at or after (epoch or ISO date).")
+    find.add_argument("--shown-before", type=parse_when, help="First shown at or before (epoch or ISO date).")
+    find.add_argument("--limit", type=int, default=None, help="Maximum number of records.")
+    find.add_argument("--count", action="store_true", help="Print only the number of matches.")
+
+    sub.add_parser("stats", help="Print row counts per table.")
+    return parser.parse_args()
+
+def import_files(store: QueryStore, files: list) -> int:
+    total = 0
+    for name in files:
+        started = time.monotonic()
+        with open_text(Path(name)) as f:
+            n = store.import_lines(f)
+        logging.info("Imported %d records from %s in %.2fs", n, name, time.monotonic() - started)
+        total += n
+    return total
+
+def run() -> None:
+    args = resolve_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(message)s", stream=sys.stderr)
+    batch_size: Optional[int] = getattr(args, "batch_size", None)
+    store = QueryStore(Path(args.db), batch_size=batch_size or 500)
+    try:
+        if args.command == "import":
+            import_files(store, args.files)
+            logging.info("Store now holds %s", store.stats())
+        elif args.command == "stats":
+            print(json.dumps(store.stats()))
+        else:
+            filters = {
+                "advertiser_id": args.advertiser,
+                "creative_id": args.creative,
+                "format": args.format,
+                "country": args.country,
+                "platform": args.platform,
+                "shown_after": args.shown_after,
+                "shown_before": args.shown_before,
+            }
+            if args.count:
+                print(store.count(**filters))
+                return
+            for rec in store.query(limit=args.limit, **filters):
+                sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    run()
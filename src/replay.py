@@ -0,0 +1,116 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+# Ensure imports work when running this file directly
+CURRENT_DIR = Path(__file__).resolve().parent
+if str(CURRENT_DIR) not in sys.path:
+    sys.path.insert(0, str(CURRENT_DIR))
+
+from main import export_metrics, load_settings, setup_logging  # noqa: E402
+from pipelines.replay import ReplayConfig, run_replay  # noqa: E402
+from pipelines.runner import COMPRESSION_SUFFIXES, parse_formats, with_compression  # noqa: E402
+from query import parse_when  # noqa: E402
+from storage.response_archive import RECORD_KINDS, ArchiveReader  # noqa: E402
+from utils.metrics import Metrics  # noqa: E402
+from utils.timefmt import utc_now_iso  # noqa: E402
+
+def resolve_args() -> argparse.Namespace:
+    stamp = utc_now_iso().replace(":", "").replace("-", "")
+    parser = argparse.ArgumentParser(
+        description="Inspect or reprocess a response archive (written with settings.archiveDir), without network."
+    )
+    parser.add_argument("--archive", required=True, help="Archive directory (settings.archiveDir of the crawls).")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("stats", help="Print segment, byte and record counts.")
+
+    segments = sub.add_parser("segments", help="List segments as JSON Lines.")
+    segments.add_argument("--since", type=parse_when, help="Fetched at or after (epoch or ISO date).")
+    segments.add_argument("--until", type=parse_when, help="Fetched at or before (epoch or ISO date).")
+
+    get = sub.add_parser("get", help="Print an archived response body.")
+    get.add_argument("url", help="Requested URL (the origin URL for page 1, the RPC URL for later pages).")
+    get.add_argument("--page", type=int, default=None)
+    get.add_argument("--kind", choices=RECORD_KINDS, default=None)
+    get.add_argument("--at", type=parse_when, help="Newest copy fetched at or before this (epoch or ISO date).")
+
+    run = sub.add_parser("run", help="Extract, normalize and write every archived page, in parallel by segment.")
+    run.add_argument(
+        "--settings",
+        default=str(CURRENT_DIR / "config" / "settings.example.json"),
+        help="Settings JSON for the write side (writeBufferKb, jsonEncoder, enrichDetails, ...).",
+    )
+    run.add_argument("--since", type=parse_when, help="Only responses fetched at or after (epoch or ISO date).")
+    run.add_argument("--until", type=parse_when, help="Only responses fetched at or before (epoch or ISO date).")
+    run.add_argument(
+        "--out-jsonl",
+        default=str(Path.cwd() / f"replay_{stamp}.jsonl"),
+        help="Output JSONL; each segment writes <stem>.<segment>.jsonl.",
+    )
+    run.add_argument("--out-csv", default=str(Path.cwd() / f"replay_{stamp}.csv"))
+    run.add_argument("--out-parquet", default=None)
+    run.add_argument("--out-sqlite", default=None, help="Query store shared by all segments.")
+    run.add_argument("--formats", default="jsonl", help="Comma-separated: jsonl, csv, parquet, sqlite.")
+    run.add_argument("--compress", choices=sorted(COMPRESSION_SUFFIXES), default="none")
+    run.add_argument("--workers", type=int, default=None, help="Segments reprocessed at once (default: CPU count).")
+    run.add_argument("--metrics-out", default=None, help="Metrics JSON (default: <out-jsonl>.metrics.json).")
+    run.add_argument("--metrics-prom", default=None, help="Also write the metrics as a Prometheus textfile.")
+    return parser.parse_args()
+
+def replay(args: argparse.Namespace) -> None:
+    settings_raw = load_settings(Path(args.settings))
+    out_jsonl = Path(args.out_jsonl)
+    config = ReplayConfig(
+        archive_dir=Path(args.archive),
+        settings_raw=settings_raw,
+        out_jsonl=with_compression(out_jsonl, args.compress),
+        out_csv=with_compression(Path(args.out_csv), args.compress),
+        out_parquet=Path(args.out_parquet) if args.out_parquet else out_jsonl.with_name(out_jsonl.stem + "_parquet"),
+        out_sqlite=Path(args.out_sqlite) if args.out_sqlite else out_jsonl.with_name(out_jsonl.stem + ".sqlite"),
+        formats=tuple(parse_formats(args.formats)),
+        since=args.since,
+        until=args.until,
+        log_level=args.log_level,
+    )
+    metrics = Metrics()
+    summary = run_replay(config, workers=args.workers or os.cpu_count() or 1, metrics=metrics)
+    logging.info(
+        "Finished replay. Wrote %d records from %d pages in %d segment(s) (%d failed); summary at %s",
+        summary["totalRecords"],
+        summary["pages"],
+        summary["segments"],
+        summary["failed"],
+        config.summary_path,
+    )
+    export_metrics(metrics, args, out_jsonl)
+
+def run() -> None:
+    args = resolve_args()
+    setup_logging(args.log_level)
+    if args.command == "run":
+        replay(args)
+        return
+    reader = ArchiveReader(Path(args.archive))
+    try:
+        if args.command == "stats":
+            print(json.dumps(reader.stats()))
+        elif args.command == "segments":
+            for segment in reader.segments(since=args.since, until=args.until):
+                print(json.dumps(segment))
+        else:
+            resp = reader.lookup(args.url, page=args.page, at=args.at, kind=args.kind)
+            if resp is None:
+                logging.error("No archived response for %s", args.url)
+                sys.exit(1)
+            logging.info("%s %s page=%d fetched %s", resp.kind, resp.mode, resp.page, resp.fetched_at)
+            sys.stdout.write(resp.body)
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,189 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Ensure imports work when running this file directly
+CURRENT_DIR = Path(__file__).resolve().parent
+if str(CURRENT_DIR) not in sys.path:
+    sys.path.insert(0, str(CURRENT_DIR))
+
+from main import load_settings, read_json, resolve_origin_urls  # noqa: E402
+from clients.transparency_center_client import TransparencyCenterClient  # noqa: E402
+from pipelines.runner import (  # noqa: E402
+    build_client_settings,
+    build_enricher,
+    build_media_store,
+    build_writer,
+    parse_formats,
+)
+from pipelines.scheduler import DAY, CrawlScheduler, FreshnessPolicy, RequestBudget, plan_schedule  # noqa: E402
+from storage.crawl_state import AdvertiserState, CrawlStateStore  # noqa: E402
+from storage.seen_index import SeenIndex, advertiser_scope  # noqa: E402
+from utils.metrics import Metrics  # noqa: E402
+from utils.timefmt import utc_now_iso  # noqa: E402
+
+def resolve_args() -> argparse.Namespace:
+    stamp = utc_now_iso().replace(":", "").replace("-", "")
+    parser = argparse.ArgumentParser(
+        description="Re-crawl an advertiser portfolio by predicted freshness under an hourly request budget."
+    )
+    parser.add_argument(
+        "--input",
+        default=str(CURRENT_DIR.parent / "data" / "sample_input.json"),
+        help="Input JSON with originUrls / originUrlsFile (maxItems caps each crawl).",
+    )
+    parser.add_argument("--settings", default=str(CURRENT_DIR / "config" / "settings.example.json"))
+    parser.add_argument(
+        "--state",
+        default=str(Path.cwd() / "schedule_state.sqlite"),
+        help="SQLite file with each advertiser's crawl history and next due time.",
+    )
+    parser.add_argument(
+        "--seen-index",
+        default=str(Path.cwd() / "seen_creatives.sqlite"),
+        help="SQLite file of creatives already emitted; crawls only write new ones.",
+    )
+    parser.add_argument(
+        "--budget-per-hour",
+        type=int,
+        default=None,
+        help="Requests allowed per sliding hour (overrides settings.requestBudgetPerHour).",
+    )
+    parser.add_argument("--target-new", type=float, default=5.0, help="New creatives a crawl should expect to find.")
+    parser.add_argument("--min-interval-hours", type=float, default=1.0)
+    parser.add_argument("--max-interval-days", type=float, default=14.0)
+    parser.add_argument(
+        "--run-for-hours", type=float, default=None, help="Stop after this long (default: run forever)."
+    )
+    parser.add_argument(
+        "--max-crawls",
+        type=int,
+        default=None,
+        help="Stop after this many crawls; without --run-for-hours, also stop once no advertiser is due.",
+    )
+    parser.add_argument("--plan", action="store_true", help="Print the current schedule as JSON and exit.")
+    parser.add_argument(
+        "--out-jsonl",
+        default=str(Path.cwd() / f"ads_{stamp}.jsonl"),
+        help="Appended to if this schedule wrote it before; any other existing file is refused.",
+    )
+    parser.add_argument("--out-csv", default=str(Path.cwd() / f"ads_{stamp}.csv"))
+    parser.add_argument("--out-parquet", default=None)
+    parser.add_argument("--out-sqlite", default=None)
+    parser.add_argument("--formats", default="jsonl", help="Comma-separated: jsonl, csv, parquet, sqlite.")
+    parser.add_argument("--media-dir", default=str(Path.cwd() / "media"))
+    parser.add_argument("--real-http", action="store_true", help="Force real HTTP mode even if settings.mock=true.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return parser.parse_args()
+
+def resume_offsets(store: CrawlStateStore, outputs: Dict[str, Path]) -> Optional[Dict[str, int]]:
+    """
+    resume_offsets for text outputs that already exist: the sizes this
+    schedule last committed to them. An existing file the schedule did not
+    write is refused rather than overwritten.
+    """
+    existing = {name: path for name, path in outputs.items() if path.exists() and path.stat().st_size}
+    if not existing:
+        return None
+    committed = store.load_offsets()
+    for name, path in existing.items():
+        if name not in committed or Path(committed[name][0]).resolve() != path.resolve():
+            raise SystemExit(
+                f"{path} already exists and is not this schedule's output ({store.path}); "
+                "pass a new --out-jsonl / --out-csv"
+            )
+    return {name: committed[name][1] for name in existing}
+
+def print_plan(store: CrawlStateStore, origin_urls: List[str], policy: FreshnessPolicy) -> None:
+    # Advertisers not registered yet are shown as due now, without saving them.
+    states = store.load()
+    for url in origin_urls:
+        scope = advertiser_scope(url)
+        states.setdefault(scope, AdvertiserState(scope=scope, origin_url=url))
+    print(json.dumps(plan_schedule(states.values(), policy, time.time()), indent=2))
+
+def run() -> None:
+    args = resolve_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="%(asctime)s | %(levelname)-8s | %(message)s")
+    settings_raw = load_settings(Path(args.settings))
+    input_path = Path(args.input)
+    input_payload = read_json(input_path)
+    origin_urls = resolve_origin_urls(input_payload, input_path)
+    prefetch = int(settings_raw.get("prefetchPages") or 1)
+    out_jsonl = Path(args.out_jsonl)
+    formats = parse_formats(args.formats)
+    policy = FreshnessPolicy(
+        target_new=args.target_new,
+        min_interval_sec=args.min_interval_hours * 3600,
+        max_interval_sec=args.max_interval_days * DAY,
+    )
+    store = CrawlStateStore(Path(args.state))
+    if args.plan:
+        # Nothing else is opened: planning must not touch outputs or media.
+        try:
+            print_plan(store, origin_urls, policy)
+        finally:
+            store.close()
+        return
+    text_outputs = {"jsonl": out_jsonl, "csv": Path(args.out_csv)}
+    offsets = resume_offsets(store, {k: p for k, p in text_outputs.items() if k in formats})
+
+    metrics = Metrics()
+    client = TransparencyCenterClient(
+        build_client_settings(settings_raw, real_http=args.real_http, prefetch=prefetch), metrics=metrics
+    )
+    seen_index = SeenIndex(Path(args.seen_index))
+    media_store = build_media_store(settings_raw, Path(args.media_dir), metrics=metrics)
+    enricher = build_enricher(settings_raw, client, metrics=metrics)
+    writer = build_writer(
+        settings_raw,
+        formats,
+        jsonl_path=out_jsonl,
+        csv_path=Path(args.out_csv),
+        parquet_dir=Path(args.out_parquet) if args.out_parquet else out_jsonl.with_name(out_jsonl.stem + "_parquet"),
+        resume_offsets=offsets,
+        sqlite_path=Path(args.out_sqlite) if args.out_sqlite else out_jsonl.with_name(out_jsonl.stem + ".sqlite"),
+    )
+    budget = RequestBudget(args.budget_per_hour or int(settings_raw.get("requestBudgetPerHour") or 600))
+    scheduler = CrawlScheduler(
+        client,
+        store,
+        policy,
+        budget,
+        writer=writer,
+        seen_index=seen_index,
+        media_store=media_store,
+        max_items=int(input_payload.get("maxItems") or 1000),
+        prefetch=prefetch,
+        download_media=bool(input_payload.get("downloadMedia") or False),
+        enricher=enricher,
+        metrics=metrics,
+    )
+    try:
+        for url in origin_urls:
+            scheduler.add(url)
+        if offsets is not None:
+            logging.info("Appending to the outputs of an earlier session (%s)", out_jsonl)
+        logging.info("Scheduling %d advertiser(s) | budget=%d requests/h", len(scheduler.states), budget.per_hour)
+        until = time.time() + args.run_for_hours * 3600 if args.run_for_hours is not None else None
+        try:
+            summary = scheduler.run(until=until, max_crawls=args.max_crawls)
+        except KeyboardInterrupt:
+            logging.info("Interrupted; the schedule is saved in %s", args.state)
+            return
+        logging.info("Session done | %s", summary)
+    finally:
+        if enricher is not None:
+            enricher.close()
+        client.close()
+        media_store.close()
+        writer.close()
+        seen_index.close()
+        store.close()
+
+if __name__ == "__main__":
+    run()
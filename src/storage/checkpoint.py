@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils.timefmt import utc_now_iso
+
+@dataclass
+class Checkpoint:
+    """
+    Progress of a single-URL run, committed at page boundaries. Output offsets
+    are the byte sizes of the JSONL/CSV files at the last commit; anything
+    beyond them was written after the last durable page and is discarded on
+    resume.
+
+    Emitted creative IDs go to an append-only log next to the checkpoint
+    (<path>.ids, one per line) rather than into it, so a save costs one page
+    of IDs, not every ID so far. emitted_ids_offset is the log's committed
+    size in the same sense as the output offsets.
+    """
+
+    origin_url: str
+    jsonl_path: str
+    csv_path: str
+    next_page: int = 1
+    # Real mode: token that fetches next_page (pages are chained by token).
+    next_page_token: Optional[str] = None
+    written: int = 0
+    offsets: Dict[str, int] = field(default_factory=dict)
+    emitted_ids: Set[str] = field(default_factory=set)
+    emitted_ids_offset: int = 0
+    complete: bool = False
+    updated_at: str = ""
+    # Added since the last save, not yet in the log.
+    _unsaved_ids: List[str] = field(default_factory=list, init=False, repr=False)
+
+    @staticmethod
+    def ids_path(path: Path) -> Path:
+        return path.with_name(path.name + ".ids")
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["Checkpoint"]:
+        if not path.exists():
+            return None
+        with path.open("r", encoding="utf-8") as f:
+            data: Dict[str, Any] = json.load(f)
+        emitted_ids: Set[str] = set()
+        ids_offset = int(data.get("emittedIdsOffset") or 0)
+        if ids_offset:
+            with cls.ids_path(path).open("rb") as f:
+                emitted_ids.update(f.read(ids_offset).decode("utf-8").splitlines())
+        return cls(
+            origin_url=data["originUrl"],
+            jsonl_path=data["jsonlPath"],
+            csv_path=data["csvPath"],
+            next_page=int(data.get("nextPage") or 1),
+            next_page_token=data.get("nextPageToken") or None,
+            written=int(data.get("written") or 0),
+            offsets={k: int(v) for k, v in (data.get("offsets") or {}).items()},
+            emitted_ids=emitted_ids,
+            emitted_ids_offset=ids_offset,
+            complete=bool(data.get("complete")),
+            updated_at=data.get("updatedAt") or "",
+        )
+
+    def add_emitted(self, creative_ids: Iterable[str]) -> None:
+        for cid in creative_ids:
+            if cid not in self.emitted_ids:
+                self.emitted_ids.add(cid)
+                self._unsaved_ids.append(cid)
+
+    def save(self, path: Path) -> None:
+        """
+        Append new emitted IDs to the log, then atomically replace the
+        checkpoint file (write temp, fsync, rename).
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self._unsaved_ids:
+            self._append_ids(self.ids_path(path))
+        self.updated_at = utc_now_iso()
+        data = {
+            "originUrl": self.origin_url,
+            "jsonlPath": self.jsonl_path,
+            "csvPath": self.csv_path,
+            "nextPage": self.next_page,
+            "nextPageToken": self.next_page_token,
+            "written": self.written,
+            "offsets": self.offsets,
+            "emittedIdsOffset": self.emitted_ids_offset,
+            "complete": self.complete,
+            "updatedAt": self.updated_at,
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _append_ids(self, ids_path: Path) -> None:
+        data = "".join(f"{cid}\n" for cid in self._unsaved_ids).encode("utf-8")
+        with ids_path.open("ab") as f:
+            # Drop IDs appended after the last checkpoint that recorded them.
+            f.truncate(self.emitted_ids_offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.emitted_ids_offset += len(data)
+        self._unsaved_ids = []
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+@dataclass
+class AdvertiserState:
+    """
+    Crawl history of one advertiser scope, as kept by the scheduler. Times are
+    epoch seconds; new_per_day and requests_per_crawl are moving averages.
+    """
+
+    scope: str
+    origin_url: str
+    last_crawl_at: Optional[float] = None
+    crawls: int = 0
+    last_new: int = 0
+    new_total: int = 0
+    new_per_day: Optional[float] = None
+    requests_per_crawl: Optional[float] = None
+    # lastShownAt of the creatives found by the last crawl that found any.
+    newest_shown_at: Optional[int] = None
+    shown_spread_days: Optional[float] = None
+    next_due_at: float = 0.0
+
+_FIELDS = tuple(f.name for f in fields(AdvertiserState))
+
+class CrawlStateStore:
+    """
+    AdvertiserState rows in SQLite, so schedules survive restarts, along
+    with the request budget's spend log and the committed size of each
+    output file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS advertisers ("
+            " scope TEXT PRIMARY KEY, origin_url TEXT NOT NULL, last_crawl_at REAL, crawls INTEGER NOT NULL,"
+            " last_new INTEGER NOT NULL, new_total INTEGER NOT NULL, new_per_day REAL, requests_per_crawl REAL,"
+            " newest_shown_at INTEGER, shown_spread_days REAL, next_due_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS spend (at REAL NOT NULL, requests INTEGER NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outputs (name TEXT PRIMARY KEY, path TEXT NOT NULL, offset INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+    def load(self) -> Dict[str, AdvertiserState]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(_FIELDS)} FROM advertisers").fetchall()
+        return {row[0]: AdvertiserState(*row) for row in rows}
+
+    def save(self, state: AdvertiserState) -> None:
+        placeholders = ", ".join("?" * len(_FIELDS))
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO advertisers ({', '.join(_FIELDS)}) VALUES ({placeholders})", astuple(state)
+            )
+
+    def load_spend(self, since: float) -> List[Tuple[float, int]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT at, requests FROM spend WHERE at > ? ORDER BY at", (since,)
+            ).fetchall()
+
+    def record_spend(self, at: float, requests: int, keep_since: float) -> None:
+        """
+        Logs requests spent at `at`, dropping entries older than keep_since.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM spend WHERE at <= ?", (keep_since,))
+            if requests > 0:
+                self._db.execute("INSERT INTO spend VALUES (?, ?)", (at, requests))
+
+    def load_offsets(self) -> Dict[str, Tuple[str, int]]:
+        """
+        name ("jsonl", "csv") -> (path, committed byte offset).
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT name, path, offset FROM outputs").fetchall()
+        return {name: (path, offset) for name, path, offset in rows}
+
+    def save_offsets(self, paths: Dict[str, str], offsets: Dict[str, int]) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM outputs")
+            self._db.executemany(
+                "INSERT INTO outputs VALUES (?, ?, ?)",
+                [(name, paths[name], offset) for name, offset in offsets.items() if name in paths],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
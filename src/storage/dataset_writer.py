@@ -1,36 +1,278 @@
 from __future__ import annotations
 
 import csv
-import json
+import gzip
+import io
+import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Union
+
+from models.records import CreativeRecord
+from storage.parquet_writer import ParquetWriter
+from storage.query_store import QueryStore
+from utils.jsonenc import get_encoder
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# CSV columns, in the order of the normalized record schema.
+CSV_FIELDS: Tuple[str, ...] = (
+    "id",
+    "advertiserId",
+    "creativeId",
+    "advertiserName",
+    "format",
+    "url",
+    "previewUrl",
+    "previewStoreKey",
+    "firstShownAt",
+    "lastShownAt",
+    "impressions",
+    "shownCountries",
+    "countryStats",
+    "platformStats",
+    "audienceSelections",
+    "variants",
+    "originUrl",
+    "mediaStoreKeys",
+)
+
+def compression_for(path: Path) -> Optional[str]:
+    return {".gz": "gzip", ".zst": "zstd"}.get(path.suffix.lower())
+
+class _TextSink:
+    """
+    UTF-8 output file with optional streaming gzip/zstd compression.
+
+    commit() ends the current gzip member / zstd frame before syncing, so every
+    committed offset is a valid point to truncate back to: the file stays a
+    concatenation of complete members, which gzip and zstd readers accept.
+    """
+
+    def __init__(self, path: Path, append: bool):
+        self.path = path
+        self.compression = compression_for(path)
+        if self.compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd output requires zstandard (pip install zstandard).")
+        self._raw = path.open("ab" if append else "wb")
+        self._stream = None
+
+    def size(self) -> int:
+        return os.fstat(self._raw.fileno()).st_size
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        if self.compression is None:
+            self._raw.write(data)
+            return
+        if self._stream is None:
+            if self.compression == "gzip":
+                self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+            else:
+                self._stream = zstandard.ZstdCompressor(level=3).stream_writer(self._raw, closefd=False)
+        self._stream.write(data)
+
+    def _end_stream(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def commit(self) -> int:
+        self._end_stream()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        return self.size()
+
+    def close(self) -> None:
+        try:
+            self._end_stream()
+        finally:
+            self._raw.close()
+
+def open_text(path: Path, newline: Optional[str] = None) -> TextIO:
+    """
+    Opens a (possibly .gz/.zst compressed) output file for reading as text.
+    """
+    compression = compression_for(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8", newline=newline)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd files requires zstandard (pip install zstandard).")
+        return zstandard.open(path, "rt", encoding="utf-8", newline=newline)
+    return path.open("r", encoding="utf-8", newline=newline)
+
+def _read_csv_header(path: Path) -> Optional[List[str]]:
+    with open_text(path, newline="") as f:
+        return next(csv.reader(f), None)
 
 @dataclass
 class DatasetWriter:
-    jsonl_path: Path
-    csv_path: Path
+    """
+    Writes normalized records to the enabled backends: JSONL, CSV (nested
+    fields as JSON strings), Parquet tables and/or an indexed SQLite query
+    store. A backend is disabled by leaving its path as None.
+
+    Each record's fields are JSON-encoded once and reused for both the JSONL
+    line and the CSV row. Output is buffered in memory and written in blocks
+    of about buffer_bytes; a ".gz" or ".zst" suffix on a path enables
+    streaming compression. CSV columns are fixed (CSV_FIELDS). Records may
+    be CreativeRecord objects or already-serialized dicts.
+    """
+
+    jsonl_path: Optional[Path]
+    csv_path: Optional[Path]
+    # When resuming, truncate each file to its committed size and append.
+    resume_offsets: Optional[Dict[str, int]] = None
+    parquet_dir: Optional[Path] = None
+    parquet_row_group_size: int = 10000
+    buffer_bytes: int = 1024 * 1024
+    json_encoder: str = "json"
+    # Records are upserted by creativeId, so the store needs no resume offset.
+    sqlite_path: Optional[Path] = None
+    sqlite_batch_size: int = 500
 
     def __post_init__(self):
-        self._jsonl_f = self.jsonl_path.open("w", encoding="utf-8")
-        self._csv_f = self.csv_path.open("w", encoding="utf-8", newline="")
-        self._csv_writer = None
-        self._csv_fields = None
-
-    def write(self, rec: Dict[str, Any]) -> None:
-        # JSONL
-        self._jsonl_f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-        # CSV - flatten nested fields into JSON strings
-        flat = {k: (json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v) for k, v in rec.items()}
-        if self._csv_writer is None:
-            self._csv_fields = list(flat.keys())
-            self._csv_writer = csv.DictWriter(self._csv_f, fieldnames=self._csv_fields)
-            self._csv_writer.writeheader()
-        self._csv_writer.writerow(flat)
+        append = self.resume_offsets is not None
+        if append:
+            for name, path in (("jsonl", self.jsonl_path), ("csv", self.csv_path)):
+                if path is not None:
+                    self._truncate(path, self.resume_offsets.get(name, 0))
+
+        self._encoder = get_encoder(self.json_encoder)
+        self._key_json: Dict[str, str] = {}
+        self._jsonl = _TextSink(self.jsonl_path, append) if self.jsonl_path else None
+        self._csv = _TextSink(self.csv_path, append) if self.csv_path else None
+        self._jsonl_buf: List[str] = []
+        self._jsonl_buffered = 0
+        self._csv_buf = io.StringIO()
+        self._csv_writer = csv.writer(self._csv_buf)
+
+        self._csv_fields: Tuple[str, ...] = CSV_FIELDS
+        if self._csv is not None:
+            if append and self._csv.size() > 0:
+                # Keep the existing header so appended rows line up with it.
+                self._csv_fields = tuple(_read_csv_header(self.csv_path) or CSV_FIELDS)
+            else:
+                self._csv_writer.writerow(self._csv_fields)
+
+        self._parquet = (
+            ParquetWriter(
+                self.parquet_dir,
+                row_group_size=self.parquet_row_group_size,
+                append=append,
+                resume_offsets=self.resume_offsets,
+            )
+            if self.parquet_dir
+            else None
+        )
+        self._store = (
+            QueryStore(self.sqlite_path, batch_size=self.sqlite_batch_size, dumps=self._encoder.dumps)
+            if self.sqlite_path
+            else None
+        )
+
+    @staticmethod
+    def _truncate(path: Path, size: int) -> None:
+        if path.exists():
+            with path.open("r+b") as f:
+                f.truncate(size)
+
+    def bytes_written(self) -> int:
+        """
+        Text output so far: bytes on disk plus what is still buffered.
+        """
+        total = self._jsonl_buffered + self._csv_buf.tell()
+        for sink in (self._jsonl, self._csv):
+            if sink is not None:
+                total += sink.size()
+        return total
+
+    def outputs(self) -> List[str]:
+        paths = (self.jsonl_path, self.csv_path, self.parquet_dir, self.sqlite_path)
+        return [str(p) for p in paths if p is not None]
+
+    def write(self, rec: Union[CreativeRecord, Dict[str, Any]]) -> None:
+        if isinstance(rec, CreativeRecord):
+            rec = rec.to_dict()
+        dumps = self._encoder.dumps
+        line = None
+        if self._csv is not None:
+            encoded = {k: dumps(v) for k, v in rec.items()}
+            if self._jsonl is not None:
+                key_sep = self._encoder.key_sep
+                parts = []
+                for k, v in encoded.items():
+                    kj = self._key_json.get(k)
+                    if kj is None:
+                        kj = self._key_json[k] = dumps(k)
+                    parts.append(kj + key_sep + v)
+                line = "{" + self._encoder.item_sep.join(parts) + "}\n"
+                self._buffer_line(line)
+
+            # CSV - nested fields as their JSON text, scalars as-is
+            row = []
+            for field in self._csv_fields:
+                v = rec.get(field)
+                if isinstance(v, (dict, list)):
+                    row.append(encoded[field])
+                else:
+                    row.append("" if v is None else v)
+            self._csv_writer.writerow(row)
+        elif self._jsonl is not None:
+            line = dumps(rec) + "\n"
+            self._buffer_line(line)
+
+        if self._parquet is not None:
+            self._parquet.write(rec)
+        if self._store is not None:
+            self._store.write(rec, line=line)
+
+        if self._jsonl_buffered + self._csv_buf.tell() >= self.buffer_bytes:
+            self._flush_buffers()
+
+    def _buffer_line(self, line: str) -> None:
+        self._jsonl_buf.append(line)
+        self._jsonl_buffered += len(line)
+
+    def _flush_buffers(self) -> None:
+        if self._jsonl is not None and self._jsonl_buf:
+            self._jsonl.write("".join(self._jsonl_buf))
+            self._jsonl_buf = []
+            self._jsonl_buffered = 0
+        if self._csv is not None and self._csv_buf.tell():
+            self._csv.write(self._csv_buf.getvalue())
+            self._csv_buf.seek(0)
+            self._csv_buf.truncate()
+
+    def commit(self) -> Dict[str, int]:
+        """
+        Make everything written so far durable and return the committed byte
+        offsets of the text outputs (and the Parquet spool position), for use
+        as resume_offsets.
+        """
+        self._flush_buffers()
+        offsets = {}
+        if self._parquet is not None:
+            offsets.update(self._parquet.commit())
+        if self._store is not None:
+            self._store.flush()
+        for name, sink in (("jsonl", self._jsonl), ("csv", self._csv)):
+            if sink is not None:
+                offsets[name] = sink.commit()
+        return offsets
 
     def close(self) -> None:
         try:
-            self._jsonl_f.close()
+            self._flush_buffers()
         finally:
-            self._csv_f.close()
\ No newline at end of file
+            for sink in (self._jsonl, self._csv):
+                if sink is not None:
+                    sink.close()
+            if self._parquet is not None:
+                self._parquet.close()
+            if self._store is not None:
+                self._store.close()
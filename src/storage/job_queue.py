@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.timefmt import utc_now_iso
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_COLUMNS = (
+    "id",
+    "origin_url",
+    "max_items",
+    "download_media",
+    "status",
+    "records",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "seconds",
+)
+
+class JobQueue:
+    """
+    Persistent FIFO of scrape jobs, backed by SQLite. A job moves from queued
+    to running (claim) to done/failed (finish), or to cancelled while still
+    queued. Jobs found running when the queue is opened belong to a service
+    that stopped mid-crawl; they are queued again and resume from their
+    checkpoint.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, origin_url TEXT NOT NULL, max_items INTEGER NOT NULL,"
+            " download_media INTEGER NOT NULL, status TEXT NOT NULL, records INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT, created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT, seconds REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self.requeued = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+        self._db.commit()
+
+    def submit(self, origin_url: str, max_items: int, download_media: bool) -> Dict[str, Any]:
+        with self._lock, self._db:
+            job_id = self._db.execute(
+                "INSERT INTO jobs (origin_url, max_items, download_media, status, created_at)"
+                " VALUES (?, ?, ?, 'queued', ?)",
+                (origin_url, int(max_items), int(bool(download_media)), utc_now_iso()),
+            ).lastrowid
+        return self.get(job_id)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Oldest queued job, marked running; None if the queue is empty.
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (utc_now_iso(), row[0]),
+            )
+        return self.get(row[0])
+
+    def finish(self, job_id: int, records: int, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, records = ?, error = ?, finished_at = ?, seconds = ? WHERE id = ?",
+                ("failed" if error else "done", records, error, utc_now_iso(), round(seconds, 3), job_id),
+            )
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancels a queued job; False if it is no longer queued.
+        """
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (utc_now_iso(), job_id),
+            )
+        return cur.rowcount > 0
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Most recent jobs first, optionally only those with the given status.
+        """
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        params: List[Any] = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [_to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def _to_dict(row: tuple) -> Dict[str, Any]:
+    job = dict(zip(_COLUMNS, row))
+    return {
+        "id": job["id"],
+        "originUrl": job["origin_url"],
+        "maxItems": job["max_items"],
+        "downloadMedia": bool(job["download_media"]),
+        "status": job["status"],
+        "records": job["records"],
+        "error": job["error"],
+        "createdAt": job["created_at"],
+        "startedAt": job["started_at"],
+        "finishedAt": job["finished_at"],
+        "seconds": job["seconds"],
+    }
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import re
+import sqlite3
+import threading
+import zlib
+from itertools import groupby
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from storage.dataset_writer import compression_for
+from utils.timefmt import to_epoch_str
+
+# DatasetWriter emits the top-level fields before the nested stats, so the
+# first match on a line is the record's own value.
+_CREATIVE_ID_RE = re.compile(rb'"creativeId"\s*:\s*"([^"]*)"')
+_LAST_SHOWN_RE = re.compile(rb'"lastShownAt"\s*:\s*"?([^",}]*)')
+
+# Bytes before the indexed end of a file that must be unchanged for the
+# index to be extended rather than rebuilt.
+_TAIL_CHECK = 4096
+
+# (creative_id, last_shown, file_id, offset, length)
+_Entry = Tuple[str, int, int, int, int]
+
+def _key_fields(line: bytes) -> Tuple[Optional[str], int]:
+    """
+    creativeId and lastShownAt epoch of one JSONL line, falling back to a
+    full parse only when the fields are not found as written by DatasetWriter.
+    """
+    m = _CREATIVE_ID_RE.search(line)
+    shown = _LAST_SHOWN_RE.search(line)
+    if m is None or shown is None:
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            return None, 0
+        creative_id = rec.get("creativeId") or rec.get("id")
+        return creative_id, int(to_epoch_str(rec.get("lastShownAt")))
+    return m.group(1).decode("utf-8"), int(to_epoch_str(shown.group(1).decode("utf-8")))
+
+def _crc_before(mm: mmap.mmap, end: int) -> int:
+    return zlib.crc32(mm[max(0, end - _TAIL_CHECK) : end])
+
+class JsonlIndex:
+    """
+    Sidecar SQLite index over uncompressed JSONL outputs: for every line its
+    creativeId, lastShownAt epoch, file and byte range. Files are
+    memory-mapped, so a lookup reads exactly one line and the index build
+    never parses more than the two key fields.
+
+    update() is incremental: a file that only grew since it was indexed is
+    scanned from its old end, one that was rewritten or truncated is
+    re-indexed, and a trailing line without a newline (a file still being
+    written) is left for the next update.
+    """
+
+    _BATCH = 5000
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " file_id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, indexed_size INTEGER NOT NULL,"
+            " tail_crc INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " creative_id TEXT NOT NULL, file_id INTEGER NOT NULL, offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL, last_shown INTEGER NOT NULL,"
+            " PRIMARY KEY (creative_id, file_id, offset)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_by_file ON entries (file_id, creative_id, offset)")
+        self._db.commit()
+        self._maps: Dict[int, Tuple[BinaryIO, mmap.mmap]] = {}
+
+    # -------------------- INDEXING -------------------- #
+
+    def update(self, paths: Iterable[Path]) -> Dict[str, int]:
+        """
+        Brings the index up to date for the given files; returns the number
+        of lines newly indexed per file.
+        """
+        added = {}
+        for path in paths:
+            added[str(path)] = self._update_file(Path(path).resolve())
+        return added
+
+    def _update_file(self, path: Path) -> int:
+        if compression_for(path):
+            raise ValueError(f"{path} is compressed; only plain JSONL can be memory-mapped")
+        with self._lock:
+            row = self._db.execute(
+                "SELECT file_id, indexed_size, tail_crc FROM files WHERE path = ?", (str(path),)
+            ).fetchone()
+        self._unmap(row[0] if row else None)
+
+        with path.open("rb") as f:
+            size = path.stat().st_size
+            if size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                if row is not None:
+                    file_id, indexed_size, tail_crc = row
+                    if indexed_size <= size and _crc_before(mm, indexed_size) == tail_crc:
+                        start = indexed_size
+                    else:
+                        with self._lock, self._db:
+                            self._db.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+                else:
+                    with self._lock, self._db:
+                        file_id = self._db.execute(
+                            "INSERT INTO files (path, indexed_size, tail_crc) VALUES (?, 0, 0)", (str(path),)
+                        ).lastrowid
+                return self._scan(mm, file_id, start, size)
+
+    def _scan(self, mm: mmap.mmap, file_id: int, start: int, size: int) -> int:
+        rows: List[Tuple[str, int, int, int, int]] = []
+        count = 0
+        pos = start
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                break
+            line = mm[pos:end]
+            if line.strip():
+                creative_id, last_shown = _key_fields(line)
+                if creative_id:
+                    rows.append((creative_id, file_id, pos, end - pos, last_shown))
+            pos = end + 1
+            if len(rows) >= self._BATCH:
+                count += self._insert(rows, file_id, pos, mm)
+                rows = []
+        count += self._insert(rows, file_id, pos, mm)
+        return count
+
+    def _insert(
+        self, rows: List[Tuple[str, int, int, int, int]], file_id: int, indexed_size: int, mm: mmap.mmap
+    ) -> int:
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute(
+                "UPDATE files SET indexed_size = ?, tail_crc = ? WHERE file_id = ?",
+                (indexed_size, _crc_before(mm, indexed_size), file_id),
+            )
+        return len(rows)
+
+    # -------------------- READING -------------------- #
+
+    def _map(self, file_id: int) -> mmap.mmap:
+        mapped = self._maps.get(file_id)
+        if mapped is None:
+            with self._lock:
+                (path,) = self._db.execute("SELECT path FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            f = open(path, "rb")
+            mapped = self._maps[file_id] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return mapped[1]
+
+    def _unmap(self, file_id: Optional[int]) -> None:
+        mapped = self._maps.pop(file_id, None) if file_id is not None else None
+        if mapped is not None:
+            mapped[1].close()
+            mapped[0].close()
+
+    def read_line(self, file_id: int, offset: int, length: int) -> bytes:
+        return self._map(file_id)[offset : offset + length]
+
+    def lookup(self, creative_id: str, all_versions: bool = False) -> List[Dict[str, Any]]:
+        """
+        The newest record (highest lastShownAt) for creative_id, or every
+        indexed copy of it with all_versions, newest first.
+        """
+        sql = (
+            "SELECT file_id, offset, length FROM entries WHERE creative_id = ?"
+            " ORDER BY last_shown DESC, file_id DESC, offset DESC"
+        )
+        if not all_versions:
+            sql += " LIMIT 1"
+        with self._lock:
+            rows = self._db.execute(sql, (creative_id,)).fetchall()
+        return [json.loads(self.read_line(*row)) for row in rows]
+
+    def _file_entries(self, file_id: int) -> Iterator[_Entry]:
+        # A cursor per file streams its entries in creativeId order.
+        cursor = self._db.cursor()
+        cursor.execute(
+            "SELECT creative_id, last_shown, file_id, offset, length FROM entries"
+            " WHERE file_id = ? ORDER BY creative_id, offset",
+            (file_id,),
+        )
+        yield from cursor
+
+    def newest(self, paths: Optional[Iterable[Path]] = None) -> Iterator[_Entry]:
+        """
+        k-way merge of the per-file entry streams (all indexed files, or the
+        given ones), yielding one entry per creativeId: the copy with the
+        newest lastShownAt, ties going to the later file and line. Memory
+        use is one pending entry per file.
+        """
+        with self._lock:
+            if paths is None:
+                file_ids = [r[0] for r in self._db.execute("SELECT file_id FROM files ORDER BY file_id")]
+            else:
+                file_ids = []
+                for path in paths:
+                    row = self._db.execute(
+                        "SELECT file_id FROM files WHERE path = ?", (str(Path(path).resolve()),)
+                    ).fetchone()
+                    if row is None:
+                        raise KeyError(f"{path} is not indexed")
+                    file_ids.append(row[0])
+        rank = {file_id: i for i, file_id in enumerate(file_ids)}
+        merged = heapq.merge(*(self._file_entries(file_id) for file_id in file_ids), key=lambda e: e[0])
+        for _, copies in groupby(merged, key=lambda e: e[0]):
+            yield max(copies, key=lambda e: (e[1], rank[e[2]], e[3]))
+
+    def merge(self, out: BinaryIO, paths: Optional[Iterable[Path]] = None) -> int:
+        """
+        Writes the deduplicated records (see newest()) to out as JSONL,
+        ordered by creativeId, copying lines without parsing them. Returns
+        the number of records written.
+        """
+        count = 0
+        for _, _, file_id, offset, length in self.newest(paths):
+            out.write(self.read_line(file_id, offset, length))
+            out.write(b"\n")
+            count += 1
+        return count
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (files,) = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            (creatives,) = self._db.execute("SELECT COUNT(DISTINCT creative_id) FROM entries").fetchone()
+        return {"files": files, "entries": entries, "creatives": creatives}
+
+    def close(self) -> None:
+        for file_id in list(self._maps):
+            self._unmap(file_id)
+        with self._lock:
+            self._db.close()
@@ -2,55 +2,279 @@ from __future__ import annotations
 
 import hashlib
 import logging
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional, TextIO, Tuple, Union
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from models.records import CreativeRecord, Variant
+from utils.metrics import Metrics
+
+class PendingMedia:
+    """
+    Handle for a record whose media is being downloaded in the background.
+    result() waits for the downloads and writes the store keys into the record.
+    """
+
+    def __init__(
+        self,
+        record: Union[CreativeRecord, Dict],
+        preview: Optional[Future],
+        images: List[Tuple[Union[Variant, Dict], Future]],
+    ):
+        self.record = record
+        self._preview = preview
+        self._images = images
+
+    def result(self) -> List[str]:
+        keys: List[str] = []
+        if self._preview is not None:
+            key = self._preview.result()
+            if key:
+                if isinstance(self.record, CreativeRecord):
+                    self.record.preview_store_key = key
+                else:
+                    self.record["previewStoreKey"] = key
+                keys.append(key)
+
+        for variant, fut in self._images:
+            key = fut.result()
+            if key:
+                keys.append(key)
+                if isinstance(variant, Variant):
+                    variant.image_store_keys.append(key)
+                else:
+                    variant.setdefault("imageStoreKeys", []).append(key)
+        return keys
+
+class MediaIndex:
+    """
+    Append-only on-disk map from media URL to content-addressed store key.
+    One tab-separated line per URL; the last line for a URL wins. The file is
+    created on the first put().
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+        if path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    url, sep, key = line.rstrip("\n").rpartition("\t")
+                    if sep and url and key:
+                        self._entries[url] = key
+        self._f: Optional[TextIO] = None
+
+    def get(self, url: str) -> Optional[str]:
+        return self._entries.get(url)
+
+    def put(self, url: str, key: str) -> None:
+        if "\t" in url or "\n" in url:
+            return
+        with self._lock:
+            if self._entries.get(url) == key:
+                return
+            self._entries[url] = key
+            if self._f is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._f = self.path.open("a", encoding="utf-8")
+            self._f.write(f"{url}\t{key}\n")
+            self._f.flush()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
 
 class MediaStore:
     """
     Lightweight media downloader. Stores images/videos referenced in the creative
-    under deterministic keys (sha1 of URL basename).
+    under content-addressed keys ("ab/<sha256><ext>"), so the same bytes served
+    from different URLs are stored once. Bodies are streamed to a temp file while
+    hashing, and an on-disk URL index lets later runs skip known URLs entirely.
+
+    Downloads run on a bounded worker pool over a pooled session, with a cap on
+    concurrent requests per host: downloads beyond it wait in a per-host queue
+    rather than in a worker, so a busy host does not hold up the others.
+    Identical URLs requested while a download is
+    still running share that download. Nothing is created on disk until the
+    first download.
     """
 
-    def __init__(self, media_dir: Path):
+    def __init__(
+        self,
+        media_dir: Path,
+        max_workers: int = 8,
+        per_host_limit: int = 4,
+        timeout_sec: int = 20,
+        metrics: Optional[Metrics] = None,
+    ):
         self.media_dir = media_dir
-        self.media_dir.mkdir(parents=True, exist_ok=True)
+        self.metrics = metrics
+        self.timeout_sec = timeout_sec
+        self.per_host_limit = max(1, per_host_limit)
 
-    def _key_for_url(self, url: str) -> str:
-        parsed = urlparse(url)
-        name = Path(parsed.path).name or "media"
-        base = name.split("?")[0]
-        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
-        return f"{digest}_{base}"
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="media")
 
-    def capture_media(self, record: Dict) -> List[str]:
-        keys: List[str] = []
-        preview_url: Optional[str] = record.get("previewUrl")
+        self._lock = threading.RLock()
+        # Per host: downloads running on the pool, and ones waiting for a slot.
+        self._host_active: Dict[str, int] = {}
+        self._host_waiting: Dict[str, Deque[Tuple[str, Future]]] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._tmp_dir = self.media_dir / ".tmp"
+        self.index = MediaIndex(self.media_dir / "index.tsv")
+
+    CHUNK_SIZE = 64 * 1024
+
+    @staticmethod
+    def _extension(url: str, content_type: Optional[str]) -> str:
+        suffix = Path(urlparse(url).path).suffix.lower()
+        if suffix and len(suffix) <= 5 and suffix[1:].isalnum():
+            return suffix
+        if content_type:
+            guessed = mimetypes.guess_extension(content_type.split(";")[0].strip())
+            if guessed:
+                return ".jpg" if guessed == ".jpe" else guessed
+        return ""
+
+    def capture_media(self, record: Union[CreativeRecord, Dict]) -> List[str]:
+        return self.submit(record).result()
+
+    def submit(self, record: Union[CreativeRecord, Dict]) -> PendingMedia:
+        """
+        Schedule downloads for the record's preview and variant images without
+        blocking. Call result() on the returned handle before writing the record.
+        """
+        if isinstance(record, CreativeRecord):
+            preview_url: Optional[str] = record.preview_url
+            variants = record.variants
+        else:
+            preview_url = record.get("previewUrl")
+            variants = record.get("variants") or []
+
+        preview = None
         if preview_url:
-            key = self._key_for_url(preview_url)
-            if self._download(preview_url, key):
-                record["previewStoreKey"] = key
-                keys.append(key)
+            preview = self._schedule(preview_url)
 
-        for v in record.get("variants") or []:
-            for img in v.get("images") or []:
-                key = self._key_for_url(img)
-                if self._download(img, key):
-                    keys.append(key)
-                    v.setdefault("imageStoreKeys", []).append(key)
-        return keys
+        images = []
+        for v in variants:
+            for img in (v.images if isinstance(v, Variant) else v.get("images")) or []:
+                images.append((v, self._schedule(img)))
+        return PendingMedia(record, preview, images)
 
-    def _download(self, url: str, key: str) -> bool:
+    def close(self) -> None:
+        # Finishing downloads submit the waiting ones, so drain before shutdown.
+        while True:
+            with self._lock:
+                pending = list(self._in_flight.values())
+            if not pending:
+                break
+            wait(pending)
+        self._executor.shutdown(wait=True)
+        self._session.close()
+        self.index.close()
+
+    def _schedule(self, url: str) -> Future:
+        with self._lock:
+            fut = self._in_flight.get(url)
+            if fut is None:
+                known = self._known_key(url)
+                if known:
+                    fut = Future()
+                    fut.set_result(known)
+                    return fut
+                fut = Future()
+                self._in_flight[url] = fut
+                fut.add_done_callback(lambda _f, u=url: self._forget(u))
+                host = urlparse(url).netloc
+                if self._host_active.get(host, 0) < self.per_host_limit:
+                    self._host_active[host] = self._host_active.get(host, 0) + 1
+                    self._executor.submit(self._run, host, url, fut)
+                else:
+                    self._host_waiting.setdefault(host, deque()).append((url, fut))
+            return fut
+
+    def _forget(self, url: str) -> None:
+        with self._lock:
+            self._in_flight.pop(url, None)
+
+    def _run(self, host: str, url: str, fut: Future) -> None:
+        try:
+            fut.set_result(self._download(url))
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            # Hand the host's slot to its next waiting download, if any.
+            with self._lock:
+                waiting = self._host_waiting.get(host)
+                if waiting:
+                    next_url, next_fut = waiting.popleft()
+                    self._executor.submit(self._run, host, next_url, next_fut)
+                else:
+                    self._host_waiting.pop(host, None)
+                    active = self._host_active[host] - 1
+                    if active:
+                        self._host_active[host] = active
+                    else:
+                        del self._host_active[host]
+
+    def _known_key(self, url: str) -> Optional[str]:
+        key = self.index.get(url)
+        if key and (self.media_dir / key).exists():
+            return key
+        return None
+
+    def _download(self, url: str) -> Optional[str]:
+        tmp_path: Optional[str] = None
+        started = time.perf_counter()
+        size = 0
         try:
+            with self._session.get(url, timeout=self.timeout_sec, stream=True) as resp:
+                if self.metrics is not None:
+                    self.metrics.count_status("media", resp.status_code)
+                resp.raise_for_status()
+                digest = hashlib.sha256()
+                self._tmp_dir.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir, suffix=".part")
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in resp.iter_content(chunk_size=self.CHUNK_SIZE):
+                        digest.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+                content_type = resp.headers.get("Content-Type")
+
+            hexdigest = digest.hexdigest()
+            key = f"{hexdigest[:2]}/{hexdigest}{self._extension(url, content_type)}"
             path = self.media_dir / key
             if path.exists():
-                return True
-            resp = requests.get(url, timeout=20)
-            resp.raise_for_status()
-            path.write_bytes(resp.content)
-            return True
+                os.unlink(tmp_path)
+            else:
+                path.parent.mkdir(exist_ok=True)
+                # Rename into place so a partial file never looks complete.
+                os.replace(tmp_path, path)
+            tmp_path = None
+            self.index.put(url, key)
+            return key
         except Exception as e:
+            if self.metrics is not None and not isinstance(e, requests.HTTPError):
+                self.metrics.count_status("media", "error")
             logging.debug("Media download failed for %s: %s", url, e)
-            return False
\ No newline at end of file
+            return None
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe("media", time.perf_counter() - started, nbytes=size)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.timefmt import to_epoch_str
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _to_ts(value: Any) -> Optional[int]:
+    epoch = int(to_epoch_str(value)) if value is not None else 0
+    return epoch or None
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    ts = pa.timestamp("s", tz="UTC")
+    return {
+        "creatives": pa.schema(
+            [
+                ("id", pa.string()),
+                ("advertiserId", pa.string()),
+                ("creativeId", pa.string()),
+                ("advertiserName", pa.string()),
+                ("format", pa.string()),
+                ("url", pa.string()),
+                ("previewUrl", pa.string()),
+                ("previewStoreKey", pa.string()),
+                ("firstShownAt", ts),
+                ("lastShownAt", ts),
+                ("impressions", pa.int64()),
+                ("shownCountries", pa.list_(pa.string())),
+                (
+                    "audienceSelections",
+                    pa.list_(
+                        pa.struct(
+                            [
+                                ("name", pa.string()),
+                                ("hasIncludedCriteria", pa.bool_()),
+                                ("hasExcludedCriteria", pa.bool_()),
+                            ]
+                        )
+                    ),
+                ),
+                (
+                    "variants",
+                    pa.list_(
+                        pa.struct(
+                            [
+                                ("textContent", pa.string()),
+                                ("images", pa.list_(pa.string())),
+                                ("imageStoreKeys", pa.list_(pa.string())),
+                            ]
+                        )
+                    ),
+                ),
+                ("originUrl", pa.string()),
+                ("mediaStoreKeys", pa.list_(pa.string())),
+            ]
+        ),
+        "country_stats": pa.schema(
+            [
+                ("creativeId", pa.string()),
+                ("code", pa.string()),
+                ("name", pa.string()),
+                ("firstShownAt", ts),
+                ("lastShownAt", ts),
+                ("impressionsLowerBound", pa.int64()),
+                ("impressionsUpperBound", pa.int64()),
+            ]
+        ),
+        "platform_stats": pa.schema(
+            [
+                ("creativeId", pa.string()),
+                ("countryCode", pa.string()),
+                ("country", pa.string()),
+                ("code", pa.string()),
+                ("name", pa.string()),
+                ("impressionsLowerBound", pa.int64()),
+                ("impressionsUpperBound", pa.int64()),
+            ]
+        ),
+    }
+
+class ParquetWriter:
+    """
+    Columnar output: one Parquet file per table in out_dir, written in row
+    groups of row_group_size creatives. countryStats and platformStats are
+    exploded into child tables keyed by creativeId; impression bounds are
+    int64 and shown-at fields are UTC timestamps.
+
+    A Parquet file cannot be appended to once closed, so tables are written as
+    numbered parts (creatives-00000.parquet, ...), one row group each: a part
+    is written and closed once row_group_size creatives are buffered, and on
+    close(). A fresh writer replaces the existing parts.
+
+    A part is only readable once closed, so commit() makes the rows buffered
+    for the next part durable in a spool file (_pending-NNNNN.jsonl, ignored
+    by Parquet readers) and returns the resume offsets: the part number and
+    the spool's committed size. A writer resumed from them drops the parts
+    written after the commit, and buffers the spooled rows again.
+    """
+
+    TABLES = ("creatives", "country_stats", "platform_stats")
+
+    def __init__(
+        self,
+        out_dir: Path,
+        row_group_size: int = 10000,
+        append: bool = False,
+        resume_offsets: Optional[Dict[str, int]] = None,
+    ):
+        if pa is None:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow).")
+        self.out_dir = out_dir
+        self.row_group_size = max(1, row_group_size)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._schemas = _schemas()
+        self._rows: Dict[str, List[Dict[str, Any]]] = {name: [] for name in self.TABLES}
+        # Rows per table already in the current part's spool.
+        self._spooled: Dict[str, int] = {name: 0 for name in self.TABLES}
+        self._pending = 0
+        self._parts_written = 0
+
+        resume = resume_offsets or {}
+        resume_part = int(resume["parquetPart"]) if append and "parquetPart" in resume else None
+        if resume_part is not None and not self._spool_path(resume_part).exists():
+            # close() wrote the part and dropped its spool once every row was
+            # committed, so the part holds exactly the committed rows.
+            if all(_readable(self._part_path(name, resume_part)) for name in self.TABLES):
+                resume_part += 1
+                resume = {}
+            elif resume.get("parquet"):
+                logging.warning("Parquet part %05d lost its spool; its committed rows are lost", resume_part)
+        for path in sorted(self.out_dir.glob("*-[0-9][0-9][0-9][0-9][0-9].parquet")):
+            table, _, number = path.stem.rpartition("-")
+            if table not in self.TABLES:
+                continue
+            if not append or (resume_part is not None and int(number) >= resume_part):
+                path.unlink()
+            elif not _readable(path):
+                logging.warning("Removing %s: its part was never committed", path)
+                path.unlink()
+        self.part = resume_part if resume_part is not None else self._next_part()
+        for spool in self.out_dir.glob("_pending-*.jsonl"):
+            if spool != self._spool_path(self.part):
+                spool.unlink()
+        self._spool_size = int(resume.get("parquet") or 0)
+        self._restore_spool()
+        # Part of the last returned offsets: older spools are kept until the
+        # caller has recorded newer ones.
+        self._committed_part = self.part
+
+    def _part_path(self, table: str, part: int) -> Path:
+        return self.out_dir / f"{table}-{part:05d}.parquet"
+
+    def _next_part(self) -> int:
+        part = 0
+        while any(self._part_path(name, part).exists() for name in self.TABLES):
+            part += 1
+        return part
+
+    def _spool_path(self, part: int) -> Path:
+        return self.out_dir / f"_pending-{part:05d}.jsonl"
+
+    def _restore_spool(self) -> None:
+        spool = self._spool_path(self.part)
+        if not spool.exists():
+            self._spool_size = 0
+            return
+        with spool.open("r+b") as f:
+            # Anything past the committed size was spooled after the commit.
+            f.truncate(self._spool_size)
+            data = f.read()
+        for line in data.decode("utf-8").splitlines():
+            table, row = json.loads(line)
+            self._rows[table].append(row)
+            self._spooled[table] += 1
+        self._pending = len(self._rows["creatives"])
+
+    def path_for(self, table: str) -> Path:
+        return self._part_path(table, self.part)
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        creative_id = rec.get("creativeId")
+        self._rows["creatives"].append(
+            {
+                "id": rec.get("id"),
+                "advertiserId": rec.get("advertiserId"),
+                "creativeId": creative_id,
+                "advertiserName": rec.get("advertiserName"),
+                "format": rec.get("format"),
+                "url": rec.get("url"),
+                "previewUrl": rec.get("previewUrl"),
+                "previewStoreKey": rec.get("previewStoreKey"),
+                "firstShownAt": _to_ts(rec.get("firstShownAt")),
+                "lastShownAt": _to_ts(rec.get("lastShownAt")),
+                "impressions": _to_int(rec.get("impressions")),
+                "shownCountries": rec.get("shownCountries") or [],
+                "audienceSelections": rec.get("audienceSelections") or [],
+                "variants": rec.get("variants") or [],
+                "originUrl": rec.get("originUrl"),
+                "mediaStoreKeys": rec.get("mediaStoreKeys") or [],
+            }
+        )
+        for c in rec.get("countryStats") or []:
+            imp = c.get("impressions") or {}
+            self._rows["country_stats"].append(
+                {
+                    "creativeId": creative_id,
+                    "code": c.get("code"),
+                    "name": c.get("name"),
+                    "firstShownAt": _to_ts(c.get("firstShownAt")),
+                    "lastShownAt": _to_ts(c.get("lastShownAt")),
+                    "impressionsLowerBound": _to_int(imp.get("lowerBound")),
+                    "impressionsUpperBound": _to_int(imp.get("upperBound")),
+                }
+            )
+        for p in rec.get("platformStats") or []:
+            imp = p.get("impressions") or {}
+            self._rows["platform_stats"].append(
+                {
+                    "creativeId": creative_id,
+                    "countryCode": p.get("countryCode"),
+                    "country": p.get("country"),
+                    "code": p.get("code"),
+                    "name": p.get("name"),
+                    "impressionsLowerBound": _to_int(imp.get("lowerBound")),
+                    "impressionsUpperBound": _to_int(imp.get("upperBound")),
+                }
+            )
+        self._pending += 1
+        if self._pending >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write buffered rows as the next part, one row group per table.
+        """
+        if not self._pending:
+            return
+        self._write_part()
+
+    def _write_part(self) -> None:
+        for name in self.TABLES:
+            table = pa.Table.from_pylist(self._rows[name], schema=self._schemas[name])
+            with pq.ParquetWriter(str(self.path_for(name)), self._schemas[name], compression="zstd") as w:
+                w.write_table(table)
+            self._rows[name] = []
+            self._spooled[name] = 0
+        self._pending = 0
+        self._parts_written += 1
+        self.part += 1
+        self._spool_size = 0
+
+    def commit(self) -> Dict[str, int]:
+        """
+        Spool the rows buffered since the last commit and return the resume
+        offsets ({"parquetPart": ..., "parquet": spool size}).
+        """
+        lines = []
+        for name in self.TABLES:
+            rows = self._rows[name]
+            lines.extend(json.dumps([name, row], ensure_ascii=False) + "\n" for row in rows[self._spooled[name] :])
+            self._spooled[name] = len(rows)
+        spool = self._spool_path(self.part)
+        if lines or not spool.exists():
+            data = "".join(lines).encode("utf-8")
+            with spool.open("ab") as f:
+                f.truncate(self._spool_size)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._spool_size += len(data)
+        # By now the caller has recorded the previous commit's offsets, so
+        # spools of the parts closed before it are no longer needed.
+        for old in self.out_dir.glob("_pending-*.jsonl"):
+            if int(old.stem.rpartition("-")[2]) < self._committed_part:
+                old.unlink()
+        self._committed_part = self.part
+        return {"parquetPart": self.part, "parquet": self._spool_size}
+
+    def close(self) -> None:
+        """
+        Write the remaining rows as a last part. Spools stay for a resume
+        from an earlier commit, unless every row was committed.
+        """
+        unspooled = any(len(self._rows[name]) > self._spooled[name] for name in self.TABLES)
+        if self._pending or (not self._parts_written and self._next_part() == 0):
+            # An empty run still leaves one (empty) part per table with its schema.
+            self._write_part()
+        if not unspooled:
+            for spool in self.out_dir.glob("_pending-*.jsonl"):
+                spool.unlink()
+
+def _readable(path: Path) -> bool:
+    try:
+        pq.read_metadata(str(path))
+    except Exception:
+        return False
+    return True
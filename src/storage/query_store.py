@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from models.records import CreativeRecord
+from utils.timefmt import to_epoch_str
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS creatives ("
+    " creative_id TEXT PRIMARY KEY, advertiser_id TEXT, format TEXT,"
+    " first_shown INTEGER, last_shown INTEGER, record TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS creative_countries ("
+    " creative_id TEXT NOT NULL, code TEXT NOT NULL, first_shown INTEGER, last_shown INTEGER,"
+    " PRIMARY KEY (creative_id, code)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS creative_platforms ("
+    " creative_id TEXT NOT NULL, country_code TEXT NOT NULL, code TEXT NOT NULL,"
+    " PRIMARY KEY (creative_id, country_code, code)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS creatives_advertiser ON creatives (advertiser_id, last_shown)",
+    "CREATE INDEX IF NOT EXISTS creatives_format ON creatives (format, last_shown)",
+    "CREATE INDEX IF NOT EXISTS creatives_first_shown ON creatives (first_shown)",
+    "CREATE INDEX IF NOT EXISTS creatives_last_shown ON creatives (last_shown)",
+    "CREATE INDEX IF NOT EXISTS countries_code ON creative_countries (code, last_shown)",
+    "CREATE INDEX IF NOT EXISTS platforms_code ON creative_platforms (code, country_code)",
+)
+
+_Row = Tuple[Any, ...]
+
+def _epoch(value: Any) -> Optional[int]:
+    """
+    Epoch seconds for an epoch or ISO value; None when missing or invalid.
+    """
+    if value in (None, ""):
+        return None
+    epoch = int(to_epoch_str(value))
+    return epoch or None
+
+class QueryStore:
+    """
+    Indexed SQLite copy of the written creatives, for answering questions
+    like "IMAGE creatives shown in DE after X for advertiser Y" without
+    re-reading the JSONL.
+
+    creatives holds one row per creative (the full record as JSON plus the
+    indexed advertiserId, format and first/last-shown epochs);
+    creative_countries and creative_platforms hold its country and platform
+    codes. A creative written again replaces its earlier rows, so re-running
+    or resuming a crawl into the same store is safe.
+
+    Rows are buffered and inserted batch_size records per transaction. Several
+    processes may share one store (batch shards); SQLite serializes writers.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = 500,
+        dumps: Callable[[Any], str] = json.dumps,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.dumps = dumps
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+        self._creatives: List[_Row] = []
+        self._countries: List[_Row] = []
+        self._platforms: List[_Row] = []
+
+    def write(self, rec: Union[CreativeRecord, Dict[str, Any]], line: Optional[str] = None) -> None:
+        """
+        Buffers one record; line is its JSON text when the caller already has
+        it (bulk import), saving a re-encode.
+        """
+        if isinstance(rec, CreativeRecord):
+            rec = rec.to_dict()
+        creative_id = rec.get("creativeId") or rec.get("id")
+        if not creative_id:
+            return
+        self._creatives.append(
+            (
+                creative_id,
+                rec.get("advertiserId"),
+                rec.get("format"),
+                _epoch(rec.get("firstShownAt")),
+                _epoch(rec.get("lastShownAt")),
+                line.rstrip("\n") if line is not None else self.dumps(rec),
+            )
+        )
+        for c in rec.get("countryStats") or []:
+            if isinstance(c, dict) and c.get("code"):
+                self._countries.append(
+                    (creative_id, c["code"], _epoch(c.get("firstShownAt")), _epoch(c.get("lastShownAt")))
+                )
+        for p in rec.get("platformStats") or []:
+            if isinstance(p, dict) and p.get("code"):
+                self._platforms.append((creative_id, p.get("countryCode") or "", p["code"]))
+        if len(self._creatives) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Inserts the buffered records in one transaction.
+        """
+        if not self._creatives:
+            return
+        creatives, countries, platforms = self._creatives, self._countries, self._platforms
+        self._creatives, self._countries, self._platforms = [], [], []
+        ids = [(row[0],) for row in creatives]
+        with self._lock, self._db:
+            # Replace, not merge: a re-written creative drops stale codes.
+            self._db.executemany("DELETE FROM creative_countries WHERE creative_id = ?", ids)
+            self._db.executemany("DELETE FROM creative_platforms WHERE creative_id = ?", ids)
+            self._db.executemany("INSERT OR REPLACE INTO creatives VALUES (?, ?, ?, ?, ?, ?)", creatives)
+            self._db.executemany("INSERT OR REPLACE INTO creative_countries VALUES (?, ?, ?, ?)", countries)
+            self._db.executemany("INSERT OR IGNORE INTO creative_platforms VALUES (?, ?, ?)", platforms)
+
+    def import_lines(self, lines: Iterable[str]) -> int:
+        """
+        Bulk-loads JSONL lines as written by DatasetWriter; returns the number
+        of records imported.
+        """
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            self.write(json.loads(line), line=line)
+            count += 1
+        self.flush()
+        return count
+
+    def query(
+        self,
+        advertiser_id: Optional[str] = None,
+        creative_id: Optional[str] = None,
+        format: Optional[str] = None,
+        country: Optional[str] = None,
+        platform: Optional[str] = None,
+        shown_after: Optional[int] = None,
+        shown_before: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Records matching every given filter, most recently shown first.
+        shown_after / shown_before (epoch seconds) bound the shown window;
+        with country, the window of that country is used.
+        """
+        sql, params = self._select(
+            "c.record", advertiser_id, creative_id, format, country, platform, shown_after, shown_before
+        )
+        sql += " ORDER BY c.last_shown DESC, c.creative_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        for (record,) in rows:
+            yield json.loads(record)
+
+    def count(self, **filters: Any) -> int:
+        sql, params = self._select("COUNT(*)", **filters)
+        with self._lock:
+            (n,) = self._db.execute(sql, params).fetchone()
+        return n
+
+    @staticmethod
+    def _select(
+        columns: str,
+        advertiser_id: Optional[str] = None,
+        creative_id: Optional[str] = None,
+        format: Optional[str] = None,
+        country: Optional[str] = None,
+        platform: Optional[str] = None,
+        shown_after: Optional[int] = None,
+        shown_before: Optional[int] = None,
+    ) -> Tuple[str, List[Any]]:
+        join = ""
+        where: List[str] = []
+        params: List[Any] = []
+        window = "c"
+        if country:
+            join = " JOIN creative_countries cc ON cc.creative_id = c.creative_id AND cc.code = ?"
+            params.append(country.upper())
+            window = "cc"
+        for column, value in (("advertiser_id", advertiser_id), ("creative_id", creative_id)):
+            if value:
+                where.append(f"c.{column} = ?")
+                params.append(value)
+        if format:
+            where.append("c.format = ?")
+            params.append(format.upper())
+        if platform:
+            clause = "SELECT 1 FROM creative_platforms p WHERE p.creative_id = c.creative_id AND p.code = ?"
+            params.append(platform.upper())
+            if country:
+                clause += " AND p.country_code = ?"
+                params.append(country.upper())
+            where.append(f"EXISTS ({clause})")
+        if shown_after is not None:
+            where.append(f"{window}.last_shown >= ?")
+            params.append(int(shown_after))
+        if shown_before is not None:
+            where.append(f"{window}.first_shown <= ?")
+            params.append(int(shown_before))
+
+        sql = f"SELECT {columns} FROM creatives c{join}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql, params
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("creatives", "creative_countries", "creative_platforms")
+            }
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._db.close()
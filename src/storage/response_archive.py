@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+ARCHIVE_COMPRESSIONS = {"gzip": ".warc.gz", "zstd": ".warc.zst"}
+
+# What a record holds: a search/origin page, a later RPC page or a detail page.
+RECORD_KINDS = ("page", "rpc", "detail")
+
+@dataclass
+class ArchivedResponse:
+    """
+    One archived response. body is the response text as received (a mock
+    page is its payload as JSON); mode is the page document mode it was
+    served as ("html", "rpc" or "mock").
+    """
+
+    kind: str
+    mode: str
+    url: str
+    origin_url: str
+    page: int
+    fetched_at: float
+    body: str
+
+def _warc_date(epoch: float) -> str:
+    return dt.datetime.utcfromtimestamp(epoch).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def encode_record(resp: ArchivedResponse, record_id: str) -> bytes:
+    """
+    A WARC/1.0 "resource" record (the body without HTTP headers), with the
+    crawl context in X-Archive-* fields.
+    """
+    body = resp.body.encode("utf-8")
+    headers = [
+        "WARC/1.0",
+        "WARC-Type: resource",
+        f"WARC-Record-ID: <urn:uuid:{record_id}>",
+        f"WARC-Date: {_warc_date(resp.fetched_at)}",
+        f"WARC-Target-URI: {resp.url}",
+        "Content-Type: application/json" if resp.mode != "html" else "Content-Type: text/html; charset=utf-8",
+        f"X-Archive-Kind: {resp.kind}",
+        f"X-Archive-Mode: {resp.mode}",
+        f"X-Archive-Origin-URI: {resp.origin_url}",
+        f"X-Archive-Page: {resp.page}",
+        f"X-Archive-Fetched-At: {resp.fetched_at:.3f}",
+        f"Content-Length: {len(body)}",
+    ]
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("utf-8") + body + b"\r\n\r\n"
+
+def decode_record(data: bytes) -> ArchivedResponse:
+    head, _, rest = data.partition(b"\r\n\r\n")
+    fields: Dict[str, str] = {}
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        fields[name.strip().lower()] = value.strip()
+    length = int(fields["content-length"])
+    return ArchivedResponse(
+        kind=fields["x-archive-kind"],
+        mode=fields["x-archive-mode"],
+        url=fields["warc-target-uri"],
+        origin_url=fields.get("x-archive-origin-uri", ""),
+        page=int(fields.get("x-archive-page") or 0),
+        fetched_at=float(fields["x-archive-fetched-at"]),
+        body=rest[:length].decode("utf-8"),
+    )
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd archives requires zstandard (pip install zstandard).")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def _compression_of(segment: str) -> str:
+    return "zstd" if segment.endswith(ARCHIVE_COMPRESSIONS["zstd"]) else "gzip"
+
+class ResponseArchive:
+    """
+    Append-only archive of raw responses for offline reprocessing.
+
+    Responses are WARC-style records in segment files under archive_dir,
+    each record its own gzip member (or zstd frame), so a segment is a valid
+    .warc.gz that warc tools can read and any record can be decompressed on
+    its own. Segments are never reopened for writing: every process starts a
+    new one, and rolls over to another past segment_bytes.
+
+    archive.sqlite indexes every record by URL, page and fetch time with its
+    segment, offset and length. A record is indexed only after it is fully
+    written, so a crash leaves at most an unindexed tail. Safe to share
+    between threads, and between processes using the same directory.
+    """
+
+    def __init__(self, archive_dir: Path, segment_bytes: int = 256 * 1024 * 1024, compression: str = "gzip"):
+        if compression not in ARCHIVE_COMPRESSIONS:
+            raise ValueError(f"Unsupported archive compression {compression!r}; choose gzip or zstd")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("zstd archives require zstandard (pip install zstandard).")
+        self.archive_dir = archive_dir
+        self.segment_bytes = max(1, segment_bytes)
+        self.compression = compression
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(archive_dir / "archive.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            " name TEXT PRIMARY KEY, created_at REAL NOT NULL, closed_at REAL,"
+            " records INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " id INTEGER PRIMARY KEY, segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL,"
+            " kind TEXT NOT NULL, mode TEXT NOT NULL, url TEXT NOT NULL, origin_url TEXT NOT NULL,"
+            " page INTEGER NOT NULL, fetched_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_url ON records(url, page, fetched_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_origin ON records(origin_url, fetched_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_segment ON records(segment, offset)")
+        self._db.commit()
+
+        self._file: Optional[BinaryIO] = None
+        self._segment: Optional[str] = None
+        self._offset = 0
+        self.records = 0
+        self.bytes = 0
+
+    def append(self, resp: ArchivedResponse) -> None:
+        data = encode_record(resp, str(uuid.uuid4()))
+        member = _compress(data, self.compression)
+        with self._lock:
+            if self._file is None or self._offset >= self.segment_bytes:
+                self._roll()
+            offset = self._offset
+            self._file.write(member)
+            self._file.flush()
+            self._offset += len(member)
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO records (segment, offset, length, kind, mode, url, origin_url, page, fetched_at, size)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self._segment,
+                        offset,
+                        len(member),
+                        resp.kind,
+                        resp.mode,
+                        resp.url,
+                        resp.origin_url,
+                        resp.page,
+                        resp.fetched_at,
+                        len(data),
+                    ),
+                )
+                self._db.execute(
+                    "UPDATE segments SET records = records + 1, bytes = ? WHERE name = ?",
+                    (self._offset, self._segment),
+                )
+            self.records += 1
+            self.bytes += len(member)
+
+    def _roll(self) -> None:
+        self._close_segment()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        name = f"seg-{stamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}{ARCHIVE_COMPRESSIONS[self.compression]}"
+        # "xb": segments are append-only and never shared between writers.
+        self._file = (self.archive_dir / name).open("xb")
+        self._segment = name
+        self._offset = 0
+        with self._db:
+            self._db.execute("INSERT INTO segments (name, created_at) VALUES (?, ?)", (name, time.time()))
+        logging.debug("ResponseArchive: writing %s", name)
+
+    def _close_segment(self) -> None:
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        with self._db:
+            self._db.execute("UPDATE segments SET closed_at = ? WHERE name = ?", (time.time(), self._segment))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"records": self.records, "bytes": self.bytes}
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+            self._db.close()
+
+class ArchiveReader:
+    """
+    Read side of a ResponseArchive directory: index queries and record
+    access. Each process should open its own reader.
+    """
+
+    def __init__(self, archive_dir: Path):
+        self.archive_dir = archive_dir
+        index = archive_dir / "archive.sqlite"
+        if not index.exists():
+            raise FileNotFoundError(f"No response archive in {archive_dir} (missing {index.name})")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(index), timeout=30, check_same_thread=False)
+        self._files: Dict[str, BinaryIO] = {}
+
+    def segments(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Segments holding records fetched in [since, until], oldest first, with
+        their record counts in that range.
+        """
+        where, params = _time_range(since, until)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.segment, s.created_at, s.closed_at, COUNT(*), COALESCE(SUM(r.length), 0),"
+                " MIN(r.fetched_at), MAX(r.fetched_at)"
+                f" FROM records r JOIN segments s ON s.name = r.segment {where}"
+                " GROUP BY r.segment ORDER BY s.created_at, r.segment",
+                params,
+            ).fetchall()
+        return [
+            {
+                "segment": name,
+                "createdAt": _warc_date(created),
+                "closed": closed is not None,
+                "records": n,
+                "bytes": nbytes,
+                "firstFetchedAt": _warc_date(first),
+                "lastFetchedAt": _warc_date(last),
+            }
+            for name, created, closed, n, nbytes, first, last in rows
+        ]
+
+    def lookup(
+        self,
+        url: str,
+        page: Optional[int] = None,
+        at: Optional[float] = None,
+        kind: Optional[str] = None,
+    ) -> Optional[ArchivedResponse]:
+        """
+        The response for url (and page) fetched last at or before at (default:
+        the newest one).
+        """
+        clauses = ["url = ?"]
+        params: List[Any] = [url]
+        if page is not None:
+            clauses.append("page = ?")
+            params.append(page)
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if at is not None:
+            clauses.append("fetched_at <= ?")
+            params.append(at)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT segment, offset, length FROM records WHERE {' AND '.join(clauses)}"
+                " ORDER BY fetched_at DESC, id DESC LIMIT 1",
+                params,
+            ).fetchone()
+        return None if row is None else self.read(*row)
+
+    def iter_segment(
+        self, segment: str, since: Optional[float] = None, until: Optional[float] = None
+    ) -> Iterator[ArchivedResponse]:
+        """
+        The segment's indexed records in the order they were written.
+        """
+        where, params = _time_range(since, until, prefix="AND")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT offset, length FROM records WHERE segment = ? {where} ORDER BY offset",
+                [segment, *params],
+            ).fetchall()
+        compression = _compression_of(segment)
+        with (self.archive_dir / segment).open("rb") as f:
+            for offset, length in rows:
+                f.seek(offset)
+                yield decode_record(_decompress(f.read(length), compression))
+
+    def read(self, segment: str, offset: int, length: int) -> ArchivedResponse:
+        with self._lock:
+            f = self._files.get(segment)
+            if f is None:
+                f = self._files[segment] = (self.archive_dir / segment).open("rb")
+            f.seek(offset)
+            data = f.read(length)
+        return decode_record(_decompress(data, _compression_of(segment)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments, nbytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM segments").fetchone()
+            kinds = dict(self._db.execute("SELECT kind, COUNT(*) FROM records GROUP BY kind").fetchall())
+            first, last, size = self._db.execute(
+                "SELECT MIN(fetched_at), MAX(fetched_at), COALESCE(SUM(size), 0) FROM records"
+            ).fetchone()
+        return {
+            "segments": segments,
+            "bytes": nbytes,
+            "uncompressedBytes": size,
+            "records": kinds,
+            "firstFetchedAt": _warc_date(first) if first else None,
+            "lastFetchedAt": _warc_date(last) if last else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+            self._db.close()
+
+def _time_range(since: Optional[float], until: Optional[float], prefix: str = "WHERE") -> Tuple[str, List[float]]:
+    clauses: List[str] = []
+    params: List[float] = []
+    if since is not None:
+        clauses.append("fetched_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("fetched_at <= ?")
+        params.append(until)
+    if not clauses:
+        return "", []
+    return f"{prefix} {' AND '.join(clauses)}", params
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Set
+
+from utils.timefmt import utc_now_iso
+
+_ADVERTISER_RE = re.compile(r"/advertiser/([A-Za-z0-9_-]+)")
+
+def advertiser_scope(origin_url: str) -> str:
+    """
+    Index scope for a crawl: the advertiser ID from the origin URL, or the URL
+    itself for searches that are not advertiser-specific.
+    """
+    m = _ADVERTISER_RE.search(origin_url)
+    return m.group(1) if m else origin_url
+
+class SeenIndex:
+    """
+    Persistent set of creative IDs already emitted, per advertiser scope,
+    backed by SQLite. Shared safely between threads and processes.
+    """
+
+    # SQLite's default limit on bound parameters is 999.
+    _BATCH = 500
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " scope TEXT NOT NULL, creative_id TEXT NOT NULL, first_seen_at TEXT,"
+            " PRIMARY KEY (scope, creative_id)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def known(self, scope: str, creative_ids: Iterable[str]) -> Set[str]:
+        ids: List[str] = list(dict.fromkeys(creative_ids))
+        found: Set[str] = set()
+        with self._lock:
+            for i in range(0, len(ids), self._BATCH):
+                chunk = ids[i : i + self._BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT creative_id FROM seen WHERE scope = ? AND creative_id IN ({placeholders})",
+                    [scope, *chunk],
+                )
+                found.update(r[0] for r in rows)
+        return found
+
+    def add(self, scope: str, creative_ids: Iterable[str]) -> None:
+        now = utc_now_iso()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO seen (scope, creative_id, first_seen_at) VALUES (?, ?, ?)",
+                ((scope, cid, now) for cid in creative_ids),
+            )
+            self._db.commit()
+
+    def count(self, scope: str) -> int:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM seen WHERE scope = ?", (scope,)).fetchone()
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+@dataclass(frozen=True)
+class JsonEncoder:
+    name: str
+    dumps: Callable[[Any], str]
+    # Separators the encoder uses, for callers composing objects from pre-encoded parts.
+    item_sep: str
+    key_sep: str
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+def _orjson_dumps(obj: Any) -> str:
+    try:
+        return orjson.dumps(obj).decode("utf-8")
+    except TypeError:
+        # orjson rejects a few things json accepts (e.g. ints over 64 bits).
+        return _stdlib_dumps(obj)
+
+def get_encoder(name: str = "json") -> JsonEncoder:
+    """
+    Returns the JSON encoder to use (non-ASCII kept as-is). "json" (the
+    default) is the stdlib, whose output stays byte-identical across runs and
+    installs. "orjson" and "auto" opt in to orjson when installed; it is
+    faster but writes compact separators and formats some floats differently.
+    """
+    name = (name or "json").lower()
+    stdlib = JsonEncoder("json", _stdlib_dumps, ", ", ": ")
+    if name == "json":
+        return stdlib
+    if name in ("auto", "orjson"):
+        if orjson is not None:
+            return JsonEncoder("orjson", _orjson_dumps, ",", ":")
+        if name == "orjson":
+            logging.warning("orjson requested but not installed; using the stdlib json encoder")
+        return stdlib
+    raise ValueError(f"Unknown JSON encoder: {name}")
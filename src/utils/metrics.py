@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Latency bucket upper bounds in seconds (Prometheus-style, cumulative on export).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)  # fmt: skip
+
+# Stages in pipeline order. Waits are wall-clock time the pipeline spent
+# blocked on a background stage (prefetched pages, detail pages, media
+# downloads); fetch, detail and media are the latencies of the individual
+# requests.
+STAGES = ("fetch", "fetch_wait", "extract", "detail", "detail_wait", "normalize", "media", "media_wait", "write")
+
+PROM_PREFIX = "ads_scraper"
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th observation (the max for
+        the overflow bucket).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def cumulative(self) -> List[int]:
+        out, seen = [], 0
+        for n in self.counts:
+            seen += n
+            out.append(seen)
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [_fmt_bound(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.cumulative())),
+        }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        cumulative = list((data.get("buckets") or {}).values())
+        if len(cumulative) != len(self.counts):
+            return
+        prev = 0
+        for i, c in enumerate(cumulative):
+            self.counts[i] += c - prev
+            prev = c
+        self.count += int(data.get("count") or 0)
+        self.sum += float(data.get("sum") or 0.0)
+        self.max = max(self.max, float(data.get("max") or 0.0))
+
+def _fmt_bound(b: float) -> str:
+    return f"{b:g}"
+
+class StageMetrics:
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.bytes = 0
+        self.records = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = self.latency.sum
+        return {
+            "seconds": round(seconds, 6),
+            "bytes": self.bytes,
+            "records": self.records,
+            "recordsPerSec": round(self.records / seconds, 1) if seconds and self.records else None,
+            "mbPerSec": round(self.bytes / seconds / 1e6, 3) if seconds and self.bytes else None,
+            "latency": self.latency.to_dict(),
+        }
+
+class Sample:
+    """
+    Handed out by Metrics.timed(); set bytes/records before the block ends.
+    """
+
+    __slots__ = ("bytes", "records")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.records = 0
+
+class Metrics:
+    """
+    Thread-safe per-stage metrics for one run: a latency histogram, byte and
+    record counts per stage, and HTTP status counts per source ("page" or
+    "media"). Exported as a JSON summary or a Prometheus textfile.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._elapsed: Optional[float] = None
+        self.stages: Dict[str, StageMetrics] = {name: StageMetrics() for name in STAGES}
+        self.http_status: Counter = Counter()
+        self.extra: Dict[str, Any] = {}
+
+    def _stage(self, name: str) -> StageMetrics:
+        # Caller holds the lock.
+        s = self.stages.get(name)
+        if s is None:
+            s = self.stages[name] = StageMetrics()
+        return s
+
+    def observe(self, stage: str, seconds: float, nbytes: int = 0, records: int = 0) -> None:
+        with self._lock:
+            s = self._stage(stage)
+            s.latency.observe(seconds)
+            s.bytes += nbytes
+            s.records += records
+
+    def add(self, stage: str, nbytes: int = 0, records: int = 0) -> None:
+        """
+        Counts bytes/records for a stage without recording a latency.
+        """
+        with self._lock:
+            s = self._stage(stage)
+            s.bytes += nbytes
+            s.records += records
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[Sample]:
+        sample = Sample()
+        started = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            self.observe(stage, time.perf_counter() - started, sample.bytes, sample.records)
+
+    def timed_iter(self, items: Iterable[T], stage: str) -> Iterator[T]:
+        """
+        Re-yields items, recording how long each next() blocked under stage.
+        """
+        it = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.observe(stage, time.perf_counter() - started)
+            yield item
+
+    def count_status(self, source: str, status: Any) -> None:
+        with self._lock:
+            self.http_status[(source, str(status))] += 1
+
+    def finish(self) -> None:
+        self._elapsed = time.monotonic() - self._started
+
+    @property
+    def elapsed(self) -> float:
+        return self._elapsed if self._elapsed is not None else time.monotonic() - self._started
+
+    @property
+    def records(self) -> int:
+        return self.stages["write"].records
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = self.elapsed
+            status: Dict[str, Dict[str, int]] = {}
+            for (source, code), n in sorted(self.http_status.items()):
+                status.setdefault(source, {})[code] = n
+            return {
+                "elapsedSec": round(elapsed, 3),
+                "records": self.records,
+                "recordsPerSec": round(self.records / elapsed, 1) if elapsed else None,
+                "stages": {name: s.to_dict() for name, s in self.stages.items()},
+                "httpStatus": status,
+                **self.extra,
+            }
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """
+        Adds another run's to_dict() output (e.g. from a batch worker).
+        Elapsed time stays this instance's own wall clock.
+        """
+        with self._lock:
+            for name, s in (data.get("stages") or {}).items():
+                mine = self._stage(name)
+                mine.latency.merge(s.get("latency") or {})
+                mine.bytes += int(s.get("bytes") or 0)
+                mine.records += int(s.get("records") or 0)
+            for source, codes in (data.get("httpStatus") or {}).items():
+                for code, n in codes.items():
+                    self.http_status[(source, code)] += int(n)
+
+    def write_json(self, path: Path) -> None:
+        _atomic_write(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Prometheus text exposition format, for node_exporter's textfile
+        collector (written to a temp file and renamed, as it requires).
+        """
+        data = self.to_dict()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {PROM_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROM_PREFIX}_{name} {kind}")
+
+        metric("stage_seconds", "histogram", "Latency of each pipeline stage operation.")
+        for name, s in data["stages"].items():
+            lat = s["latency"]
+            for le, n in lat["buckets"].items():
+                lines.append(f'{PROM_PREFIX}_stage_seconds_bucket{{stage="{name}",le="{le}"}} {n}')
+            lines.append(f'{PROM_PREFIX}_stage_seconds_sum{{stage="{name}"}} {lat["sum"]}')
+            lines.append(f'{PROM_PREFIX}_stage_seconds_count{{stage="{name}"}} {lat["count"]}')
+        metric("stage_bytes_total", "counter", "Bytes processed by each stage.")
+        for name, s in data["stages"].items():
+            lines.append(f'{PROM_PREFIX}_stage_bytes_total{{stage="{name}"}} {s["bytes"]}')
+        metric("stage_records_total", "counter", "Records processed by each stage.")
+        for name, s in data["stages"].items():
+            lines.append(f'{PROM_PREFIX}_stage_records_total{{stage="{name}"}} {s["records"]}')
+        metric("http_responses_total", "counter", "HTTP responses by source and status code.")
+        for source, codes in data["httpStatus"].items():
+            for code, n in codes.items():
+                lines.append(f'{PROM_PREFIX}_http_responses_total{{source="{source}",code="{code}"}} {n}')
+        metric("run_seconds", "gauge", "Wall-clock duration of the last run.")
+        lines.append(f"{PROM_PREFIX}_run_seconds {data['elapsedSec']}")
+        metric("records_per_second", "gauge", "Records written per second over the last run.")
+        lines.append(f"{PROM_PREFIX}_records_per_second {data['recordsPerSec'] or 0}")
+        metric("last_run_timestamp_seconds", "gauge", "Unix time the last run finished.")
+        lines.append(f"{PROM_PREFIX}_last_run_timestamp_seconds {int(time.time())}")
+        _atomic_write(path, "\n".join(lines) + "\n")
+
+@contextmanager
+def profiled(path: Optional[Path], top: int = 25) -> Iterator[None]:
+    """
+    Runs the block under cProfile and dumps the stats to path (readable with
+    pstats or snakeviz), logging the top functions by cumulative time.
+    Threads started inside the block (pipeline stages, prefetch and media
+    pools) are profiled too and merged into the same stats; parse worker
+    processes are not. Does nothing when path is None.
+    """
+    if path is None:
+        yield
+        return
+    profilers = [cProfile.Profile()]
+    # Before 3.12 cProfile only hooks the thread that enables it.
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+
+        def start_thread_profiler(frame: Any, event: str, arg: Any) -> None:
+            profiler = cProfile.Profile()
+            profilers.append(profiler)
+            profiler.enable()
+
+        threading.setprofile(start_thread_profiler)
+    profilers[0].enable()
+    try:
+        yield
+    finally:
+        profilers[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = io.StringIO()
+        stats = pstats.Stats(*profilers, stream=report)
+        stats.dump_stats(str(path))
+        stats.sort_stats("cumulative").print_stats(top)
+        logging.info("Profile written to %s (%d threads)\n%s", path, len(profilers), report.getvalue())
+
+def _atomic_write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
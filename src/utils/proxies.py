@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from typing import Dict, Optional
+import random
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 def build_requests_proxy(proxy_url: Optional[str]) -> Optional[Dict[str, str]]:
     """
@@ -9,4 +14,142 @@ def build_requests_proxy(proxy_url: Optional[str]) -> Optional[Dict[str, str]]:
     """
     if not proxy_url:
         return None
-    return {"http": proxy_url, "https": proxy_url}
\ No newline at end of file
+    return {"http": proxy_url, "https": proxy_url}
+
+def load_proxy_list(proxy: Any = None, proxies_file: Optional[Path] = None) -> List[str]:
+    """
+    Proxy URLs from a single URL, a list of URLs and/or a text file with one
+    URL per line ('#' starts a comment). Duplicates are dropped, order kept.
+    """
+    urls: List[str] = []
+    if isinstance(proxy, str):
+        urls.append(proxy)
+    elif isinstance(proxy, (list, tuple)):
+        urls.extend(str(p) for p in proxy if p)
+    if proxies_file is not None:
+        if not proxies_file.exists():
+            raise FileNotFoundError(str(proxies_file))
+        with proxies_file.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    urls.append(line)
+    return list(dict.fromkeys(u.strip() for u in urls if u.strip()))
+
+def redact_proxy(proxy_url: str) -> str:
+    """
+    Proxy URL without credentials, for logs and metrics.
+    """
+    scheme, sep, rest = proxy_url.rpartition("://")
+    host = rest.rsplit("@", 1)[-1]
+    return f"{scheme}{sep}{host}"
+
+@dataclass
+class ProxyState:
+    url: str
+    # Exponentially weighted averages of request latency and failure rate.
+    latency_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    in_flight: int = 0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    cooldowns: int = 0
+
+    def score(self) -> float:
+        """
+        Expected cost of sending the next request here (lower is better):
+        latency scaled by queued work and by the chance of having to retry.
+        Unmeasured proxies get an optimistic latency so they are tried early.
+        """
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.1
+        return latency * (1 + self.in_flight) / max(0.05, 1.0 - self.error_ewma)
+
+class ProxyPool:
+    """
+    Thread-safe set of proxies with health scores.
+
+    acquire() picks two available proxies at random and returns the one with
+    the lower score ("power of two choices"), which spreads load across the
+    pool while steering it away from slow or failing exits. A proxy that
+    fails failure_threshold times in a row, or is throttled, cools down for
+    an exponentially growing period before it is picked again.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        failure_threshold: int = 3,
+        cooldown_sec: float = 60.0,
+        max_cooldown_sec: float = 900.0,
+        alpha: float = 0.2,
+    ):
+        if not urls:
+            raise ValueError("ProxyPool needs at least one proxy URL")
+        self.proxies = [ProxyState(url=u) for u in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_sec = cooldown_sec
+        self.max_cooldown_sec = max_cooldown_sec
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def acquire(self) -> ProxyState:
+        """
+        Reserves a proxy for one request; blocks while every proxy is cooling
+        down. Pair each call with release().
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready = [p for p in self.proxies if p.cooldown_until <= now]
+                if ready:
+                    if len(ready) == 1:
+                        chosen = ready[0]
+                    else:
+                        a, b = self._rng.sample(ready, 2)
+                        chosen = a if a.score() <= b.score() else b
+                    chosen.in_flight += 1
+                    chosen.requests += 1
+                    return chosen
+                wait = min(p.cooldown_until for p in self.proxies) - now
+            time.sleep(max(0.01, wait))
+
+    def release(self, proxy: ProxyState, ok: bool, latency: Optional[float] = None, throttled: bool = False) -> None:
+        with self._lock:
+            proxy.in_flight -= 1
+            a = self.alpha
+            if latency is not None:
+                proxy.latency_ewma = latency if proxy.latency_ewma is None else (1 - a) * proxy.latency_ewma + a * latency
+            proxy.error_ewma = (1 - a) * proxy.error_ewma + (0.0 if ok else a)
+            if ok:
+                proxy.consecutive_failures = 0
+                return
+            proxy.failures += 1
+            proxy.consecutive_failures += 1
+            if throttled or proxy.consecutive_failures >= self.failure_threshold:
+                strikes = max(0, proxy.consecutive_failures - self.failure_threshold)
+                proxy.cooldown_until = time.monotonic() + min(
+                    self.max_cooldown_sec, self.cooldown_sec * 2 ** min(strikes, 16)
+                )
+                proxy.cooldowns += 1
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "proxy": redact_proxy(p.url),
+                    "requests": p.requests,
+                    "failures": p.failures,
+                    "cooldowns": p.cooldowns,
+                    "latencyMs": round(p.latency_ewma * 1000, 1) if p.latency_ewma is not None else None,
+                    "errorRate": round(p.error_ewma, 3),
+                    "coolingDown": p.cooldown_until > now,
+                }
+                for p in self.proxies
+            ]
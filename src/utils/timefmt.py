@@ -1,46 +1,94 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Optional, Tuple
 
 def utc_now_iso() -> str:
     return dt.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
-def to_epoch_str(value: Optional[str]) -> str:
+# Distinct timestamp values seen in a crawl are few (the same dates repeat
+# across creatives and countryStats), so conversions are memoized.
+_MEMO_SIZE = 16384
+
+_EPOCH_ZERO_ISO = "1970-01-01T00:00:00.000Z"
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _classify(value: Any) -> Tuple[str, Any]:
     """
-    Accepts epoch string / int or ISO and returns epoch (seconds) as string.
+    Decides once per distinct value whether it is an epoch ("epoch", seconds),
+    an ISO string ("iso", naive UTC datetime) or neither ("invalid", None).
     """
-    if value is None:
-        return "0"
     try:
-        # epoch (already)
-        return str(int(float(value)))
+        return "epoch", int(float(value))
     except Exception:
         pass
     try:
-        # ISO -> epoch
-        iso = parse_iso(value)
-        return str(int(iso.timestamp()))
+        return "iso", parse_iso(value)
     except Exception:
+        return "invalid", None
+
+def _classify_any(value: Any) -> Tuple[str, Any]:
+    try:
+        return _classify(value)
+    except TypeError:  # unhashable
+        return _classify.__wrapped__(value)
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _epoch_str(value: Any) -> str:
+    kind, parsed = _classify_any(value)
+    if kind == "epoch":
+        return str(parsed)
+    if kind == "iso":
+        try:
+            return str(int(parsed.timestamp()))
+        except Exception:
+            pass
+    return "0"
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _iso_utc(value: Any) -> str:
+    kind, parsed = _classify_any(value)
+    if kind == "epoch":
+        try:
+            return dt.datetime.utcfromtimestamp(parsed).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        except Exception:
+            # Out of range for a datetime; the value may still parse as ISO.
+            try:
+                parsed = parse_iso(value)
+            except Exception:
+                return _EPOCH_ZERO_ISO
+            kind = "iso"
+    if kind == "iso":
+        try:
+            return parsed.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        except Exception:
+            pass
+    return _EPOCH_ZERO_ISO
+
+def to_epoch_str(value: Optional[str]) -> str:
+    """
+    Accepts epoch string / int or ISO and returns epoch (seconds) as string.
+    """
+    if value is None:
         return "0"
+    if type(value) is int:
+        return str(value)
+    try:
+        return _epoch_str(value)
+    except TypeError:  # unhashable
+        return _epoch_str.__wrapped__(value)
 
 def to_iso_utc(value: Optional[str]) -> str:
     """
     Accepts epoch or ISO and returns ISO UTC with Z.
     """
     if value is None:
-        return "1970-01-01T00:00:00.000Z"
+        return _EPOCH_ZERO_ISO
     try:
-        # epoch seconds
-        ts = int(float(value))
-        return dt.datetime.utcfromtimestamp(ts).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    except Exception:
-        pass
-    try:
-        iso = parse_iso(value)
-        return iso.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-    except Exception:
-        return "1970-01-01T00:00:00.000Z"
+        return _iso_utc(value)
+    except TypeError:  # unhashable
+        return _iso_utc.__wrapped__(value)
 
 def parse_iso(s: str) -> dt.datetime:
     # handle Z and fractional seconds
@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from clients.transparency_center_client import ClientSettings, TransparencyCenterClient  # noqa: E402
+from pipelines.normalize import Normalizer  # noqa: E402
+from pipelines.pagination import Paginator  # noqa: E402
+from pipelines.runner import build_media_store, build_writer  # noqa: E402
+from pipelines.staged import run_origin  # noqa: E402
+from storage.checkpoint import Checkpoint  # noqa: E402
+
+ORIGIN_URL = "https://adstransparency.google.com/advertiser/AR10303883279069085697?region=DE"
+
+@pytest.fixture
+def mock_client():
+    client = TransparencyCenterClient(ClientSettings(user_agent="test", cookies=None, proxies=None, mock=True))
+    yield client
+    client.close()
+
+def crawl(
+    client: TransparencyCenterClient,
+    out_dir: Path,
+    max_items: int,
+    staged: bool = True,
+    resume: bool = False,
+    formats=("jsonl",),
+    settings: Optional[Dict[str, Any]] = None,
+    jsonl_name: str = "ads.jsonl",
+    **kwargs: Any,
+) -> int:
+    """
+    One single-URL run as main.py does it: outputs and checkpoint in
+    out_dir, resumed from the checkpoint when resume is set.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    settings_raw = {"stagedPipeline": staged, "parseWorkers": 0, **(settings or {})}
+    checkpoint_path = out_dir / "ads.jsonl.checkpoint.json"
+    checkpoint = Checkpoint.load(checkpoint_path) if resume else None
+    if checkpoint is None:
+        checkpoint = Checkpoint(
+            origin_url=ORIGIN_URL, jsonl_path=str(out_dir / jsonl_name), csv_path=str(out_dir / "ads.csv")
+        )
+    writer = build_writer(
+        settings_raw,
+        formats,
+        jsonl_path=out_dir / jsonl_name,
+        csv_path=out_dir / "ads.csv",
+        parquet_dir=out_dir / "ads_parquet",
+        resume_offsets=checkpoint.offsets if resume else None,
+    )
+    media_store = build_media_store(settings_raw, out_dir / "media")
+    try:
+        return run_origin(
+            settings_raw,
+            ORIGIN_URL,
+            prefetch=1,
+            paginator=Paginator(client=client, max_items=max_items, prefetch=1),
+            normalizer=Normalizer(origin_url=ORIGIN_URL),
+            writer=writer,
+            media_store=media_store,
+            max_items=max_items,
+            download_media=False,
+            checkpoint=checkpoint,
+            checkpoint_path=checkpoint_path,
+            **kwargs,
+        )
+    finally:
+        media_store.close()
+        writer.close()
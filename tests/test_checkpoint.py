@@ -0,0 +1,95 @@
+import gzip
+import json
+
+from conftest import ORIGIN_URL, crawl
+
+from storage.checkpoint import Checkpoint
+
+def _checkpoint():
+    return Checkpoint(origin_url=ORIGIN_URL, jsonl_path="ads.jsonl", csv_path="ads.csv")
+
+def test_round_trip_keeps_progress_and_emitted_ids(tmp_path):
+    path = tmp_path / "ads.jsonl.checkpoint.json"
+    checkpoint = _checkpoint()
+    checkpoint.next_page = 3
+    checkpoint.next_page_token = "tok"
+    checkpoint.written = 2
+    checkpoint.offsets = {"jsonl": 10, "parquetPart": 1, "parquet": 5}
+    checkpoint.add_emitted(["CR1", "CR2"])
+    checkpoint.save(path)
+    checkpoint.add_emitted(["CR2", "CR3"])
+    checkpoint.save(path)
+
+    loaded = Checkpoint.load(path)
+    assert (loaded.next_page, loaded.next_page_token, loaded.written) == (3, "tok", 2)
+    assert loaded.offsets == {"jsonl": 10, "parquetPart": 1, "parquet": 5}
+    assert loaded.emitted_ids == {"CR1", "CR2", "CR3"}
+    assert Checkpoint.ids_path(path).read_text() == "CR1\nCR2\nCR3\n"
+    assert "emittedIds" not in json.loads(path.read_text())
+
+def test_ids_appended_after_the_last_save_are_dropped(tmp_path):
+    path = tmp_path / "ads.jsonl.checkpoint.json"
+    checkpoint = _checkpoint()
+    checkpoint.add_emitted(["CR1"])
+    checkpoint.save(path)
+    # A crash between appending to the log and replacing the checkpoint.
+    with Checkpoint.ids_path(path).open("a") as f:
+        f.write("CR2\nCR")
+
+    loaded = Checkpoint.load(path)
+    assert loaded.emitted_ids == {"CR1"}
+    loaded.add_emitted(["CR3"])
+    loaded.save(path)
+    assert Checkpoint.ids_path(path).read_text() == "CR1\nCR3\n"
+
+def test_a_fresh_checkpoint_truncates_a_stale_ids_log(tmp_path):
+    path = tmp_path / "ads.jsonl.checkpoint.json"
+    Checkpoint.ids_path(path).write_text("OLD1\nOLD2\n")
+    checkpoint = _checkpoint()
+    checkpoint.add_emitted(["CR1"])
+    checkpoint.save(path)
+    assert Checkpoint.load(path).emitted_ids == {"CR1"}
+
+def test_resume_discards_output_written_after_the_commit(tmp_path, mock_client):
+    fetch_page = mock_client.fetch_page
+
+    def interrupted(url, page):
+        if page == 3:
+            raise KeyboardInterrupt
+        return fetch_page(url, page)
+
+    mock_client.fetch_page = interrupted
+    try:
+        crawl(mock_client, tmp_path, max_items=90, formats=("jsonl", "csv"), staged=False)
+    except KeyboardInterrupt:
+        pass
+    checkpoint = Checkpoint.load(tmp_path / "ads.jsonl.checkpoint.json")
+    assert checkpoint.written == 40
+    # Records of a page written after the commit, cut short by the crash.
+    for name in ("ads.jsonl", "ads.csv"):
+        with (tmp_path / name).open("a") as f:
+            f.write('{"creativeId": "CR-partial", "adv')
+
+    mock_client.fetch_page = fetch_page
+    assert crawl(mock_client, tmp_path, max_items=90, formats=("jsonl", "csv"), staged=False, resume=True) == 90
+    with (tmp_path / "ads.jsonl").open() as f:
+        ids = [json.loads(line)["creativeId"] for line in f]
+    assert len(ids) == len(set(ids)) == 90
+    with (tmp_path / "ads.csv").open() as f:
+        assert len(f.read().splitlines()) == 91
+
+def test_resume_of_a_gzip_output_stays_readable(tmp_path, mock_client):
+    settings = {"commitIntervalSec": 0}
+    out_dir = tmp_path / "out"
+    jsonl = out_dir / "ads.jsonl.gz"
+    crawl(mock_client, out_dir, max_items=40, settings=settings, jsonl_name=jsonl.name)
+    with jsonl.open("ab") as f:
+        f.write(gzip.compress(b'{"creativeId": "CR-partial"}\n')[:20])
+    checkpoint = Checkpoint.load(out_dir / "ads.jsonl.checkpoint.json")
+    checkpoint.complete = False
+    checkpoint.save(out_dir / "ads.jsonl.checkpoint.json")
+
+    assert crawl(mock_client, out_dir, max_items=80, settings=settings, resume=True, jsonl_name=jsonl.name) == 80
+    with gzip.open(jsonl, "rt") as f:
+        ids = [json.loads(line)["creativeId"] for line in f]
+    assert len(ids) == len(set(ids)) == 80
@@ -0,0 +1,39 @@
+import json
+import time
+
+from extractors.html_scanner import scan_html, scan_html_chunks
+
+def _page(script: str) -> str:
+    return f"<html><head><title> Ads </title></head><body><img src='a.png'><script>{script}</script></body></html>"
+
+def _blob(creatives: int) -> str:
+    return json.dumps({"creatives": [{"creativeId": f"CR{i}", "variants": [{"images": ["x"]}]} for i in range(creatives)]})
+
+def test_finds_blob_embedded_in_script_code():
+    result = scan_html(_page(f"AF_initDataCallback({{key: 'ds:1', data: {_blob(3)}, sideChannel: {{}}}});"))
+    assert result.title == "Ads"
+    assert result.images == ["a.png"]
+    assert [len(b["creatives"]) for b in result.blobs] == [3]
+
+def test_chunked_feed_matches_whole_page():
+    page = _page(f"var junk = [1, f(x)]; var data = {_blob(50)};")
+    chunks = [page[i : i + 7] for i in range(0, len(page), 7)]
+    assert scan_html_chunks(chunks).blobs == scan_html(page).blobs
+
+def test_deep_nesting_is_skipped_quickly():
+    started = time.perf_counter()
+    result = scan_html(_page('"creativeId"; var x = ' + "[" * 100000 + "]" * 100000 + ";"))
+    assert time.perf_counter() - started < 2.0
+    assert result.blobs == []
+
+def test_script_code_before_blob_is_scanned_in_linear_time():
+    blob = _blob(2000)
+    junk = 'var a = [1,2,{x:3}]; b = ["s", f(x)]; c = {"k": v};\n'
+    # Used to take ~16 s at this size: each failed bracket cost a pass over
+    # everything before it.
+    html = _page(junk * 30000 + f"var data = {blob};")
+    assert len(html) > 1_400_000
+    started = time.perf_counter()
+    result = scan_html(html)
+    assert time.perf_counter() - started < 2.0
+    assert [len(b["creatives"]) for b in result.blobs if isinstance(b, dict)] == [2000]
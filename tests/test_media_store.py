@@ -0,0 +1,41 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from storage.media_store import MediaStore
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(0.5)
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def port():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_port
+    server.shutdown()
+    server.server_close()
+
+def test_a_busy_host_does_not_hold_up_the_others(tmp_path, port):
+    store = MediaStore(tmp_path, max_workers=2, per_host_limit=1)
+    try:
+        started = time.perf_counter()
+        slow = [store._schedule(f"http://127.0.0.1:{port}/slow{i}.png") for i in range(3)]
+        fast = [store._schedule(f"http://localhost:{port}/fast{i}.png") for i in range(3)]
+        assert all(f.result() for f in fast)
+        assert time.perf_counter() - started < 0.4
+        assert all(f.result() for f in slow)
+    finally:
+        store.close()
+    assert len({p.name for p in tmp_path.glob("*/*.png")}) == 6
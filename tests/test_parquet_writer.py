@@ -0,0 +1,63 @@
+import pyarrow.parquet as pq
+import pytest
+from conftest import crawl
+
+from clients.transparency_center_client import FetchError
+from storage.parquet_writer import ParquetWriter
+
+def _rows(out_dir, table):
+    return sum(pq.read_metadata(str(p)).num_rows for p in sorted(out_dir.glob(f"{table}-*.parquet")))
+
+def _record(n):
+    return {
+        "creativeId": f"CR{n:04d}",
+        "countryStats": [{"code": "DE", "impressions": {"lowerBound": "1", "upperBound": "9"}}],
+    }
+
+def test_a_crawl_writes_one_part_per_row_group(tmp_path, mock_client):
+    crawl(mock_client, tmp_path, max_items=100, formats=("parquet",))
+    out_dir = tmp_path / "ads_parquet"
+    assert sorted(p.name for p in out_dir.iterdir()) == [
+        "country_stats-00000.parquet",
+        "creatives-00000.parquet",
+        "platform_stats-00000.parquet",
+    ]
+    assert _rows(out_dir, "creatives") == 100
+
+def test_resume_drops_rows_written_after_the_commit(tmp_path):
+    writer = ParquetWriter(tmp_path, row_group_size=20)
+    for n in range(30):
+        writer.write(_record(n))
+    offsets = writer.commit()
+    assert offsets["parquetPart"] == 1
+    # Closes part 1 with 10 committed and 10 uncommitted rows, then crashes.
+    for n in range(30, 45):
+        writer.write(_record(n))
+
+    writer = ParquetWriter(tmp_path, row_group_size=20, append=True, resume_offsets=offsets)
+    for n in range(30, 35):
+        writer.write(_record(n))
+    writer.commit()
+    writer.close()
+    assert _rows(tmp_path, "creatives") == 35
+    assert _rows(tmp_path, "country_stats") == 35
+    assert not list(tmp_path.glob("_pending-*"))
+
+@pytest.mark.parametrize("staged", [True, False])
+def test_crawl_resumes_parquet_output(tmp_path, mock_client, staged):
+    fetch_page = mock_client.fetch_page
+
+    def flaky(url, page):
+        if page == 3:
+            raise FetchError("page 3 failed")
+        return fetch_page(url, page)
+
+    mock_client.fetch_page = flaky
+    with pytest.raises(FetchError):
+        crawl(mock_client, tmp_path, max_items=90, staged=staged, formats=("parquet",))
+    mock_client.fetch_page = fetch_page
+    crawl(mock_client, tmp_path, max_items=90, staged=staged, formats=("parquet",), resume=True)
+    ids = []
+    for part in sorted((tmp_path / "ads_parquet").glob("creatives-*.parquet")):
+        ids.extend(pq.read_table(str(part)).column("creativeId").to_pylist())
+    assert len(ids) == len(set(ids)) == 90
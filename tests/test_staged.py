@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from conftest import crawl
+
+from clients.transparency_center_client import FetchError
+from storage.checkpoint import Checkpoint
+
+def _creative_ids(path):
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line)["creativeId"] for line in f]
+
+def _fail_on_page(client, failing_page):
+    fetch_page = client.fetch_page
+
+    def flaky(url, page):
+        if page == failing_page:
+            raise FetchError(f"page {page} failed")
+        return fetch_page(url, page)
+
+    client.fetch_page = flaky
+    return fetch_page
+
+@pytest.mark.parametrize("staged", [True, False])
+def test_fetch_error_keeps_written_pages_and_resumes(tmp_path, mock_client, staged):
+    fetch_page = _fail_on_page(mock_client, 3)
+    with pytest.raises(FetchError):
+        crawl(mock_client, tmp_path, max_items=90, staged=staged)
+
+    checkpoint = Checkpoint.load(tmp_path / "ads.jsonl.checkpoint.json")
+    assert checkpoint is not None and not checkpoint.complete
+    assert checkpoint.next_page == 3
+    assert checkpoint.written == 40
+    assert len(_creative_ids(tmp_path / "ads.jsonl")) == 40
+
+    mock_client.fetch_page = fetch_page
+    assert crawl(mock_client, tmp_path, max_items=90, staged=staged, resume=True) == 90
+    ids = _creative_ids(tmp_path / "ads.jsonl")
+    assert len(ids) == len(set(ids)) == 90
+
+@pytest.mark.parametrize("staged", [True, False])
+def test_fetch_error_on_first_page_leaves_a_resumable_checkpoint(tmp_path, mock_client, staged):
+    fetch_page = _fail_on_page(mock_client, 1)
+    with pytest.raises(FetchError):
+        crawl(mock_client, tmp_path, max_items=50, staged=staged)
+    assert Checkpoint.load(tmp_path / "ads.jsonl.checkpoint.json").next_page == 1
+
+    mock_client.fetch_page = fetch_page
+    assert crawl(mock_client, tmp_path, max_items=50, staged=staged, resume=True) == 50
+
+def test_write_error_aborts_the_pipeline(tmp_path, mock_client, monkeypatch):
+    from storage.dataset_writer import DatasetWriter
+
+    writes = []
+
+    def failing_write(self, rec):
+        writes.append(rec)
+        if len(writes) == 30:
+            raise OSError("disk full")
+
+    monkeypatch.setattr(DatasetWriter, "write", failing_write)
+    with pytest.raises(OSError):
+        crawl(mock_client, tmp_path, max_items=500, settings={"commitIntervalSec": 0})
+    checkpoint = Checkpoint.load(tmp_path / "ads.jsonl.checkpoint.json")
+    # Only the first page was fully written; the failing one is not committed.
+    assert checkpoint.next_page == 2
+    assert checkpoint.written == 20
+    assert len(writes) == 30
+
+@pytest.mark.parametrize("staged", [True, False])
+def test_incremental_stop_fetches_no_pages_past_the_known_one(tmp_path, mock_client, staged):
+    from storage.seen_index import SeenIndex
+
+    seen_index = SeenIndex(tmp_path / "seen.sqlite")
+    try:
+        crawl(mock_client, tmp_path / "first", max_items=100, staged=staged, seen_index=seen_index)
+        fetched = []
+        fetch_page = mock_client.fetch_page
+
+        def counting(url, page):
+            fetched.append(page)
+            return fetch_page(url, page)
+
+        mock_client.fetch_page = counting
+        total = crawl(
+            mock_client,
+            tmp_path / "second",
+            max_items=100,
+            staged=staged,
+            seen_index=seen_index,
+            settings={"pipelineQueuePages": 8},
+        )
+    finally:
+        seen_index.close()
+    assert total == 0
+    assert fetched == [1]